@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Serve the catalog with the async views (products/api/async_views.py)
+os.environ.setdefault('ASYNC_CATALOG_VIEWS', 'True')
 
 application = get_asgi_application()
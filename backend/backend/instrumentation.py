@@ -0,0 +1,291 @@
+"""
+Request-level performance instrumentation.
+
+RequestMetricsMiddleware measures every request that resolves to a URL pattern:
+
+- wall time of the whole request,
+- number of database queries and the time spent in them,
+- time spent in DRF serializers (validation and building .data),
+- response size.
+
+Each response carries the measurements in a Server-Timing header, which browser dev
+tools show next to the request:
+
+    Server-Timing: app;dur=41.2, db;dur=12.8;desc="7 queries", serializer;dur=9.1
+
+The measurements are also added to in-process histograms per URL name (e.g.
+"product-list-create", "place-order", "admin-dashboard-stats"), which admins read
+from GET /api/admin/performance/ (backend/instrumentation_views.py). Histograms live in the
+memory of each worker process and start empty when it restarts.
+
+Requests slower than INSTRUMENTATION_SLOW_REQUEST_MS are logged with the SQL of
+their slowest queries (logger "backend.instrumentation"), and the most recent ones
+are kept for the endpoint as well.
+
+The middleware works under WSGI and ASGI. Queries are counted by a wrapper installed
+on every database connection (see install_query_hook) that reports to the request of
+the current context, so queries that async views run through sync_to_async threads
+count towards their request too.
+"""
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Measurements of the request being handled by the current thread/task
+_current = ContextVar('request_metrics', default=None)
+
+# Histogram buckets grow by 2 ** (1 / BUCKETS_PER_DOUBLING), about 19% per bucket
+BUCKETS_PER_DOUBLING = 4
+
+METRICS = ('wall_ms', 'db_queries', 'db_ms', 'serializer_ms', 'response_bytes')
+
+
+class Histogram:
+    """Count of values per logarithmic bucket; percentiles are accurate to one bucket."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def bucket_for(value):
+        if value <= 1:
+            return 0
+        return math.ceil(math.log2(value) * BUCKETS_PER_DOUBLING)
+
+    @staticmethod
+    def upper_bound(bucket):
+        return 2 ** (bucket / BUCKETS_PER_DOUBLING)
+
+    def add(self, value):
+        bucket = self.bucket_for(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile (capped at the maximum)."""
+        if not self.count:
+            return 0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 2) if self.count else 0,
+            'p50': round(self.percentile(50), 2),
+            'p95': round(self.percentile(95), 2),
+            'p99': round(self.percentile(99), 2),
+            'max': round(self.max, 2),
+        }
+
+
+class MetricsRegistry:
+    """Histograms per URL name and the most recent slow requests of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.slow_requests = deque(maxlen=getattr(settings, 'INSTRUMENTATION_SLOW_REQUESTS_KEPT', 50))
+
+    def record(self, url_name, measurements):
+        with self.lock:
+            histograms = self.endpoints.get(url_name)
+            if histograms is None:
+                histograms = self.endpoints[url_name] = {metric: Histogram() for metric in METRICS}
+            for metric in METRICS:
+                histograms[metric].add(measurements[metric])
+
+    def record_slow_request(self, entry):
+        with self.lock:
+            self.slow_requests.append(entry)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'endpoints': {
+                    url_name: {metric: histogram.summary() for metric, histogram in histograms.items()}
+                    for url_name, histograms in sorted(self.endpoints.items())
+                },
+                'slow_requests': list(reversed(self.slow_requests)),
+            }
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    """Measurements of one request, filled in by the query and serializer hooks."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.queries = []
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.db_queries += 1
+            self.db_time += duration
+            self.queries.append((duration, sql))
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def install_query_hook(connection, **kwargs):
+    """
+    Add _record_query to the connection's execute wrappers, once. It goes first in the
+    list: connection.execute_wrapper() blocks pop the last one when they exit.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def install_query_hooks():
+    """Hook every connection opened from now on, and those of this thread already open."""
+    connection_created.connect(install_query_hook, dispatch_uid='backend.instrumentation')
+    for connection in connections.all(initialized_only=True):
+        install_query_hook(connection)
+
+
+def _timed_serializer(method):
+    """Wrap a serializer method so its time counts towards the current request."""
+    def wrapper(*args, **kwargs):
+        metrics = _current.get()
+        # Only the outermost serializer call is timed: nested serializers and
+        # .data calling to_representation are part of it
+        if metrics is None or metrics.serializer_depth:
+            return method(*args, **kwargs)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
+    wrapper.timed = True
+    return wrapper
+
+
+def install_serializer_timing():
+    """Time BaseSerializer.is_valid() and .data, which every DRF serializer goes through."""
+    base = serializers.BaseSerializer
+    if getattr(base.is_valid, 'timed', False):
+        return
+    base.is_valid = _timed_serializer(base.is_valid)
+    base.data = property(_timed_serializer(base.data.fget))
+
+
+class RequestMetricsMiddleware:
+    """See the module docstring. Place it first in MIDDLEWARE so it measures the others too."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        install_serializer_timing()
+        install_query_hooks()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        wall_time = time.perf_counter() - metrics.started
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            # 404s and the like: no URL name to report under
+            return response
+
+        measurements = {
+            'wall_ms': wall_time * 1000,
+            'db_queries': metrics.db_queries,
+            'db_ms': metrics.db_time * 1000,
+            'serializer_ms': metrics.serializer_time * 1000,
+            'response_bytes': 0 if response.streaming else len(response.content),
+        }
+        url_name = match.view_name
+        registry.record(url_name, measurements)
+
+        if getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True):
+            response['Server-Timing'] = (
+                f"app;dur={measurements['wall_ms']:.1f}, "
+                f"db;dur={measurements['db_ms']:.1f};desc=\"{metrics.db_queries} queries\", "
+                f"serializer;dur={measurements['serializer_ms']:.1f}"
+            )
+
+        if measurements['wall_ms'] >= getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', 500):
+            self.log_slow_request(request, url_name, response, measurements, metrics)
+        return response
+
+    def log_slow_request(self, request, url_name, response, measurements, metrics):
+        limit = getattr(settings, 'INSTRUMENTATION_SLOW_QUERIES_LOGGED', 10)
+        slowest = sorted(metrics.queries, key=lambda query: query[0], reverse=True)[:limit]
+        entry = {
+            'url_name': url_name,
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            **{metric: round(value, 2) for metric, value in measurements.items()},
+            'queries': [{'ms': round(duration * 1000, 2), 'sql': sql} for duration, sql in slowest],
+        }
+        registry.record_slow_request(entry)
+        logger.warning(
+            "Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in the database. Slowest queries:\n%s",
+            request.method, entry['path'], url_name, measurements['wall_ms'], metrics.db_queries,
+            measurements['db_ms'],
+            '\n'.join(f"  {query['ms']} ms: {query['sql']}" for query in entry['queries']),
+        )
@@ -0,0 +1,27 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .instrumentation import registry
+
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAuthenticated])
+def performance_stats(request):
+    """
+    Request metrics of this worker process (see backend/instrumentation.py).
+    GET: per URL name, count/mean/p50/p95/p99/max of wall_ms, db_queries, db_ms,
+    serializer_ms and response_bytes, plus the most recent slow requests with their SQL.
+    DELETE: start the histograms over.
+    """
+    if not request.user.is_staff:
+        return Response(
+            {"error": "Admin access required"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    if request.method == 'DELETE':
+        registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response(registry.snapshot(), status=status.HTTP_200_OK)
@@ -1,47 +1,150 @@
-from django.http import HttpResponse, Http404
+from django.http import FileResponse, HttpResponse, Http404, StreamingHttpResponse
 from django.conf import settings
-from django.views.decorators.cache import never_cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.decorators.http import require_http_methods
-from django.utils.deprecation import MiddlewareMixin
-import os
+from pathlib import Path
 import mimetypes
+import re
 
-@never_cache
-@require_http_methods(["GET"])
-def serve_media_with_cors(request, path):
+# Size of each read when streaming a byte range
+STREAM_CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def resolve_media_path(path):
     """
-    Serve media files with proper CORS headers to allow cross-origin access.
-    This is especially important when using ngrok or other tunnel services.
+    Resolve a URL path to a file inside MEDIA_ROOT.
+    Raises Http404 for missing files and for anything that escapes MEDIA_ROOT
+    (../ segments, absolute paths, symlinks pointing outside).
     """
-    # Build the full file path
-    file_path = os.path.join(settings.MEDIA_ROOT, path)
-    
-    # Check if file exists
-    if not os.path.exists(file_path) or not os.path.isfile(file_path):
-        raise Http404("File not found")
-    
-    # Get the file's MIME type
-    content_type, _ = mimetypes.guess_type(file_path)
-    if content_type is None:
-        content_type = 'application/octet-stream'
-    
-    # Read the file
+    media_root = Path(settings.MEDIA_ROOT).resolve()
     try:
-        with open(file_path, 'rb') as f:
-            content = f.read()
-    except IOError:
-        raise Http404("File not accessible")
-    
-    # Create response with CORS headers
-    response = HttpResponse(content, content_type=content_type)
-    
-    # Add CORS headers
+        file_path = (media_root / path).resolve()
+        file_path.relative_to(media_root)
+    except (ValueError, OSError):
+        raise Http404("File not found")
+    if not file_path.is_file():
+        raise Http404("File not found")
+    return file_path
+
+
+def parse_range(header, size):
+    """
+    Parse a single "bytes=start-end" Range header.
+    Returns (start, end) inclusive, None to ignore the header (multiple or
+    malformed ranges are served as a full response), or False if unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if size == 0:
+        # No byte of an empty file can be served
+        return False
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def stream_file_range(file_path, start, end):
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def add_cors_headers(response):
     response['Access-Control-Allow-Origin'] = '*'
-    response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-    response['Access-Control-Allow-Headers'] = 'ngrok-skip-browser-warning, User-Agent'
-    response['Access-Control-Expose-Headers'] = 'content-type, content-length, cache-control, expires, last-modified, etag'
-    
-    # Add cache headers
-    response['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
-    
+    response['Access-Control-Allow-Methods'] = 'GET, HEAD, OPTIONS'
+    response['Access-Control-Allow-Headers'] = 'ngrok-skip-browser-warning, User-Agent, Range'
+    response['Access-Control-Expose-Headers'] = (
+        'content-type, content-length, content-range, accept-ranges, cache-control, expires, last-modified, etag'
+    )
     return response
+
+
+def add_cache_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600)}"
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_media_with_cors(request, path):
+    """
+    Serve media files with proper CORS headers to allow cross-origin access.
+    This is especially important when using ngrok or other tunnel services.
+
+    Files are streamed (never read fully into memory), single byte ranges are
+    honoured with 206 responses, and ETag/Last-Modified validators turn repeat
+    requests into 304s. With settings.MEDIA_ACCEL_MODE set to "x-accel-redirect"
+    (nginx) or "x-sendfile" (Apache/lighttpd) the file transfer is handed off to
+    the web server instead.
+    """
+    file_path = resolve_media_path(path)
+    stat = file_path.stat()
+    size = stat.st_size
+    etag = f'"{int(stat.st_mtime_ns):x}-{size:x}"'
+    last_modified = int(stat.st_mtime)
+
+    content_type, _ = mimetypes.guess_type(str(file_path))
+    content_type = content_type or 'application/octet-stream'
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return add_cache_headers(add_cors_headers(conditional), etag, last_modified)
+
+    accel_mode = getattr(settings, 'MEDIA_ACCEL_MODE', '')
+    if accel_mode:
+        response = HttpResponse(content_type=content_type)
+        relative = file_path.relative_to(Path(settings.MEDIA_ROOT).resolve()).as_posix()
+        if accel_mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + relative
+        else:
+            response['X-Sendfile'] = str(file_path)
+        return add_cache_headers(add_cors_headers(response), etag, last_modified)
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            stream_file_range(file_path, start, end) if request.method == 'GET' else iter(()),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        # FileResponse streams in blocks and uses wsgi.file_wrapper (sendfile) when available
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    return add_cache_headers(add_cors_headers(response), etag, last_modified)
@@ -0,0 +1,230 @@
+import json
+from datetime import datetime
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset (cursor) mode.
+
+    Without a `cursor` query param this behaves exactly like PageNumberPagination.
+    With `?cursor=` (empty for the first page) it pages on the queryset's own
+    ordering - e.g. `-date_added`, `unit_price`, `-created_at` - plus an `id`
+    tiebreaker, using `WHERE (key, id) > (last_key, last_id)` style filters
+    instead of OFFSET, so deep pages cost the same as the first one.
+    The COUNT(*) query is skipped in cursor mode unless `?count=true` is passed.
+
+    Cursor responses look like: {"next": url, "previous": url, "results": [...]}
+    (plus "count" when requested).
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_queryset = self.get_cursor_queryset(queryset, request)
+        self.count = queryset.count() if self.wants_count(request) else None
+        return self.finish_cursor_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        paginate_queryset() with the async ORM, for the async catalog views
+        (products/api/async_views.py).
+        """
+        self.request = request
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return await self.apaginate_pages(queryset, request)
+
+        page_queryset = self.get_cursor_queryset(queryset, request)
+        self.count = await queryset.acount() if self.wants_count(request) else None
+        return self.finish_cursor_page([obj async for obj in page_queryset])
+
+    async def apaginate_pages(self, queryset, request):
+        """PageNumberPagination.paginate_queryset() with acount() and an async slice."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached_property; filling it in spares the sync count()
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+        # Same bounds as Paginator.page()
+        bottom = (number - 1) * paginator.per_page
+        top = bottom + paginator.per_page
+        if top + paginator.orphans >= paginator.count:
+            top = paginator.count
+        results = [obj async for obj in queryset[bottom:top]]
+        self.page = paginator._get_page(results, number, paginator)
+        return results
+
+    def wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() == 'true'
+
+    def get_cursor_queryset(self, queryset, request):
+        """
+        Set up cursor mode for the request and return the (unevaluated) queryset
+        of the page, plus one row to tell whether there is a next one.
+        """
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.datetime_keys = self.get_datetime_keys(queryset.model, self.ordering)
+        position, self.reverse = self.decode_cursor(request)
+        self.after_cursor = position is not None
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.build_filter(ordering, position))
+        return queryset[:self.page_size + 1]
+
+    def finish_cursor_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        # Moving backwards we always came from a later page; moving forwards, from an earlier one
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else self.after_cursor
+        self.page_results = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.build_link(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.use_cursor:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.build_link(self.page_results[0], reverse=True)
+
+    def get_ordering(self, queryset):
+        """
+        The queryset's ordering (or the model default) as field names, with an id tiebreaker.
+        """
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise NotFound('Cursor pagination is not supported for this listing')
+        ordering = [{'pk': 'id', '-pk': '-id'}.get(field, field) for field in ordering]
+        if not any(field.lstrip('-') == 'id' for field in ordering):
+            descending = ordering[0].startswith('-') if ordering else False
+            ordering.append('-id' if descending else 'id')
+        return ordering
+
+    @staticmethod
+    def get_datetime_keys(model, ordering):
+        """Indexes of the ordering fields that are datetimes (annotations are not)."""
+        keys = set()
+        for index, field in enumerate(ordering):
+            current = model
+            try:
+                for name in field.lstrip('-').split('__'):
+                    model_field = current._meta.get_field(name)
+                    current = model_field.related_model
+            except (FieldDoesNotExist, AttributeError):
+                continue
+            if isinstance(model_field, models.DateTimeField):
+                keys.add(index)
+        return keys
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def build_filter(ordering, position):
+        """
+        Rows strictly after `position` in `ordering`:
+        (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... with < for descending keys.
+        """
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[index]})
+            for previous_field, value in zip(ordering[:index], position):
+                step &= Q(**{previous_field.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def position_of(self, obj):
+        position = []
+        for field in self.ordering:
+            value = obj
+            for attribute in field.lstrip('-').split('__'):
+                value = getattr(value, attribute)
+            # isoformat() keeps the microseconds that DjangoJSONEncoder drops: rows
+            # within the same millisecond as the cursor row must not be skipped
+            position.append(value.isoformat() if isinstance(value, datetime) else value)
+        return position
+
+    def build_link(self, obj, reverse):
+        payload = {'p': self.position_of(obj), 'r': reverse}
+        cursor = urlsafe_b64encode(json.dumps(payload, cls=DjangoJSONEncoder).encode()).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            position = payload['p']
+            reverse = bool(payload.get('r', False))
+        except (TypeError, ValueError, KeyError, BinasciiError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Datetime keys travel as full-precision ISO strings (see position_of)
+        for index in self.datetime_keys:
+            try:
+                value = parse_datetime(position[index])
+            except (TypeError, ValueError):
+                value = None
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            position[index] = value
+        return position, reverse
@@ -58,9 +58,13 @@ INSTALLED_APPS = [
     "users",
     "contact",
     "payments",
+    "mailer",
+    "benchmarks",
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the other middleware too (backend/instrumentation.py)
+    "backend.instrumentation.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -77,8 +81,18 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
-        "APP_DIRS": True,
         "OPTIONS": {
+            # Templates (e.g. the email templates, mailer/rendering.py) are compiled
+            # once per process instead of on every render
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
             "context_processors": [
                 "django.template.context_processors.debug",
                 "django.template.context_processors.request",
@@ -103,6 +117,25 @@ DATABASES = {
     }
 }
 
+# --- Cache ---
+# Local-memory by default; set CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# and CACHE_LOCATION=/path/to/dir to share the cache between worker processes.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "store-backend"),
+    }
+}
+CATALOG_CACHE_ALIAS = "default"
+CATALOG_CACHE_TIMEOUT = int(os.environ.get("CATALOG_CACHE_TIMEOUT", 300))
+# Navbar cart counts (cart/pricing.py)
+CART_COUNT_CACHE_ALIAS = "default"
+CART_COUNT_CACHE_TIMEOUT = int(os.environ.get("CART_COUNT_CACHE_TIMEOUT", 3600))
+
+# Serve the catalog GET endpoints with async views (products/api/async_views.py).
+# backend/asgi.py turns this on; under WSGI the sync DRF views are used.
+ASYNC_CATALOG_VIEWS = os.environ.get("ASYNC_CATALOG_VIEWS", "False").lower() in ("true", "1")
+
 # --- Password validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -124,6 +157,18 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Product image variants (products/images.py)
+PRODUCT_IMAGE_WIDTHS = (320, 640, 1024)
+PRODUCT_IMAGE_WORKERS = int(os.environ.get("PRODUCT_IMAGE_WORKERS", 2))
+PRODUCT_IMAGE_VARIANTS_ASYNC = True
+
+# Media serving (backend/media_views.py)
+MEDIA_CACHE_MAX_AGE = int(os.environ.get("MEDIA_CACHE_MAX_AGE", 3600))
+# "" streams from Django; "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd) offloads to the web server
+MEDIA_ACCEL_MODE = os.environ.get("MEDIA_ACCEL_MODE", "")
+# Internal nginx location that maps to MEDIA_ROOT, used with x-accel-redirect
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX", "/protected-media/")
+
 # --- Primary Key Field ---
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -133,7 +178,7 @@ REST_FRAMEWORK = {
         "rest_framework_simplejwt.authentication.JWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.IsAuthenticated"],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "backend.pagination.KeysetPagination",
     "PAGE_SIZE": 10,
 }
 
@@ -164,7 +209,7 @@ CORS_ALLOW_METHODS = [
 CORS_ALLOW_HEADERS = [
     "accept", "accept-encoding", "authorization", "content-type",
     "dnt", "origin", "user-agent", "x-csrftoken", "x-requested-with",
-    "ngrok-skip-browser-warning",
+    "ngrok-skip-browser-warning", "idempotency-key",
 ]
 
 # Allow media files to be accessed from any origin
@@ -174,10 +219,13 @@ CORS_URLS_REGEX = r'^/(api|media)/.*$'
 CORS_EXPOSE_HEADERS = [
     "content-type",
     "content-length",
+    "content-range",
+    "accept-ranges",
     "cache-control",
     "expires",
     "last-modified",
     "etag",
+    "idempotent-replayed",
 ]
 
 # --- JWT ---
@@ -200,6 +248,22 @@ SIMPLE_JWT = {
 
 # --- Email ---
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# Outbox worker (mailer/outbox.py, `python manage.py run_mail_worker`)
+MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get("MAIL_OUTBOX_BATCH_SIZE", 50))
+MAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get("MAIL_OUTBOX_MAX_ATTEMPTS", 5))
+# Seconds before the first retry of a failed email; doubles on every further attempt
+MAIL_OUTBOX_RETRY_DELAY = int(os.environ.get("MAIL_OUTBOX_RETRY_DELAY", 60))
+# Seconds after which emails claimed by a worker that died are picked up again
+MAIL_OUTBOX_CLAIM_TIMEOUT = int(os.environ.get("MAIL_OUTBOX_CLAIM_TIMEOUT", 300))
+
+# --- Request instrumentation (backend/instrumentation.py) ---
+# Add a Server-Timing header (app, db and serializer time) to every response
+INSTRUMENTATION_SERVER_TIMING = os.environ.get("INSTRUMENTATION_SERVER_TIMING", "True").lower() in ("true", "1")
+# Requests taking at least this many milliseconds are logged with their slowest queries
+INSTRUMENTATION_SLOW_REQUEST_MS = int(os.environ.get("INSTRUMENTATION_SLOW_REQUEST_MS", 500))
+INSTRUMENTATION_SLOW_QUERIES_LOGGED = int(os.environ.get("INSTRUMENTATION_SLOW_QUERIES_LOGGED", 10))
+# Slow requests kept in memory for GET /api/admin/performance/
+INSTRUMENTATION_SLOW_REQUESTS_KEPT = int(os.environ.get("INSTRUMENTATION_SLOW_REQUESTS_KEPT", 50))
 
 # --- Frontend ---
 FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
@@ -207,3 +271,40 @@ FRONTEND_URL = os.environ.get("FRONTEND_URL", "http://localhost:5173")
 # --- Stripe ---
 STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY", "")
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "")
+# Signing secret of the webhook endpoint; without it webhooks are rejected, or accepted unverified with DEBUG on
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET", "")
+# Webhook inbox worker (payments/webhooks.py, `python manage.py run_webhook_worker`)
+PAYMENTS_WEBHOOK_WORKERS = int(os.environ.get("PAYMENTS_WEBHOOK_WORKERS", 4))
+PAYMENTS_WEBHOOK_BATCH_SIZE = int(os.environ.get("PAYMENTS_WEBHOOK_BATCH_SIZE", 50))
+PAYMENTS_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("PAYMENTS_WEBHOOK_MAX_ATTEMPTS", 8))
+# Seconds before the first retry of a failed event; doubles on every further attempt
+PAYMENTS_WEBHOOK_RETRY_DELAY = int(os.environ.get("PAYMENTS_WEBHOOK_RETRY_DELAY", 30))
+# Seconds after which events claimed by a worker that died are picked up again
+PAYMENTS_WEBHOOK_CLAIM_TIMEOUT = int(os.environ.get("PAYMENTS_WEBHOOK_CLAIM_TIMEOUT", 300))
+# Payment gateway (payments/gateways.py): "stripe", or "fake" for an in-process stand-in
+PAYMENTS_GATEWAY = os.environ.get("PAYMENTS_GATEWAY", "stripe")
+# Seconds to connect to / wait for a response from the Stripe API
+PAYMENTS_STRIPE_CONNECT_TIMEOUT = float(os.environ.get("PAYMENTS_STRIPE_CONNECT_TIMEOUT", 3))
+PAYMENTS_STRIPE_READ_TIMEOUT = float(os.environ.get("PAYMENTS_STRIPE_READ_TIMEOUT", 10))
+# Retries per call, and retries allowed per call made across the process
+PAYMENTS_STRIPE_MAX_RETRIES = int(os.environ.get("PAYMENTS_STRIPE_MAX_RETRIES", 2))
+PAYMENTS_STRIPE_RETRY_RATIO = float(os.environ.get("PAYMENTS_STRIPE_RETRY_RATIO", 0.2))
+# Fake gateway: latency added to every call, and shares of failed calls and declined payments
+PAYMENTS_FAKE_LATENCY_MS = float(os.environ.get("PAYMENTS_FAKE_LATENCY_MS", 0))
+PAYMENTS_FAKE_JITTER_MS = float(os.environ.get("PAYMENTS_FAKE_JITTER_MS", 0))
+PAYMENTS_FAKE_FAILURE_RATE = float(os.environ.get("PAYMENTS_FAKE_FAILURE_RATE", 0))
+PAYMENTS_FAKE_DECLINE_RATE = float(os.environ.get("PAYMENTS_FAKE_DECLINE_RATE", 0))
+
+# --- Product search ---
+# Text search configuration used by the PostgreSQL full-text backend (products/search.py)
+PRODUCT_SEARCH_CONFIG = os.environ.get("PRODUCT_SEARCH_CONFIG", "english")
+
+# --- Idempotency keys (orders/idempotency.py) ---
+# Seconds after which an unfinished request's key may be taken over by a retry
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+# Hours a stored response is kept for replay before purge_idempotency_keys deletes it
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 24))
+
+# --- Stock reservations (products/inventory.py) ---
+# Seconds a started checkout holds its stock before release_expired_reservations gives it back
+STOCK_RESERVATION_TTL = int(os.environ.get("STOCK_RESERVATION_TTL", 900))
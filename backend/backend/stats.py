@@ -0,0 +1,79 @@
+"""
+Shared helpers for dashboard statistics endpoints.
+
+Counters over one table are computed in a single aggregate() with conditional
+aggregates (COUNT(...) FILTER (WHERE ...) on PostgreSQL, CASE WHEN elsewhere)
+instead of one count() query per counter:
+
+    with StatsEngine() as engine:
+        products = engine.aggregate(
+            Product.objects.all(),
+            total=Count('pk'),
+            out_of_stock=count_where(stock=0),
+        )
+    return Response({**products, 'meta': engine.report()})
+
+The engine also measures the request: how many queries it ran, the time spent in
+the database and the total time, which endpoints return under "meta".
+"""
+import logging
+import time
+from django.db import connections
+from django.db.models import Count, Q, Sum
+
+logger = logging.getLogger(__name__)
+
+
+def count_where(*args, **lookups):
+    """COUNT of the rows matching the given Q objects/lookups."""
+    return Count('pk', filter=Q(*args, **lookups))
+
+
+def sum_where(field, *args, **lookups):
+    """SUM of `field` over the rows matching the given Q objects/lookups."""
+    return Sum(field, filter=Q(*args, **lookups))
+
+
+class StatsEngine:
+    """
+    Runs dashboard aggregates and records query count and timing while active.
+    Use it as a context manager around all queries of one request.
+    """
+    def __init__(self, using='default'):
+        self.using = using
+        self.queries = 0
+        self.db_time = 0.0
+        self.started = None
+        self.finished = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._wrapper = connections[self.using].execute_wrapper(self._record_query)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+        self.finished = time.perf_counter()
+        logger.debug("Stats request: %s", self.report())
+
+    def _record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+    def aggregate(self, queryset, **expressions):
+        """All counters for one table in one query. Missing values (empty tables) become 0."""
+        result = queryset.aggregate(**expressions)
+        return {name: 0 if value is None else value for name, value in result.items()}
+
+    def report(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return {
+            'queries': self.queries,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'total_time_ms': round((end - self.started) * 1000, 2),
+        }
@@ -0,0 +1,167 @@
+import os
+import tempfile
+from pathlib import Path
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+from users.models import User
+from products.models import Product, Category
+from .instrumentation import Histogram, registry
+from .media_views import parse_range, serve_media_with_cors
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True,
+        )
+        category = Category.objects.create(name='Books')
+        for i in range(3):
+            Product.objects.create(title=f'Book {i}', description='Pages', unit_price=10, stock=5, category=category)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_requests_are_measured_per_url_name(self):
+        for _ in range(3):
+            response = self.client.get(reverse('product-list-create'))
+            self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+$',
+        )
+        self.client.get('/api/no-such-endpoint/')
+
+        stats = self.client.get(reverse('admin-performance-stats')).data
+        self.assertEqual(list(stats['endpoints']), ['product-list-create'])
+        products = stats['endpoints']['product-list-create']
+        self.assertEqual(products['wall_ms']['count'], 3)
+        self.assertGreater(products['db_queries']['p50'], 0)
+        self.assertGreater(products['serializer_ms']['max'], 0)
+        self.assertEqual(products['response_bytes']['max'], len(response.content))
+        self.assertEqual(stats['slow_requests'], [])
+
+        self.client.delete(reverse('admin-performance-stats'))
+        self.assertEqual(list(registry.snapshot()['endpoints']), ['admin-performance-stats'])
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('backend.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('admin-dashboard-stats'))
+        self.assertIn('admin-dashboard-stats', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+        slow = registry.snapshot()['slow_requests'][0]
+        self.assertEqual((slow['url_name'], slow['status']), ('admin-dashboard-stats', 200))
+        self.assertTrue(slow['queries'])
+        self.assertEqual(slow['queries'], sorted(slow['queries'], key=lambda query: -query['ms']))
+
+    def test_stats_are_admin_only(self):
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='pass12345')
+        self.client.force_authenticate(customer)
+        self.assertEqual(self.client.get(reverse('admin-performance-stats')).status_code, 403)
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(value)
+        summary = histogram.summary()
+        self.assertEqual((summary['count'], summary['mean'], summary['max']), (100, 50.5, 100))
+        # Accurate to one bucket (about 19%)
+        self.assertTrue(50 <= summary['p50'] <= 50 * 1.19)
+        self.assertTrue(95 <= summary['p95'] <= 100)
+        self.assertEqual(Histogram().summary()['p99'], 0)
+
+
+class MediaViewTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        root = Path(tmp.name)
+        self.media_root = root / 'media'
+        (self.media_root / 'images').mkdir(parents=True)
+        self.file = self.media_root / 'images' / 'photo.jpg'
+        self.file.write_bytes(bytes(range(100)))
+        (self.media_root / 'empty.txt').write_bytes(b'')
+        (root / 'secret.txt').write_text('secret')
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_ACCEL_MODE='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get(self, path='images/photo.jpg', **headers):
+        response = self.client.get(reverse('media_with_cors', args=[path]), **headers)
+        if response.streaming:
+            response.content_bytes = b''.join(response.streaming_content)
+            response.close()
+        return response
+
+    def test_paths_outside_media_root_are_not_found(self):
+        os.symlink(self.media_root.parent / 'secret.txt', self.media_root / 'link.txt')
+        request = RequestFactory().get('/media/')
+        for path in ('../secret.txt', 'images/../../secret.txt', str(self.media_root.parent / 'secret.txt'),
+                     'link.txt', 'images', 'missing.jpg'):
+            with self.subTest(path=path), self.assertRaises(Http404):
+                serve_media_with_cors(request, path)
+
+    def test_full_file_is_streamed_with_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_bytes, bytes(range(100)))
+        self.assertEqual((response['Content-Type'], response['Accept-Ranges']), ('image/jpeg', 'bytes'))
+        self.assertEqual(response['Access-Control-Allow-Origin'], '*')
+        self.assertTrue(response['ETag'])
+        self.assertIn('max-age=', response['Cache-Control'])
+
+    def test_byte_ranges(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content_bytes, bytes(range(10, 20)))
+        self.assertEqual((response['Content-Range'], response['Content-Length']), ('bytes 10-19/100', '10'))
+
+        response = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 95-99/100'))
+        self.assertEqual(response.content_bytes, bytes(range(95, 100)))
+
+        response = self.get(HTTP_RANGE='bytes=200-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+        response = self.get('empty.txt', HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */0'))
+
+        # Several ranges are answered with the whole file
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-1,5-6').status_code, 200)
+
+    def test_if_range(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        # The file changed since the client's copy: the whole file
+        response = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, response.content_bytes), (200, bytes(range(100))))
+
+    def test_conditional_requests(self):
+        response = self.get()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=http_date(0)).status_code, 200)
+
+    def test_transfer_is_offloaded_to_the_web_server(self):
+        with override_settings(MEDIA_ACCEL_MODE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/'):
+            response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/images/photo.jpg')
+        self.assertEqual((response.content, response['Content-Type']), (b'', 'image/jpeg'))
+
+        with override_settings(MEDIA_ACCEL_MODE='x-sendfile'):
+            response = self.get()
+        self.assertEqual(response['X-Sendfile'], str(self.file.resolve()))
+        self.assertEqual(response.content, b'')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=5-', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=5-100', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=-100', 10), (0, 9))
+        self.assertIs(parse_range('bytes=-0', 10), False)
+        self.assertIs(parse_range('bytes=-5', 0), False)
+        self.assertIs(parse_range('bytes=0-', 0), False)
+        self.assertIsNone(parse_range('items=0-5', 10))
+        self.assertIsNone(parse_range('bytes=-', 10))
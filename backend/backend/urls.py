@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from . import media_views
+from .instrumentation_views import performance_stats
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,6 +30,8 @@ urlpatterns = [
     path('api/', include('orders.urls')),
     path('api/', include('contact.urls')),
     path('api/payments/', include('payments.urls')),
+    # Request timing histograms and slow requests (admin only, backend/instrumentation.py)
+    path('api/admin/performance/', performance_stats, name='admin-performance-stats'),
     # Custom media serving with CORS headers
     path('media/<path:path>', media_views.serve_media_with_cors, name='media_with_cors'),
 ]
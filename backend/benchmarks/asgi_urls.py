@@ -0,0 +1,7 @@
+"""The project's URLs with the catalog served by the async views (ASGI side of benchmark_asgi)."""
+from django.urls import include, path
+from backend.urls import urlpatterns as project_urlpatterns
+from products.api import async_views
+from products.api.urls import catalog_patterns
+
+urlpatterns = [path('api/products/', include(catalog_patterns(async_views))), *project_urlpatterns]
@@ -0,0 +1,205 @@
+"""
+Catalog reads under many concurrent, slow clients: the async catalog views served
+by Django's ASGI handler against the DRF views served by its WSGI handler
+(`python manage.py benchmark_asgi`).
+
+Both handlers are called in-process, the way a server would call them: ASGIHandler
+with an ASGI scope on one event loop, WSGIHandler with a WSGI environ on a fixed
+pool of worker threads (a gunicorn gthread worker). Every request comes from one of
+`concurrency` clients that each send a request, read the response and send the next.
+Clients are slow: reading a response takes them `client_delay` seconds. A WSGI
+thread is stuck writing to such a client for that long; the ASGI event loop awaits
+the write and serves other requests meanwhile.
+
+Latency is measured from the client's side, so it includes waiting for a free WSGI
+thread. The query count of each request comes from its Server-Timing header
+(backend/instrumentation.py).
+"""
+import asyncio
+import io
+import math
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+from products.cache import get_cache
+from products.models import Category, Product, Review
+from .runner import summarize
+
+HOST = 'testserver'
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+def catalog_requests(count, seed=0):
+    """
+    `count` catalog GETs as (path, query string): listing pages, product pages,
+    reviews, categories and the price range, in a mix like the storefront's.
+    """
+    rng = random.Random(seed)
+    # Listing pages: the first two, as far as the category has products
+    category_pages = {
+        category_id: min(2, math.ceil(product_count / settings.REST_FRAMEWORK['PAGE_SIZE']))
+        for category_id, product_count in Category.objects.annotate(
+            product_count=Count('products'),
+        ).values_list('id', 'product_count')
+        if product_count
+    }
+    product_ids = list(Product.objects.values_list('id', flat=True)[:1000])
+    reviewed_ids = list(Review.objects.values_list('product_id', flat=True).distinct()[:1000]) or product_ids
+    requests = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            category_id = rng.choice(list(category_pages))
+            query = f"category={category_id}&sort_by={rng.choice(['newest', 'price_asc', 'rating'])}"
+            page = rng.randint(1, category_pages[category_id])
+            requests.append((reverse('product-list-create'), f"{query}&page={page}"))
+        elif kind < 0.7:
+            requests.append((reverse('product-detail', args=[rng.choice(product_ids)]), ''))
+        elif kind < 0.9:
+            requests.append((reverse('product-reviews-list', args=[rng.choice(reviewed_ids)]), ''))
+        elif kind < 0.95:
+            requests.append((reverse('category-list'), ''))
+        else:
+            requests.append((reverse('price-range'), ''))
+    return requests
+
+
+def split(requests, clients):
+    """Deal the requests out to the clients in turn."""
+    return [requests[i::clients] for i in range(clients)]
+
+
+def queries_of(server_timing):
+    match = QUERIES.search(server_timing or '')
+    return int(match.group(1)) if match else 0
+
+
+def run_wsgi(requests, concurrency, threads, client_delay):
+    """Serve the requests with WSGIHandler on `threads` worker threads."""
+    handler = WSGIHandler()
+    workers = threading.BoundedSemaphore(threads)
+    samples = []
+
+    def serve(path, query_string):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query_string, 'SCRIPT_NAME': '',
+            'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+            'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.multithread': True,
+            'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        started = {}
+
+        def start_response(status, headers):
+            started['status'] = int(status.split()[0])
+            started['headers'] = dict(headers)
+
+        with workers:
+            body = handler(environ, start_response)
+            try:
+                b''.join(body)
+            finally:
+                body.close()
+            # The worker thread writes the response to the slow client
+            time.sleep(client_delay)
+        return started['status'], queries_of(started['headers'].get('Server-Timing'))
+
+    def client(own_requests):
+        for path, query_string in own_requests:
+            start = time.perf_counter()
+            status, queries = serve(path, query_string)
+            samples.append((time.perf_counter() - start, queries, status))
+        connection.close()
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(client, split(requests, concurrency)))
+    return summarize(samples, time.perf_counter() - begin)
+
+
+def run_asgi(requests, concurrency, client_delay):
+    """Serve the requests with ASGIHandler on one event loop."""
+    handler = ASGIHandler()
+    samples = []
+
+    async def serve(path, query_string):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': query_string.encode(), 'headers': [(b'host', HOST.encode())],
+            'client': ('127.0.0.1', 50000), 'server': (HOST, 80),
+        }
+        received = False
+        done = asyncio.Event()
+        response = {}
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Django listens for a disconnect while it handles the request
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {name.decode().lower(): value.decode() for name, value in message['headers']}
+            elif not message.get('more_body', False):
+                # Writing to the slow client: the event loop serves other requests meanwhile
+                await asyncio.sleep(client_delay)
+                done.set()
+
+        await handler(scope, receive, send)
+        done.set()
+        return response['status'], queries_of(response['headers'].get('server-timing'))
+
+    async def client(own_requests):
+        for path, query_string in own_requests:
+            start = time.perf_counter()
+            status, queries = await serve(path, query_string)
+            samples.append((time.perf_counter() - start, queries, status))
+
+    async def main():
+        await asyncio.gather(*(client(own) for own in split(requests, concurrency)))
+
+    begin = time.perf_counter()
+    asyncio.run(main())
+    return summarize(samples, time.perf_counter() - begin)
+
+
+def compare_servers(requests, concurrency=50, threads=4, client_delay=0.05, warmup=20, catalog_cache=False):
+    """
+    Run the same requests through both servers. Unless catalog_cache is set, the
+    catalog cache is replaced by a dummy one, so every request reaches the views;
+    if it is, each server starts with an empty cache.
+    Returns {'wsgi': summary, 'asgi': summary} (see runner.summarize).
+    """
+    # Queued requests are slow by design here; do not log each one
+    overrides = {'INSTRUMENTATION_SLOW_REQUEST_MS': math.inf}
+    if not catalog_cache:
+        overrides['CACHES'] = {
+            **settings.CACHES, 'benchmark-dummy': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        }
+        overrides['CATALOG_CACHE_ALIAS'] = 'benchmark-dummy'
+    results = {}
+    with override_settings(ROOT_URLCONF='benchmarks.wsgi_urls', **overrides):
+        get_cache().clear()
+        run_wsgi(requests[:warmup], min(concurrency, threads), threads, 0)
+        results['wsgi'] = run_wsgi(requests, concurrency, threads, client_delay)
+    with override_settings(ROOT_URLCONF='benchmarks.asgi_urls', **overrides):
+        get_cache().clear()
+        run_asgi(requests[:warmup], concurrency, 0)
+        results['asgi'] = run_asgi(requests, concurrency, client_delay)
+    return results
@@ -0,0 +1,400 @@
+"""
+Synthetic storefront data for benchmarks and staging (`python manage.py seed_store`,
+`python manage.py run_benchmarks`).
+
+Seeder fills the database with users, categories, products, reviews, carts, orders,
+order items and payments. The same seed and options always produce the same rows,
+so runs at the same scale can be compared. Rows are written in large batches: with
+PostgreSQL COPY ... FROM STDIN when the database is PostgreSQL, with bulk_create
+otherwise. Model save() methods and signals are skipped either way, so the seeder
+fills in what they would maintain: order numbers, payment ids, item titles and the
+opening stock movement of each product, and once all rows are in, the rating aggregates, cart totals, sales rollups, search index
+and catalog cache version.
+
+The shape of the data is tunable:
+- review_skew / product_skew: how strongly reviews / order and cart lines
+  concentrate on popular products. Popularity follows a Zipf law with this exponent;
+  0 is uniform.
+- items_per_order / items_per_cart: line counts are geometric with this mean,
+  capped at max_items_per_order.
+- days: products, reviews and orders are spread over this many past days. Orders
+  older than two weeks are mostly delivered or cancelled, recent ones still in progress.
+"""
+import bisect
+import io
+import itertools
+import json
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from cart.models import Cart, CartItem
+from orders import rollups
+from orders.models import Order, OrderItem
+from payments.models import Payment
+from products.cache import bump_catalog_version
+from products.inventory import record_movements
+from products.models import Category, Product, Review, StockMovement
+from products.search import get_search_backend
+from users.models import User
+
+# Row counts per --scale preset
+SCALES = {
+    'small': {'users': 500, 'categories': 20, 'products': 1_000, 'reviews': 10_000, 'orders': 5_000, 'carts': 100},
+    'medium': {
+        'users': 5_000, 'categories': 50, 'products': 10_000, 'reviews': 100_000, 'orders': 50_000, 'carts': 1_000,
+    },
+    'large': {
+        'users': 50_000, 'categories': 100, 'products': 100_000, 'reviews': 1_000_000, 'orders': 500_000,
+        'carts': 10_000,
+    },
+}
+
+# Defaults of the tunable distributions (see the module docstring)
+DISTRIBUTIONS = {
+    'review_skew': 1.0,
+    'product_skew': 0.8,
+    'items_per_order': 2.5,
+    'items_per_cart': 3.0,
+    'max_items_per_order': 10,
+    'days': 365,
+}
+
+# Seeded users all share this password
+PASSWORD = 'benchmark'
+
+# Seeded order numbers start with this (payment ids with PAY-BENCH-)
+PREFIX = 'BENCH-'
+
+WORDS = (
+    'wireless', 'portable', 'smart', 'classic', 'organic', 'premium', 'compact', 'leather',
+    'stainless', 'ergonomic', 'vintage', 'digital', 'waterproof', 'cotton', 'bamboo', 'ceramic',
+    'speaker', 'headphones', 'lamp', 'backpack', 'kettle', 'keyboard', 'jacket', 'watch',
+    'blender', 'camera', 'notebook', 'chair', 'bottle', 'charger', 'sneakers', 'mug',
+)
+
+RECENT_STATUSES = ('pending', 'confirmed', 'processing', 'packed', 'shipped', 'out_for_delivery', 'delivered')
+PAID_STATUSES = {'confirmed', 'processing', 'packed', 'shipped', 'out_for_delivery', 'delivered'}
+CARD_METHODS = {'credit_card', 'debit_card', 'stripe'}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+@contextmanager
+def explicit_timestamps(*seeded_models):
+    """
+    Let seeded rows carry their own dates (spread over the past) by switching off
+    auto_now/auto_now_add on the models' date fields while seeding.
+    """
+    switched = []
+    for model in seeded_models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                switched.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in switched:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class BulkCreateWriter:
+    """Inserts rows with bulk_create, batch_size rows per INSERT."""
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def write(self, model, rows):
+        created = 0
+        for batch in batches(rows, self.batch_size):
+            model.objects.bulk_create(batch)
+            created += len(batch)
+        return created
+
+
+class CopyWriter:
+    """
+    Streams rows into PostgreSQL with COPY ... FROM STDIN, batch_size rows per COPY.
+    The primary key is left to the table's sequence, as with bulk_create.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+
+    def write(self, model, rows):
+        fields = [field for field in model._meta.concrete_fields if field is not model._meta.pk]
+        columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+        sql = f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN'
+        created = 0
+        for batch in batches(rows, self.batch_size):
+            data = ''.join(
+                '\t'.join(self.format(field.get_prep_value(field.pre_save(row, True))) for field in fields) + '\n'
+                for row in batch
+            )
+            self.copy(sql, data)
+            created += len(batch)
+        return created
+
+    @staticmethod
+    def copy(sql, data):
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, 'copy_expert'):
+                raw.copy_expert(sql, io.StringIO(data))  # psycopg2
+            else:
+                with raw.copy(sql) as copy:  # psycopg 3
+                    copy.write(data)
+
+    @staticmethod
+    def format(value):
+        """A value in COPY's text format."""
+        if value is None:
+            return r'\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if isinstance(value, (dict, list)):
+            value = json.dumps(value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        else:
+            value = str(value)
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=5000, use_copy=None, log=None, **distributions):
+        unknown = set(distributions) - set(DISTRIBUTIONS)
+        if unknown:
+            raise TypeError(f"Unknown distribution options: {', '.join(sorted(unknown))}")
+        self.random = random.Random(seed)
+        self.options = {**DISTRIBUTIONS, **distributions}
+        if use_copy is None:
+            use_copy = connection.vendor == 'postgresql'
+        self.writer = (CopyWriter if use_copy else BulkCreateWriter)(batch_size)
+        self.log = log or (lambda message: None)
+        self.now = timezone.now()
+
+    def seed(self, users, categories, products, reviews, orders, carts=0):
+        """Create all rows in one transaction. Returns {name: rows created}."""
+        started = time.perf_counter()
+        with transaction.atomic(), explicit_timestamps(Product, Review, Order, OrderItem, Payment):
+            counts = {
+                'users': self.create_users(users),
+                'categories': self.create_categories(categories),
+                'products': self.create_products(products),
+                'reviews': self.create_reviews(reviews),
+                'carts': self.create_carts(carts),
+                'orders': self.create_orders(orders),
+            }
+            self.finish()
+        self.log(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+        return counts
+
+    def insert(self, model, rows):
+        """Write `rows` (any iterable) in batches; returns the number of rows."""
+        started = time.perf_counter()
+        created = self.writer.write(model, rows)
+        self.log(f"  {model._meta.label}: {created} in {time.perf_counter() - started:.1f}s")
+        return created
+
+    # --- Distributions ---
+
+    def words(self, count):
+        return ' '.join(self.random.choices(WORDS, k=count))
+
+    def past(self):
+        """A moment in the last `days` days."""
+        return self.now - timedelta(seconds=self.random.uniform(0, self.options['days'] * 86400))
+
+    def geometric(self, mean):
+        """1, 2, 3... with the given mean, capped at max_items_per_order."""
+        if mean <= 1:
+            return 1
+        value = 1 + int(math.log(1 - self.random.random()) / math.log(1 - 1 / mean))
+        return min(self.options['max_items_per_order'], value)
+
+    def popularity(self, ids, skew):
+        """
+        A picker returning k ids drawn with Zipf(skew) weights. Ranks are shuffled, so
+        the popular products are spread over the catalog rather than being the first ids.
+        """
+        ranked = list(ids)
+        self.random.shuffle(ranked)
+        cumulative = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(ranked) + 1)))
+        total = cumulative[-1] if cumulative else 0
+
+        def pick(k=1):
+            return [ranked[bisect.bisect(cumulative, self.random.random() * total)] for _ in range(k)]
+        return pick
+
+    def distinct(self, pick, count):
+        """Up to `count` distinct picks: popular ids may come up more than once."""
+        chosen = dict.fromkeys(pick(count))
+        for _ in range(count):
+            if len(chosen) >= count:
+                break
+            chosen.update(dict.fromkeys(pick()))
+        return list(chosen)
+
+    # --- Rows ---
+
+    def create_users(self, count):
+        """`count` customers plus the bench-admin staff user."""
+        password = make_password(PASSWORD)
+        admin = User(
+            username='bench-admin', email='bench-admin@example.com', password=password,
+            is_staff=True, is_email_verified=True,
+        )
+        return self.insert(User, itertools.chain([admin], (
+            User(
+                username=f'bench{i}', email=f'bench{i}@example.com', password=password,
+                first_name=f'Bench{i}', is_email_verified=True,
+            )
+            for i in range(count)
+        )))
+
+    def customer_ids(self):
+        return list(User.objects.filter(username__startswith='bench', is_staff=False).order_by('id').values_list('id', flat=True))
+
+    def create_categories(self, count):
+        return self.insert(Category, (Category(name=f'Category {i}') for i in range(count)))
+
+    def create_products(self, count):
+        category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+        last_id = Product.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        created = self.insert(Product, (
+            Product(
+                title=self.words(3).title(),
+                description=self.words(20),
+                unit_price=Decimal(self.random.randint(100, 100_000)) / 100,
+                stock=self.random.randint(0, 500),
+                category_id=self.random.choice(category_ids),
+                date_added=self.past(),
+            )
+            for _ in range(count)
+        ))
+        # The opening stock, as the post_save journal would have recorded it, so the
+        # stock journal adds up to each product's stock
+        stock = Product.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'stock')
+        for batch in batches(stock.iterator(), self.writer.batch_size):
+            record_movements(dict(batch), StockMovement.ADJUSTMENT)
+        return created
+
+    def create_reviews(self, count):
+        user_ids = self.customer_ids()
+        product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        pick_product = self.popularity(product_ids, self.options['review_skew'])
+        # One review per user and product (unique_user_product_review): draw until there
+        # are enough distinct pairs, giving up if the skew leaves too few of them
+        count = min(count, len(user_ids) * len(product_ids))
+        pairs = set()
+        for _ in range(count * 5):
+            if len(pairs) >= count:
+                break
+            pairs.add((self.random.choice(user_ids), pick_product()[0]))
+        # Some products are simply better: ratings scatter around a per-product mean
+        quality = {product_id: self.random.uniform(2.5, 4.8) for product_id in product_ids}
+        return self.insert(Review, (
+            Review(
+                user_id=user_id, product_id=product_id, title=self.words(3).capitalize(),
+                content=self.words(25),
+                rating=min(5, max(1, round(self.random.gauss(quality[product_id], 1)))),
+                created_at=self.past(),
+            )
+            for user_id, product_id in sorted(pairs)
+        ))
+
+    def create_carts(self, count):
+        user_ids = self.customer_ids()
+        shoppers = sorted(self.random.sample(user_ids, min(count, len(user_ids))))
+        created = self.insert(Cart, (Cart(user_id=user_id) for user_id in shoppers))
+        prices = dict(Product.objects.values_list('id', 'unit_price'))
+        pick_product = self.popularity(sorted(prices), self.options['product_skew'])
+        cart_ids = Cart.objects.filter(user__username__startswith='bench').order_by('id').values_list('id', flat=True)
+        self.insert(CartItem, (
+            CartItem(
+                cart_id=cart_id, product_id=product_id, quantity=self.random.randint(1, 3),
+                price_when_added=prices[product_id],
+            )
+            for cart_id in list(cart_ids)
+            for product_id in self.distinct(pick_product, self.geometric(self.options['items_per_cart']))
+        ))
+        return created
+
+    def create_orders(self, count):
+        user_ids = self.customer_ids()
+        products = {
+            product_id: (title, price)
+            for product_id, title, price in Product.objects.values_list('id', 'title', 'unit_price')
+        }
+        pick_product = self.popularity(sorted(products), self.options['product_skew'])
+        payment_methods = [choice for choice, _ in Order.PAYMENT_METHOD_CHOICES]
+        # Lines of each order, for the items and payments written after the orders
+        details = []
+
+        def orders():
+            for i in range(count):
+                lines = [
+                    (product_id, self.random.randint(1, 3))
+                    for product_id in self.distinct(pick_product, self.geometric(self.options['items_per_order']))
+                ]
+                subtotal = sum(products[product_id][1] * quantity for product_id, quantity in lines)
+                created_at = self.past()
+                if self.now - created_at > timedelta(days=14):
+                    status = self.random.choices(('delivered', 'cancelled'), (9, 1))[0]
+                else:
+                    status = self.random.choice(RECENT_STATUSES)
+                payment_method = self.random.choice(payment_methods)
+                is_paid = status in PAID_STATUSES and (payment_method != 'cash_on_delivery' or status == 'delivered')
+                order = Order(
+                    order_number=f'{PREFIX}{i:010d}', user_id=self.random.choice(user_ids),
+                    shipping_address=f'{i} Benchmark St', status=status, payment_method=payment_method,
+                    is_paid=is_paid, payment_date=created_at if is_paid else None,
+                    subtotal=subtotal, total_amount=subtotal, created_at=created_at, updated_at=created_at,
+                )
+                details.append((lines, order))
+                yield order
+
+        created = self.insert(Order, orders())
+        # Neither COPY nor bulk_create on every database returns primary keys: read them back
+        order_ids = list(
+            Order.objects.filter(order_number__startswith=PREFIX).order_by('order_number').values_list('id', flat=True)
+        )
+        self.insert(OrderItem, (
+            OrderItem(
+                order_id=order_id, product_id=product_id, product_title=products[product_id][0],
+                price=products[product_id][1], quantity=quantity, created_at=order.created_at,
+            )
+            for order_id, (lines, order) in zip(order_ids, details)
+            for product_id, quantity in lines
+        ))
+        self.insert(Payment, (
+            Payment(
+                payment_id=f'PAY-{order.order_number}', order_id=order_id, user_id=order.user_id,
+                amount=order.total_amount, status='succeeded', paid_at=order.created_at,
+                payment_method='stripe' if order.payment_method in CARD_METHODS else 'cash_on_delivery',
+                created_at=order.created_at, updated_at=order.created_at,
+            )
+            for order_id, (_, order) in zip(order_ids, details)
+            if order.is_paid
+        ))
+        return created
+
+    def finish(self):
+        """What the skipped save() methods and signals would have maintained."""
+        Product.objects.refresh_rating_aggregates()
+        Cart.objects.refresh_totals()
+        rollups.rebuild()
+        get_search_backend().rebuild()
+        transaction.on_commit(bump_catalog_version)
@@ -0,0 +1,131 @@
+"""
+The storefront flows driven by run_benchmarks. Each flow issues one request (checkout:
+the three of a cart checkout) through Django's test client, so the whole stack runs
+(middleware, authentication, views, serializers, database) without network or server
+overhead. Payments go through the fake payment gateway, with the latency given to
+run_benchmarks.
+
+Shoppers authenticate with real JWT access tokens, so authentication is part of
+the measured cost, just as it is for the frontend.
+"""
+import math
+import random
+from django.conf import settings
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+from products.models import Category, Product
+from users.models import User
+from .dataset import WORDS
+
+# Seeded users that add to cart and place orders
+SHOPPERS = 50
+
+
+class FlowContext:
+    """What the flows of one benchmark worker thread need: a client, tokens and ids to pick from."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.client = Client()
+        shoppers = list(User.objects.filter(is_staff=False).order_by('id')[:SHOPPERS])
+        self.shopper_tokens = [f'Bearer {AccessToken.for_user(user)}' for user in shoppers]
+        admin = User.objects.filter(is_staff=True).first()
+        self.admin_token = f'Bearer {AccessToken.for_user(admin)}' if admin else None
+        # Browsed pages per category: up to the third, as far as the category has products
+        self.category_pages = {
+            category_id: min(3, math.ceil(product_count / settings.REST_FRAMEWORK['PAGE_SIZE']))
+            for category_id, product_count in Category.objects.annotate(
+                product_count=Count('products'),
+            ).values_list('id', 'product_count')
+            if product_count
+        }
+        # Enough stock for many orders, so place_order measures orders and not stock errors
+        self.product_ids = list(Product.objects.filter(stock__gte=100).values_list('id', flat=True))
+
+    def shopper(self):
+        return self.random.choice(self.shopper_tokens)
+
+
+def browse(context):
+    """A catalog page: a category, a sort order and one of the first pages."""
+    category_id = context.random.choice(list(context.category_pages))
+    params = {
+        'category': category_id,
+        'sort_by': context.random.choice(['relevance', 'price_asc', 'price_desc', 'rating', 'newest']),
+        'page': context.random.randint(1, context.category_pages[category_id]),
+    }
+    return context.client.get(reverse('product-list-create'), params)
+
+
+def search(context):
+    query = ' '.join(context.random.sample(WORDS, context.random.randint(1, 2)))
+    return context.client.get(reverse('product-list-create'), {'q': query})
+
+
+def add_to_cart(context):
+    return context.client.post(
+        reverse('add-to-cart'),
+        {'product_id': context.random.choice(context.product_ids), 'quantity': 1},
+        content_type='application/json', HTTP_AUTHORIZATION=context.shopper(),
+    )
+
+
+def place_order(context):
+    lines = context.random.sample(context.product_ids, context.random.randint(1, 3))
+    return context.client.post(
+        reverse('place-order'),
+        {
+            'cart': [{'product_id': str(product_id), 'quantity': '1'} for product_id in lines],
+            'shipping_address': '1 Benchmark St',
+        },
+        content_type='application/json', HTTP_AUTHORIZATION=context.shopper(),
+    )
+
+
+def checkout(context):
+    """
+    A whole cart checkout, three requests: add to cart, create the payment intent
+    for the cart and confirm it. Run against the fake payment gateway
+    (payments/gateways.py), so the provider's latency is whatever it is set to.
+    """
+    shopper = context.shopper()
+    response = context.client.post(
+        reverse('add-to-cart'),
+        {'product_id': context.random.choice(context.product_ids), 'quantity': 1},
+        content_type='application/json', HTTP_AUTHORIZATION=shopper,
+    )
+    if response.status_code >= 400:
+        return response
+    response = context.client.post(
+        reverse('create_payment_intent'), {'order_id': 'cart-checkout'},
+        content_type='application/json', HTTP_AUTHORIZATION=shopper,
+    )
+    if response.status_code >= 400:
+        return response
+    payment = response.json()
+    return context.client.post(
+        reverse('confirm_payment'),
+        {
+            'payment_id': payment['payment_id'],
+            'payment_intent_id': payment['client_secret'].split('_secret_')[0],
+        },
+        content_type='application/json', HTTP_AUTHORIZATION=shopper,
+    )
+
+
+def admin_stats(context):
+    return context.client.get(
+        reverse('admin-dashboard-stats'), {'days': 30}, HTTP_AUTHORIZATION=context.admin_token,
+    )
+
+
+FLOWS = {
+    'browse': browse,
+    'search': search,
+    'add_to_cart': add_to_cart,
+    'place_order': place_order,
+    'checkout': checkout,
+    'admin_stats': admin_stats,
+}
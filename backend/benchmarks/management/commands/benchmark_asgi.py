@@ -0,0 +1,87 @@
+import json
+from django.core.management.base import BaseCommand
+from django.db import connection
+from benchmarks.concurrency import catalog_requests, compare_servers
+from benchmarks.dataset import SCALES
+from benchmarks.runner import seeded_test_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic store in a throwaway test database and compare the async catalog "
+        "views under ASGI with the DRF views under WSGI, with many concurrent slow clients"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help="Dataset size preset")
+        for name in SCALES['small']:
+            parser.add_argument(f'--{name}', type=int, help=f"Number of {name} (overrides --scale)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the dataset and the requests")
+        parser.add_argument('--requests', type=int, default=500, help="Measured requests per server")
+        parser.add_argument('--warmup', type=int, default=20, help="Unmeasured requests per server")
+        parser.add_argument('--concurrency', type=int, default=50, help="Clients sending requests at once")
+        parser.add_argument('--threads', type=int, default=4, help="Worker threads of the WSGI server")
+        parser.add_argument(
+            '--client-delay', type=float, default=50,
+            help="Milliseconds each client takes to read a response",
+        )
+        parser.add_argument(
+            '--catalog-cache', action='store_true',
+            help="Keep the catalog response cache on (by default every request reaches the views)",
+        )
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the test database, and reuse it (without seeding again) if it exists",
+        )
+
+    def handle(self, *args, **options):
+        sizes = {
+            name: options[name] if options[name] is not None else default
+            for name, default in SCALES[options['scale']].items()
+        }
+        with seeded_test_database(sizes, options['seed'], options['keepdb'], log=self.stdout.write):
+            requests = catalog_requests(options['requests'] + options['warmup'], options['seed'])
+            self.stdout.write(
+                f"{options['requests']} catalog requests from {options['concurrency']} clients "
+                f"taking {options['client_delay']:g} ms to read each response"
+            )
+            results = compare_servers(
+                requests[options['warmup']:] + requests[:options['warmup']],
+                concurrency=options['concurrency'], threads=options['threads'],
+                client_delay=options['client_delay'] / 1000, warmup=options['warmup'],
+                catalog_cache=options['catalog_cache'],
+            )
+            vendor = connection.vendor
+
+        self.stdout.write(f"\n{'server':<28}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+        labels = {
+            'wsgi': f"WSGI, {options['threads']} threads",
+            'asgi': "ASGI, async views",
+        }
+        for name, result in results.items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{labels[name]:<28}{result['throughput_rps']:>9}{latency['p50']:>10}{latency['p95']:>10}"
+                f"{latency['p99']:>10}{result['queries']['mean']:>9}{result['errors']:>8}"
+            )
+        if results['wsgi']['throughput_rps']:
+            self.stdout.write(
+                f"ASGI throughput: {results['asgi']['throughput_rps'] / results['wsgi']['throughput_rps']:.2f}x WSGI"
+            )
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'database': vendor,
+                    'sizes': sizes,
+                    **{
+                        name: options[name]
+                        for name in ('seed', 'requests', 'concurrency', 'threads', 'client_delay', 'catalog_cache')
+                    },
+                },
+                'servers': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
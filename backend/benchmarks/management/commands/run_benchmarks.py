@@ -0,0 +1,117 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from benchmarks.dataset import SCALES
+from benchmarks.flows import FLOWS
+from benchmarks.runner import run_flow, seeded_test_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic store in a throwaway test database and benchmark the catalog browse, "
+        "search, add-to-cart, place-order, checkout and admin stats flows in-process"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help="Dataset size preset")
+        for name in SCALES['small']:
+            parser.add_argument(f'--{name}', type=int, help=f"Number of {name} (overrides --scale)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed of the dataset and the flows")
+        parser.add_argument(
+            '--flows', nargs='+', choices=FLOWS, default=list(FLOWS), help="Flows to run (default: all)",
+        )
+        parser.add_argument('--requests', type=int, default=200, help="Measured requests per flow")
+        parser.add_argument('--warmup', type=int, default=10, help="Unmeasured requests per flow and thread")
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help="Threads issuing requests at once (use PostgreSQL; SQLite serializes writers)",
+        )
+        parser.add_argument(
+            '--gateway-latency', type=float, default=0,
+            help="Milliseconds each call to the (fake) payment gateway takes",
+        )
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--compare', help="Results JSON of an earlier run to compare against")
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the test database, and reuse it (without seeding again) if it exists",
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        sizes = {
+            name: options[name] if options[name] is not None else default
+            for name, default in SCALES[options['scale']].items()
+        }
+
+        # Checkouts pay with the in-process fake gateway, never a real provider
+        payments = override_settings(PAYMENTS_GATEWAY='fake', PAYMENTS_FAKE_LATENCY_MS=options['gateway_latency'])
+        with payments, seeded_test_database(sizes, options['seed'], options['keepdb'], log=self.stdout.write):
+            results = self.run_flows(options)
+
+        report = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'sizes': sizes,
+                'seed': options['seed'],
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'gateway_latency_ms': options['gateway_latency'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'flows': results,
+        }
+        self.print_report(results, baseline)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_flows(self, options):
+        results = {}
+        for name in options['flows']:
+            self.stdout.write(f"Running {name}...")
+            results[name] = run_flow(
+                FLOWS[name], options['requests'], warmup=options['warmup'],
+                concurrency=options['concurrency'], seed=options['seed'],
+            )
+        return results
+
+    def print_report(self, results, baseline=None):
+        self.stdout.write(
+            f"\n{'flow':<14}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}"
+        )
+        for name, result in results.items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<14}{result['throughput_rps']:>9}{latency['p50']:>10}{latency['p95']:>10}"
+                f"{latency['p99']:>10}{result['queries']['mean']:>9}{result['errors']:>8}"
+            )
+            previous = (baseline or {}).get('flows', {}).get(name)
+            if previous:
+                self.stdout.write(
+                    f"{'  vs baseline':<14}{self.change(previous['throughput_rps'], result['throughput_rps']):>9}"
+                    + ''.join(
+                        f"{self.change(previous['latency_ms'][p], latency[p]):>10}" for p in ('p50', 'p95', 'p99')
+                    )
+                    + f"{self.change(previous['queries']['mean'], result['queries']['mean']):>9}"
+                )
+
+    @staticmethod
+    def change(before, after):
+        if not before:
+            return '-'
+        return f"{(after - before) / before * 100:+.0f}%"
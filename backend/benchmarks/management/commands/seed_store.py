@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from benchmarks.dataset import DISTRIBUTIONS, PREFIX, SCALES, Seeder
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic store (users, categories, products, reviews, carts, "
+        "orders, order items, payments) in bulk, using COPY on PostgreSQL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='small', help="Row count preset")
+        for name in SCALES['small']:
+            parser.add_argument(f'--{name}', type=int, help=f"Number of {name} (overrides --scale)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Rows per INSERT/COPY")
+        parser.add_argument(
+            '--no-copy', action='store_true', help="Use bulk_create even on PostgreSQL",
+        )
+        for name, default in DISTRIBUTIONS.items():
+            parser.add_argument(
+                f"--{name.replace('_', '-')}", type=type(default), default=default,
+                help=f"Distribution option (see benchmarks/dataset.py, default {default})",
+            )
+        parser.add_argument(
+            '--no-input', action='store_false', dest='interactive', help="Do not ask for confirmation",
+        )
+
+    def handle(self, *args, **options):
+        if Order.objects.filter(order_number__startswith=PREFIX).exists():
+            raise CommandError("This database already holds a seeded store")
+
+        sizes = {
+            name: options[name] if options[name] is not None else default
+            for name, default in SCALES[options['scale']].items()
+        }
+        if options['interactive']:
+            answer = input(f"Seed {sizes} into the database '{connection.settings_dict['NAME']}'? [y/N] ")
+            if answer.lower() not in ('y', 'yes'):
+                self.stdout.write("Cancelled")
+                return
+
+        seeder = Seeder(
+            options['seed'], batch_size=options['batch_size'],
+            use_copy=False if options['no_copy'] else None, log=self.stdout.write,
+            **{name: options[name] for name in DISTRIBUTIONS},
+        )
+        self.stdout.write(f"Writing with {type(seeder.writer).__name__}")
+        counts = seeder.seed(**sizes)
+        self.stdout.write(self.style.SUCCESS(f"Seeded {sum(counts.values())} top-level rows: {counts}"))
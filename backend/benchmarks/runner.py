@@ -0,0 +1,120 @@
+"""
+Runs the flows of benchmarks/flows.py and summarizes them.
+
+Every request is timed on its own and its database queries are counted through an
+execute_wrapper on the worker thread's connection. With concurrency > 1 the flow runs
+on that many threads at once, each with its own client and connection. That is only
+meaningful on PostgreSQL: SQLite serializes writers.
+"""
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import (
+    setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from orders.models import Order
+from .dataset import PREFIX, Seeder
+from .flows import FlowContext
+
+
+@contextmanager
+def seeded_test_database(sizes, seed=0, keepdb=False, log=print):
+    """
+    Run the block against a test database seeded with `sizes` rows, as the test
+    runner would (DEBUG off, throwaway database). With keepdb an already seeded
+    database is reused as is.
+    """
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb)
+    try:
+        if Order.objects.filter(order_number__startswith=PREFIX).exists():
+            log("Reusing the seeded test database")
+        else:
+            log(f"Seeding {sizes}")
+            Seeder(seed, log=log).seed(**sizes)
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0
+    rank = max(1, math.ceil(len(sorted_values) * percent / 100))
+    return sorted_values[rank - 1]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_worker(flow, requests, warmup, seed):
+    """
+    Run the flow `warmup` + `requests` times on this thread.
+    Returns ([(seconds, queries, status) per request], start, end of the measured requests).
+    """
+    context = FlowContext(seed)
+    for _ in range(warmup):
+        flow(context)
+
+    samples = []
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        measured_from = time.perf_counter()
+        for _ in range(requests):
+            counter.count = 0
+            start = time.perf_counter()
+            response = flow(context)
+            samples.append((time.perf_counter() - start, counter.count, response.status_code))
+        measured_to = time.perf_counter()
+    if threading.current_thread() is not threading.main_thread():
+        connection.close()
+    return samples, measured_from, measured_to
+
+
+def run_flow(flow, requests, warmup=10, concurrency=1, seed=0):
+    """Run `requests` requests of the flow (split over `concurrency` threads) and summarize them."""
+    if concurrency == 1:
+        workers = [run_worker(flow, requests, warmup, seed)]
+    else:
+        per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+        with ThreadPoolExecutor(concurrency) as pool:
+            workers = list(pool.map(
+                lambda args: run_worker(flow, *args),
+                [(count, warmup, seed + i) for i, count in enumerate(per_worker)],
+            ))
+    samples = [sample for worker_samples, _, _ in workers for sample in worker_samples]
+    # Throughput over the measured requests only, not setup and warm-up
+    elapsed = max(end for _, _, end in workers) - min(start for _, start, _ in workers)
+    return summarize(samples, elapsed)
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(seconds * 1000 for seconds, _, _ in samples)
+    queries = [count for _, count, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, _, status in samples if status >= 400),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else 0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else 0,
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0,
+        },
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else 0,
+            'max': max(queries, default=0),
+        },
+    }
@@ -0,0 +1,113 @@
+from collections import Counter
+from datetime import datetime, timezone
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.db.models import Count, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from cart.models import Cart
+from orders.models import DailySalesRollup, Order, OrderItem
+from payments.models import Payment
+from products.models import Product, Review, StockMovement
+from users.models import User
+from .concurrency import catalog_requests, compare_servers
+from .dataset import CopyWriter, Seeder
+from .flows import FLOWS
+from .runner import percentile, run_flow
+
+SIZES = {'users': 20, 'categories': 3, 'products': 30, 'reviews': 100, 'orders': 40, 'carts': 5}
+
+
+class SeederTests(TestCase):
+    def test_same_seed_same_data(self):
+        Seeder(seed=7, batch_size=16).seed(**SIZES)
+        first = list(Product.objects.order_by('id').values_list('title', 'unit_price', 'stock'))
+        self.assertEqual(len(first), 30)
+        self.assertEqual(Review.objects.count(), 100)
+        self.assertEqual(Order.objects.count(), 40)
+        self.assertTrue(User.objects.filter(is_staff=True).exists())
+
+        # Denormalized values the skipped signals would have kept
+        product = Product.objects.filter(rating_count__gt=0).first()
+        self.assertEqual(product.rating_count, product.reviews.count())
+        order = Order.objects.first()
+        self.assertEqual(order.subtotal, sum(item.subtotal for item in order.items.all()))
+        self.assertFalse(OrderItem.objects.filter(product_title='').exists())
+        # Each product's stock journal adds up to its stock
+        journal = dict(StockMovement.objects.values_list('product').annotate(total=Sum('quantity')))
+        self.assertEqual(journal, dict(Product.objects.filter(stock__gt=0).values_list('id', 'stock')))
+        # Sales rollups of the admin dashboard
+        sales = DailySalesRollup.objects.aggregate(
+            orders=Sum('orders_count'), paid=Sum('paid_count'), total=Sum('total_sales'),
+        )
+        self.assertEqual(sales, {
+            'orders': 40, 'paid': Order.objects.filter(is_paid=True).count(),
+            'total': Order.objects.aggregate(total=Sum('total_amount'))['total'],
+        })
+
+        Product.objects.all().delete()
+        Seeder(seed=7, batch_size=16).create_products(30)
+        self.assertEqual(list(Product.objects.order_by('id').values_list('title', 'unit_price', 'stock')), first)
+
+
+    def test_seed_store(self):
+        call_command(
+            'seed_store', '--no-input', '--users', '30', '--categories', '2', '--products', '40',
+            '--reviews', '200', '--orders', '300', '--carts', '10', '--items-per-order', '4',
+            '--review-skew', '2', stdout=StringIO(),
+        )
+        self.assertEqual(Order.objects.count(), 300)
+        self.assertEqual(
+            Payment.objects.count(), Order.objects.filter(is_paid=True).count(),
+        )
+        payment = Payment.objects.select_related('order').first()
+        self.assertEqual((payment.amount, payment.paid_at), (payment.order.total_amount, payment.order.created_at))
+
+        # Dates are spread over the past year, and order sizes follow --items-per-order
+        oldest = Order.objects.order_by('created_at').first()
+        self.assertGreater((Order.objects.latest('created_at').created_at - oldest.created_at).days, 200)
+        self.assertAlmostEqual(OrderItem.objects.count() / 300, 4, delta=0.8)
+
+        # Cart totals filled in, reviews concentrated on few products
+        cart = Cart.objects.filter(item_count__gt=0).first()
+        self.assertEqual(cart.item_count, sum(item.quantity for item in cart.items.all()))
+        per_product = Counter(dict(Review.objects.values_list('product').annotate(n=Count('id'))))
+        top = sum(count for _, count in per_product.most_common(4))
+        self.assertGreater(top, 200 / 4)
+
+        with self.assertRaisesMessage(CommandError, 'already holds a seeded store'):
+            call_command('seed_store', '--no-input', stdout=StringIO())
+
+    def test_copy_format(self):
+        self.assertEqual(
+            [CopyWriter.format(value) for value in (None, True, 'a\tb\n', {'x': 1}, datetime(2025, 1, 2, tzinfo=timezone.utc))],
+            [r'\N', 't', 'a\\tb\\n', '{"x": 1}', '2025-01-02T00:00:00+00:00'],
+        )
+
+
+class RunnerTests(TestCase):
+    @override_settings(PAYMENTS_GATEWAY='fake')
+    def test_every_flow_succeeds(self):
+        Seeder(seed=1).seed(**{**SIZES, 'products': 60})
+        Product.objects.update(stock=500)
+        for name, flow in FLOWS.items():
+            with self.subTest(flow=name):
+                result = run_flow(flow, requests=5, warmup=1)
+                self.assertEqual((result['requests'], result['errors']), (5, 0))
+                self.assertGreater(result['queries']['mean'], 0)
+                self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, p) for p in (50, 95, 99, 100)], [50, 95, 99, 100])
+        self.assertEqual(percentile([], 50), 0)
+
+
+class ServerComparisonTests(TransactionTestCase):
+    """The server threads query through their own connections, so the data must be committed."""
+    def test_both_servers_answer_every_request(self):
+        Seeder(seed=1).seed(**SIZES)
+        results = compare_servers(catalog_requests(30), concurrency=4, threads=2, client_delay=0, warmup=2)
+        for name, result in results.items():
+            with self.subTest(server=name):
+                self.assertEqual((result['requests'], result['errors']), (30, 0))
+                self.assertGreater(result['queries']['mean'], 0)
@@ -0,0 +1,7 @@
+"""The project's URLs with the catalog served by the DRF views (WSGI side of benchmark_asgi)."""
+from django.urls import include, path
+from backend.urls import urlpatterns as project_urlpatterns
+from products.api import views
+from products.api.urls import catalog_patterns
+
+urlpatterns = [path('api/products/', include(catalog_patterns(views))), *project_urlpatterns]
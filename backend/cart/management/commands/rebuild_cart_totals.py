@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from cart.models import Cart
+
+
+class Command(BaseCommand):
+    help = "Recompute every cart's denormalized item count and subtotal from its items"
+
+    def handle(self, *args, **options):
+        updated = Cart.objects.refresh_totals()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {updated} carts"))
@@ -1,9 +1,50 @@
 from django.db import models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from users.models import User
 from products.models import Product
 from decimal import Decimal
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
+from django.utils.functional import cached_property
+from .pricing import CartPricing
+
+class CartQuerySet(models.QuerySet):
+    def with_products(self, product_ids):
+        """Carts holding any of the given products."""
+        return self.filter(pk__in=CartItem.objects.filter(product_id__in=product_ids).values('cart_id'))
+
+    def add_to_totals(self, quantity, amount):
+        """
+        Atomically adjust the denormalized item_count/subtotal_amount by a delta
+        (negative when items are removed). Also touches updated_at.
+        """
+        return self.update(
+            item_count=F('item_count') + quantity,
+            subtotal_amount=F('subtotal_amount') + amount,
+            updated_at=timezone.now(),
+        )
+
+    def refresh_totals(self):
+        """
+        Recompute item_count and subtotal_amount from the items at current product
+        prices, in a single UPDATE.
+        """
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return self.update(
+            item_count=Coalesce(
+                Subquery(items.annotate(total=Sum('quantity')).values('total')),
+                0,
+            ),
+            subtotal_amount=Coalesce(
+                Subquery(items.annotate(
+                    total=Sum(F('quantity') * F('product__unit_price'), output_field=models.DecimalField())
+                ).values('total')),
+                Decimal('0'),
+                output_field=models.DecimalField(),
+            ),
+        )
+
 
 class Cart(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -13,34 +54,54 @@ class Cart(models.Model):
     promo_code = models.CharField(max_length=50, blank=True, null=True)
     discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    # Denormalized totals for the navbar count and the cart summary, kept in sync by the
+    # cart views with add_to_totals() and by refresh_totals() when product prices change
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+    subtotal_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    objects = CartQuerySet.as_manager()
+
+    @cached_property
+    def pricing(self):
+        """
+        Totals computed from one load of the items and their products, reused by
+        every method below. Call refresh_pricing() after changing the items.
+        """
+        return CartPricing.for_cart(self)
+
+    def refresh_pricing(self):
+        self.__dict__.pop('pricing', None)
+        getattr(self, '_prefetched_objects_cache', {}).pop('items', None)
+
+    def clear(self):
+        """Remove all items and the promo code, and reset the denormalized totals."""
+        self.items.all().delete()
+        self.promo_code = None
+        self.discount_amount = 0
+        self.item_count = 0
+        self.subtotal_amount = 0
+        self.save(update_fields=['promo_code', 'discount_amount', 'item_count', 'subtotal_amount', 'updated_at'])
+        self.refresh_pricing()
+
     def total_items(self):
         """Return total number of items in cart"""
-        return sum(item.quantity for item in self.items.all())
+        return self.pricing.total_items
     
     def subtotal(self):
         """Return subtotal before shipping and tax"""
-        return sum(item.subtotal() for item in self.items.all())
+        return self.pricing.subtotal
     
     def shipping_cost(self):
         """Calculate shipping cost based on subtotal"""
-        subtotal = self.subtotal()
-        if subtotal >= 100:  # Free shipping over $100
-            return Decimal('0.00')
-        elif subtotal > 0:
-            return Decimal('10.00')
-        return Decimal('0.00')
+        return self.pricing.shipping_cost
     
     def tax_amount(self):
         """Calculate tax (10% of subtotal)"""
-        return (self.subtotal() * Decimal('0.10')).quantize(Decimal('0.01'))
+        return self.pricing.tax_amount
     
     def total_amount(self):
         """Calculate final total including shipping, tax, and discount"""
-        subtotal = self.subtotal()
-        shipping = self.shipping_cost()
-        tax = self.tax_amount()
-        discount = self.discount_amount or Decimal('0')
-        return max(subtotal + shipping + tax - discount, Decimal('0'))
+        return self.pricing.total_amount(self.discount_amount)
 
     def __str__(self):
         return f"Cart for {self.user.username} ({self.total_items()} items)"
@@ -82,7 +143,7 @@ class CartItem(models.Model):
 
     def is_available(self):
         """Check if product is still available and in stock"""
-        return self.product.stock >= self.quantity
+        return self.product.available_stock >= self.quantity
 
     def __str__(self):
         return f"{self.quantity} x {self.product.title}"
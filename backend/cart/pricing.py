@@ -0,0 +1,111 @@
+"""
+Cart pricing and the navbar item counter.
+
+CartPricing computes every cart total from one load of the cart's items with their
+products (select_related, or the items already prefetched on the cart). Cart keeps
+one CartPricing per instance, so a serializer that asks for the subtotal, tax and
+total of the same cart pays for a single query.
+
+The navbar count (total quantity in the cart) is the denormalized Cart.item_count,
+cached per user and invalidated by the CartItem signals in cart/signals.py.
+"""
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+
+FREE_SHIPPING_THRESHOLD = Decimal('100')
+SHIPPING_COST = Decimal('10.00')
+TAX_RATE = Decimal('0.10')
+
+
+def items_prefetch():
+    """Prefetch for a cart's items with everything the cart serializers read."""
+    from .models import CartItem
+    return Prefetch('items', queryset=CartItem.objects.select_related('product__category'))
+
+
+def prefetch_cart_items(cart):
+    prefetch_related_objects([cart], items_prefetch())
+    return cart
+
+
+class CartPricing:
+    """Totals for one cart, computed once from its items."""
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.total_items = sum(item.quantity for item in self.items)
+        self.subtotal = sum((item.subtotal() for item in self.items), Decimal('0'))
+        if self.subtotal >= FREE_SHIPPING_THRESHOLD:  # Free shipping over $100
+            self.shipping_cost = Decimal('0.00')
+        elif self.subtotal > 0:
+            self.shipping_cost = SHIPPING_COST
+        else:
+            self.shipping_cost = Decimal('0.00')
+        self.tax_amount = (self.subtotal * TAX_RATE).quantize(Decimal('0.01'))
+
+    def total_amount(self, discount_amount):
+        """Final total including shipping, tax, and discount"""
+        discount = discount_amount or Decimal('0')
+        return max(self.subtotal + self.shipping_cost + self.tax_amount - discount, Decimal('0'))
+
+    @classmethod
+    def for_cart(cls, cart):
+        if 'items' in getattr(cart, '_prefetched_objects_cache', {}):
+            items = cart.items.all()
+        else:
+            items = cart.items.select_related('product')
+        return cls(items)
+
+
+def get_count_cache():
+    return caches[getattr(settings, 'CART_COUNT_CACHE_ALIAS', 'default')]
+
+
+def cart_id_cache_key(user_id):
+    return f'cart:id:{user_id}'
+
+
+def count_cache_key(cart_id):
+    return f'cart:count:{cart_id}'
+
+
+def get_cart_item_count(user_id):
+    """
+    Total quantity in the user's cart: two cache hits, or one indexed read of the
+    cart's id and item_count on a miss. The count is cached per cart, so item signals
+    can invalidate it from CartItem.cart_id without loading the cart.
+    """
+    from .models import Cart
+    cache = get_count_cache()
+    timeout = getattr(settings, 'CART_COUNT_CACHE_TIMEOUT', 3600)
+
+    cart_id = cache.get(cart_id_cache_key(user_id))
+    if cart_id is not None:
+        if not cart_id:
+            return 0
+        count = cache.get(count_cache_key(cart_id))
+        if count is not None:
+            return count
+
+    row = Cart.objects.filter(user_id=user_id).values_list('id', 'item_count').first()
+    if row is None:
+        # 0 means "no cart yet"; creating the cart clears it (see cart/signals.py)
+        cache.set(cart_id_cache_key(user_id), 0, timeout)
+        return 0
+    cart_id, count = row
+    cache.set_many({cart_id_cache_key(user_id): cart_id, count_cache_key(cart_id): count}, timeout)
+    return count
+
+
+def invalidate_cart_item_count(cart_id):
+    """Drop the cached count once the current transaction commits."""
+    key = count_cache_key(cart_id)
+    transaction.on_commit(lambda: get_count_cache().delete(key))
+
+
+def invalidate_cart_id(user_id):
+    key = cart_id_cache_key(user_id)
+    transaction.on_commit(lambda: get_count_cache().delete(key))
@@ -19,16 +19,20 @@ class CartItemSerializer(serializers.ModelSerializer):
         ]
 
 class CartSummarySerializer(serializers.ModelSerializer):
-    """Lightweight cart serializer for quick overview"""
-    total_items = serializers.ReadOnlyField()
-    subtotal = serializers.ReadOnlyField()
+    """Lightweight cart serializer for quick overview, read from the cart row alone"""
+    total_items = serializers.ReadOnlyField(source='item_count')
+    subtotal = serializers.ReadOnlyField(source='subtotal_amount')
     
     class Meta:
         model = Cart
         fields = ['id', 'total_items', 'subtotal']
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
+    """
+    Full cart with items and totals. Pass a cart with its items prefetched
+    (cart/pricing.py prefetch_cart_items) so items, products and totals come from one query.
+    """
+    items = CartItemSerializer(source='pricing.items', many=True, read_only=True)
     total_items = serializers.ReadOnlyField()
     subtotal = serializers.ReadOnlyField()
     shipping_cost = serializers.ReadOnlyField()
@@ -45,21 +49,12 @@ class CartSerializer(serializers.ModelSerializer):
         ]
     
     def get_items_count(self, obj):
-        return obj.items.count()
+        return len(obj.pricing.items)
 
 class AddToCartSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
+    # Existence and stock are checked by the add itself (cart/upsert.py)
     quantity = serializers.IntegerField(min_value=1, max_value=999, default=1)
-    
-    def validate_product_id(self, value):
-        from products.models import Product
-        try:
-            product = Product.objects.get(id=value)
-            if product.stock <= 0:
-                raise serializers.ValidationError("Product is out of stock")
-            return value
-        except Product.DoesNotExist:
-            raise serializers.ValidationError("Product not found")
 
 class UpdateQuantitySerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1, max_value=999)
@@ -0,0 +1,56 @@
+from decimal import Decimal
+from django.db import models
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from products.models import Product
+from .models import Cart, CartItem
+from .pricing import invalidate_cart_item_count, invalidate_cart_id
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_count_on_item_change(sender, instance, **kwargs):
+    """
+    Drop the cached navbar count when an item is added, changed or removed.
+    """
+    invalidate_cart_item_count(instance.cart_id)
+
+
+@receiver(post_delete, sender=CartItem)
+def refresh_totals_on_product_delete(sender, instance, origin=None, **kwargs):
+    """
+    The cart views keep Cart.item_count/subtotal_amount in sync themselves; items
+    removed because their product was deleted are recounted here.
+    """
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin_model is Product:
+        Cart.objects.filter(pk=instance.cart_id).refresh_totals()
+
+
+@receiver(pre_save, sender=Product)
+def load_stored_price(sender, instance, update_fields=None, **kwargs):
+    """Read the stored price, so carts are re-priced only when save() changes it."""
+    instance._stored_unit_price = None
+    if instance.pk is not None and (update_fields is None or 'unit_price' in update_fields):
+        instance._stored_unit_price = Product.objects.filter(pk=instance.pk).values_list('unit_price', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def refresh_totals_on_price_change(sender, instance, created, **kwargs):
+    """Re-price the denormalized subtotal of carts holding a product whose price changed."""
+    previous = None if created else getattr(instance, '_stored_unit_price', None)
+    if previous is None or Decimal(str(instance.unit_price)) == previous:
+        return
+    Cart.objects.with_products([instance.pk]).refresh_totals()
+
+
+@receiver(post_save, sender=Cart)
+def invalidate_cart_id_on_cart_create(sender, instance, created, **kwargs):
+    # Only creating or deleting a cart changes which cart a user has
+    if created:
+        invalidate_cart_id(instance.user_id)
+
+
+@receiver(post_delete, sender=Cart)
+def invalidate_cart_id_on_cart_delete(sender, instance, **kwargs):
+    invalidate_cart_id(instance.user_id)
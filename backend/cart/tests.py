@@ -1,3 +1,263 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+import threading
+import time
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import User
+from products.models import Product, Category
+from .models import Cart, CartItem
+from .upsert import StockLimitError, add_to_cart
 
-# Create your tests here.
+
+class CartTestCase(TestCase):
+    """
+    The navbar count is cached and invalidated on commit, so writes that should be
+    visible to a later read run through captureOnCommitCallbacks(execute=True).
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='shopper', email='shopper@example.com', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Kitchen')
+        self.products = [
+            Product.objects.create(
+                title=f'Pan {i}', description='Cookware', unit_price=20 + i, stock=50, category=self.category,
+            )
+            for i in range(5)
+        ]
+
+
+class CartPricingTests(CartTestCase):
+    def fill_cart(self, count):
+        cart, _ = Cart.objects.get_or_create(user=self.user)
+        for product in self.products[:count]:
+            CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': 2})
+        # Items created outside the cart views need their totals recounted
+        Cart.objects.filter(pk=cart.pk).refresh_totals()
+        return cart
+
+    def test_cart_response_query_count_does_not_grow_with_items(self):
+        self.fill_cart(1)
+        with self.assertNumQueries(2):
+            # The cart, then its items joined with products and categories
+            self.client.get(reverse('cart'))
+        self.fill_cart(5)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('cart'))
+
+        self.assertEqual(len(response.data['items']), 5)
+        self.assertEqual(response.data['items_count'], 5)
+        self.assertEqual(response.data['total_items'], 10)
+        # 2 x (20 + 21 + 22 + 23 + 24), free shipping, 10% tax
+        self.assertEqual(response.data['subtotal'], Decimal('220'))
+        self.assertEqual(response.data['shipping_cost'], Decimal('0.00'))
+        self.assertEqual(response.data['total_amount'], Decimal('242.00'))
+
+    def test_navbar_count_is_cached_and_invalidated(self):
+        url = reverse('cart-items-count')
+        self.assertEqual(self.client.get(url).data['count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fill_cart(2)
+        self.assertEqual(self.client.get(url).data['count'], 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['count'], 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.filter(product=self.products[0]).delete()
+            Cart.objects.refresh_totals()
+        self.assertEqual(self.client.get(url).data['count'], 2)
+
+
+class CartTotalsTests(CartTestCase):
+    def get_cart(self):
+        return Cart.objects.get(user=self.user)
+
+    def assertTotals(self, item_count, subtotal_amount):
+        cart = self.get_cart()
+        self.assertEqual(cart.item_count, item_count)
+        self.assertEqual(cart.subtotal_amount, Decimal(subtotal_amount))
+        # ...and they match what the items add up to
+        self.assertEqual(cart.item_count, cart.total_items())
+        self.assertEqual(cart.subtotal_amount, cart.subtotal())
+
+    def add(self, product, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('add-to-cart'), {'product_id': product.id, 'quantity': quantity})
+
+    def test_cart_views_keep_totals_in_sync(self):
+        response = self.add(self.products[0], 2)
+        self.assertEqual(response.data['cart_total_items'], 2)
+        response = self.add(self.products[0], 1)
+        self.assertEqual(response.data['cart_total_items'], 3)
+        self.add(self.products[1], 2)
+        self.assertTotals(5, '102.00')
+
+        item = CartItem.objects.get(product=self.products[1])
+        self.client.patch(reverse('update-cart', args=[item.id]), {'quantity': 4})
+        self.assertTotals(7, '144.00')
+
+        item = CartItem.objects.get(product=self.products[0])
+        self.client.delete(reverse('remove-from-cart', args=[item.id]))
+        self.assertTotals(4, '84.00')
+
+        self.client.delete(reverse('clear-cart'))
+        self.assertTotals(0, '0.00')
+
+    def test_summary_and_count_read_only_the_cart_row(self):
+        self.add(self.products[0], 3)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('cart'), {'summary': 'true'})
+        self.assertEqual(response.data['total_items'], 3)
+        self.assertEqual(response.data['subtotal'], Decimal('60.00'))
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('cart-items-count')).data['count'], 3)
+
+    def test_price_changes_reprice_carts(self):
+        self.add(self.products[0], 2)
+        product = self.products[0]
+        product.unit_price = Decimal('30.00')
+        product.save()
+        self.assertTotals(2, '60.00')
+
+        # Saves that leave the price alone do not touch the carts
+        product.refresh_from_db()
+        product.stock = 10
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+        self.assertFalse([query for query in queries if 'cart_cart' in query['sql']])
+        self.assertTotals(2, '60.00')
+
+        admin = User.objects.create_user(username='admin', email='admin@example.com', password='pass12345', is_staff=True)
+        self.client.force_authenticate(admin)
+        self.client.post(
+            reverse('bulk-update-products'),
+            {'product_ids': [product.id], 'updates': {'unit_price': 25}},
+            format='json',
+        )
+        self.assertTotals(2, '50.00')
+
+    def test_deleting_a_product_recounts_carts(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[1], 1)
+        self.products[0].delete()
+        self.assertTotals(1, '21.00')
+
+    def test_rebuild_command_backfills_totals(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[2], quantity=3)
+        call_command('rebuild_cart_totals', stdout=StringIO())
+        self.assertTotals(3, '66.00')
+
+
+class AddToCartTests(CartTestCase):
+    def add(self, product, quantity):
+        return self.client.post(reverse('add-to-cart'), {'product_id': product.id, 'quantity': quantity})
+
+    def test_adds_merge_into_one_line_up_to_the_stock(self):
+        product = self.products[0]
+        product.stock = 5
+        product.save()
+
+        response = self.add(product, 2)
+        self.assertEqual(response.data['item_quantity'], 2)
+        self.assertTrue(response.data['message'].startswith('Added'))
+        response = self.add(product, 3)
+        self.assertEqual(response.data['item_quantity'], 5)
+        self.assertTrue(response.data['message'].startswith('Updated'))
+
+        response = self.add(product, 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Cannot add 1 more items. Stock limit: 5, currently in cart: 5')
+        response = self.add(self.products[1], 51)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Insufficient stock. Only 50 items available.')
+
+        self.assertEqual(CartItem.objects.get(product=product).quantity, 5)
+        self.assertEqual(Cart.objects.get(user=self.user).item_count, 5)
+
+    def test_unknown_product_is_not_found(self):
+        response = self.client.post(reverse('add-to-cart'), {'product_id': 999999, 'quantity': 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_adding_again_is_a_single_write(self):
+        self.add(self.products[0], 1)
+        # Savepoint pair, cart lookup, the upsert (product read, conditional UPDATE and
+        # re-read on SQLite), totals update and the new count
+        with self.assertNumQueries(8 if connection.vendor != 'postgresql' else 6):
+            self.add(self.products[0], 1)
+
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+    """
+    Adds from many threads at once must neither lose updates nor exceed the stock.
+    SQLite's shared in-memory test database fails a write that meets another
+    writer's lock instead of waiting for it; those adds are retried like a client would.
+    """
+
+    threads = 8
+    adds_per_thread = 5
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='racer', email='racer@example.com', password='pass12345')
+        self.cart = Cart.objects.create(user=self.user)
+        category = Category.objects.create(name='Garden')
+        self.product = Product.objects.create(
+            title='Hose', description='Garden hose', unit_price=10, stock=1000, category=category,
+        )
+
+    def hammer(self):
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.adds_per_thread):
+                    while True:
+                        try:
+                            with transaction.atomic():
+                                add_to_cart(self.cart.pk, self.product.pk, 1)
+                            results.append('added')
+                        except StockLimitError:
+                            results.append('rejected')
+                        except OperationalError as e:
+                            if 'locked' not in str(e):
+                                raise
+                            time.sleep(0.001)
+                            continue
+                        break
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def test_concurrent_adds_are_all_counted(self):
+        results = self.hammer()
+        total = self.threads * self.adds_per_thread
+        self.assertEqual(results.count('added'), total)
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.product).quantity, total)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, total)
+        self.assertEqual(self.cart.subtotal_amount, Decimal(total * 10))
+
+    def test_concurrent_adds_stop_at_the_stock(self):
+        Product.objects.filter(pk=self.product.pk).update(stock=12)
+        results = self.hammer()
+        self.assertEqual(results.count('added'), 12)
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.product).quantity, 12)
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 12)
@@ -0,0 +1,135 @@
+"""
+Atomic add-to-cart.
+
+On PostgreSQL adding a product is a single statement:
+
+    INSERT INTO cart_cartitem ... SELECT ... FROM products_product WHERE stock - reserved >= n
+    ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = quantity + n
+        WHERE quantity + n <= stock - reserved
+
+so two tabs adding the same product at once both count, and the bound on the
+available stock is checked by the statement that writes the row. Other databases (SQLite in development
+and tests) use a conditional UPDATE and, when the product is not in the cart yet, an
+INSERT in a savepoint that falls back to the UPDATE if another request inserted first.
+
+Both paths skip the CartItem signals, so they update the cart's denormalized totals
+and drop its cached navbar count themselves. Call add_to_cart() inside transaction.atomic().
+"""
+from collections import namedtuple
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from products.inventory import StockError
+from products.models import Product
+from .models import Cart, CartItem
+from .pricing import invalidate_cart_item_count
+
+AddedItem = namedtuple('AddedItem', ['quantity', 'created', 'product_title'])
+
+
+class StockLimitError(StockError):
+    """Adding would put more of the product in the cart than there is in stock."""
+
+    def __init__(self, stock, in_cart, requested):
+        self.stock = stock
+        self.in_cart = in_cart
+        self.requested = requested
+        if in_cart:
+            message = (
+                f'Cannot add {requested} more items. Stock limit: {stock}, currently in cart: {in_cart}'
+            )
+        else:
+            message = f'Insufficient stock. Only {stock} items available.'
+        super().__init__(message)
+
+
+def add_to_cart(cart_id, product_id, quantity):
+    """
+    Add `quantity` of a product to the cart, merging with the line already there.
+    Returns AddedItem(quantity in the cart now, whether the line was created, product title).
+
+    Raises Product.DoesNotExist for unknown products and StockLimitError when the
+    cart would hold more than the product's stock; nothing is changed in either case.
+    """
+    if connection.vendor == 'postgresql':
+        added, unit_price = _upsert_postgresql(cart_id, product_id, quantity)
+    else:
+        added, unit_price = _upsert_portable(cart_id, product_id, quantity)
+
+    Cart.objects.filter(pk=cart_id).add_to_totals(quantity, quantity * unit_price)
+    invalidate_cart_item_count(cart_id)
+    return added
+
+
+def _upsert_postgresql(cart_id, product_id, quantity):
+    item_table = CartItem._meta.db_table
+    product_table = Product._meta.db_table
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        # The CTE reads the product once; the LEFT JOIN still returns it when the
+        # insert/update was rejected, so a missing row means the product does not exist
+        cursor.execute(f"""
+            WITH product AS (
+                SELECT id, title, unit_price, stock - reserved AS available FROM {product_table} WHERE id = %(product)s
+            ), item AS (
+                INSERT INTO {item_table} (cart_id, product_id, quantity, price_when_added, added_at, updated_at)
+                SELECT %(cart)s, id, %(quantity)s, unit_price, %(now)s, %(now)s
+                FROM product WHERE available >= %(quantity)s
+                ON CONFLICT (cart_id, product_id) DO UPDATE
+                SET quantity = {item_table}.quantity + EXCLUDED.quantity, updated_at = EXCLUDED.updated_at
+                WHERE {item_table}.quantity + EXCLUDED.quantity <= (SELECT available FROM product)
+                RETURNING quantity, (xmax = 0) AS created
+            )
+            SELECT item.quantity, item.created, product.title, product.unit_price, product.available
+            FROM product LEFT JOIN item ON true
+        """, {'cart': cart_id, 'product': product_id, 'quantity': quantity, 'now': now})
+        row = cursor.fetchone()
+
+    if row is None:
+        raise Product.DoesNotExist(f'Product with ID {product_id} not found')
+    item_quantity, created, title, unit_price, available = row
+    if item_quantity is None:
+        raise StockLimitError(available, _quantity_in_cart(cart_id, product_id), quantity)
+    return AddedItem(item_quantity, created, title), unit_price
+
+
+def _upsert_portable(cart_id, product_id, quantity):
+    product = Product.objects.filter(pk=product_id).values(
+        'title', 'unit_price', available=F('stock') - F('reserved'),
+    ).first()
+    if product is None:
+        raise Product.DoesNotExist(f'Product with ID {product_id} not found')
+
+    item_quantity = _increment(cart_id, product_id, quantity)
+    if item_quantity is not None:
+        return AddedItem(item_quantity, False, product['title']), product['unit_price']
+
+    if product['available'] >= quantity:
+        try:
+            with transaction.atomic():
+                CartItem.objects.bulk_create([CartItem(
+                    cart_id=cart_id, product_id=product_id, quantity=quantity,
+                    price_when_added=product['unit_price'],
+                )])
+            return AddedItem(quantity, True, product['title']), product['unit_price']
+        except IntegrityError:
+            # Another request added the product first: add to its line instead
+            item_quantity = _increment(cart_id, product_id, quantity)
+            if item_quantity is not None:
+                return AddedItem(item_quantity, False, product['title']), product['unit_price']
+
+    raise StockLimitError(product['available'], _quantity_in_cart(cart_id, product_id), quantity)
+
+
+def _increment(cart_id, product_id, quantity):
+    """Add to an existing line if the stock allows it; returns the new quantity or None."""
+    updated = CartItem.objects.filter(
+        cart_id=cart_id, product_id=product_id, quantity__lte=F('product__stock') - F('product__reserved') - quantity,
+    ).update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+    if not updated:
+        return None
+    return _quantity_in_cart(cart_id, product_id)
+
+
+def _quantity_in_cart(cart_id, product_id):
+    return CartItem.objects.filter(cart_id=cart_id, product_id=product_id).values_list('quantity', flat=True).first() or 0
@@ -6,6 +6,8 @@ from django.shortcuts import get_object_or_404
 from django.db import transaction
 from decimal import Decimal
 from .models import Cart, CartItem
+from .pricing import get_cart_item_count, prefetch_cart_items
+from .upsert import StockLimitError, add_to_cart
 from products.models import Product
 from .serializers import (
     CartSerializer, CartSummarySerializer, AddToCartSerializer,
@@ -18,10 +20,12 @@ class CartView(APIView):
 
     def get(self, request):
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        # Check for lightweight request
+        # Check for lightweight request: served from the cart row's denormalized totals
         if request.query_params.get('summary') == 'true':
             serializer = CartSummarySerializer(cart)
         else:
+            # Items and their products are loaded once and shared by every total
+            prefetch_cart_items(cart)
             serializer = CartSerializer(cart)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -38,40 +42,20 @@ class AddToCartView(APIView):
         quantity = serializer.validated_data['quantity']
 
         try:
-            product = Product.objects.get(id=product_id)
+            with transaction.atomic():
+                cart, _ = Cart.objects.get_or_create(user=request.user)
+                # One INSERT ... ON CONFLICT DO UPDATE, bounded by the product's stock
+                added = add_to_cart(cart.pk, product_id, quantity)
+                cart_total_items = Cart.objects.filter(pk=cart.pk).values_list('item_count', flat=True).get()
         except Product.DoesNotExist:
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
-
-        # Check stock availability
-        if product.stock < quantity:
-            return Response({
-                "error": f"Insufficient stock. Only {product.stock} items available."
-            }, status=status.HTTP_400_BAD_REQUEST)
-
-        with transaction.atomic():
-            cart, _ = Cart.objects.get_or_create(user=request.user)
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart, 
-                product=product,
-                defaults={'quantity': quantity}
-            )
-
-            if not created:
-                # Check if adding quantity exceeds stock
-                new_quantity = cart_item.quantity + quantity
-                if new_quantity > product.stock:
-                    return Response({
-                        "error": f"Cannot add {quantity} more items. Stock limit: {product.stock}, currently in cart: {cart_item.quantity}"
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                cart_item.quantity = new_quantity
-            
-            cart_item.save()
-            cart.save()  # Update cart timestamp
+        except StockLimitError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({
-            "message": f"{'Updated' if not created else 'Added'} {product.title} to cart",
-            "cart_total_items": cart.total_items(),
-            "item_quantity": cart_item.quantity
+            "message": f"{'Added' if added.created else 'Updated'} {added.product_title} to cart",
+            "cart_total_items": cart_total_items,
+            "item_quantity": added.quantity
         }, status=status.HTTP_200_OK)
 
 class RemoveFromCartView(APIView):
@@ -80,13 +64,13 @@ class RemoveFromCartView(APIView):
 
     def delete(self, request, item_id):
         try:
-            item = CartItem.objects.get(id=item_id, cart__user=request.user)
+            item = CartItem.objects.select_related('product').get(id=item_id, cart__user=request.user)
             product_title = item.product.title
-            item.delete()
-            
-            # Update cart timestamp
-            cart = Cart.objects.get(user=request.user)
-            cart.save()
+            with transaction.atomic():
+                item.delete()
+                Cart.objects.filter(pk=item.cart_id).add_to_totals(
+                    -item.quantity, -item.quantity * item.product.unit_price
+                )
             
             return Response({
                 "message": f"Removed {product_title} from cart"
@@ -106,21 +90,21 @@ class UpdateCartQuantityView(APIView):
         quantity = serializer.validated_data['quantity']
 
         try:
-            cart_item = CartItem.objects.get(id=item_id, cart__user=request.user)
+            cart_item = CartItem.objects.select_related('product').get(id=item_id, cart__user=request.user)
         except CartItem.DoesNotExist:
             return Response({"error": "Item not found in cart"}, status=status.HTTP_404_NOT_FOUND)
 
         # Check stock availability
-        if quantity > cart_item.product.stock:
+        if quantity > cart_item.product.available_stock:
             return Response({
-                "error": f"Insufficient stock. Only {cart_item.product.stock} items available."
+                "error": f"Insufficient stock. Only {cart_item.product.available_stock} items available."
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        cart_item.quantity = quantity
-        cart_item.save()
-        
-        # Update cart timestamp
-        cart_item.cart.save()
+        delta = quantity - cart_item.quantity
+        with transaction.atomic():
+            cart_item.quantity = quantity
+            cart_item.save()
+            Cart.objects.filter(pk=cart_item.cart_id).add_to_totals(delta, delta * cart_item.product.unit_price)
 
         return Response({
             "message": f"Updated quantity to {quantity}",
@@ -135,10 +119,7 @@ class ClearCartView(APIView):
         try:
             cart = Cart.objects.get(user=request.user)
             items_count = cart.items.count()
-            cart.items.all().delete()
-            cart.promo_code = None
-            cart.discount_amount = 0
-            cart.save()
+            cart.clear()
             
             return Response({
                 "message": f"Cleared {items_count} items from cart"
@@ -185,7 +166,8 @@ def apply_promo_code(request):
     
     cart.promo_code = promo_code
     cart.discount_amount = discount_amount
-    cart.save()
+    # Leave the denormalized totals to the F() updates of the item views
+    cart.save(update_fields=['promo_code', 'discount_amount', 'updated_at'])
     
     return Response({
         "message": f"Promo code '{promo_code}' applied successfully",
@@ -201,7 +183,7 @@ def remove_promo_code(request):
         cart = Cart.objects.get(user=request.user)
         cart.promo_code = None
         cart.discount_amount = 0
-        cart.save()
+        cart.save(update_fields=['promo_code', 'discount_amount', 'updated_at'])
         
         return Response({
             "message": "Promo code removed",
@@ -213,9 +195,5 @@ def remove_promo_code(request):
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def cart_items_count(request):
-    """Get quick cart items count for navbar"""
-    try:
-        cart = Cart.objects.get(user=request.user)
-        return Response({"count": cart.total_items()}, status=status.HTTP_200_OK)
-    except Cart.DoesNotExist:
-        return Response({"count": 0}, status=status.HTTP_200_OK)
+    """Get quick cart items count for navbar (cached per user, see cart/pricing.py)"""
+    return Response({"count": get_cart_item_count(request.user.id)}, status=status.HTTP_200_OK)
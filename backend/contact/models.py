@@ -50,6 +50,9 @@ class ContactMessage(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+        ]
         verbose_name = 'Contact Message'
         verbose_name_plural = 'Contact Messages'
 
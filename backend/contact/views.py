@@ -1,13 +1,13 @@
-from django.core.mail import send_mail
 from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.db import models
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 from .models import ContactMessage
+from mailer.models import OutgoingEmail
+from mailer.outbox import queue_emails
+from mailer.rendering import render_email
 from .serializers import ContactMessageSerializer, ContactMessageListSerializer
 import logging
 
@@ -25,87 +25,37 @@ class ContactMessageCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         contact_message = serializer.save()
         
-        # Send email notification to admin
+        # Queue the admin notification and the user confirmation with one INSERT;
+        # the mail worker sends them (mailer/outbox.py)
         try:
-            self.send_admin_notification(contact_message)
+            queue_emails([
+                self.build_admin_notification(contact_message),
+                self.build_user_confirmation(contact_message),
+            ])
         except Exception as e:
-            logger.error(f"Failed to send admin notification email: {str(e)}")
-        
-        # Send confirmation email to user
-        try:
-            self.send_user_confirmation(contact_message)
-        except Exception as e:
-            logger.error(f"Failed to send user confirmation email: {str(e)}")
+            logger.error(f"Failed to queue contact emails: {str(e)}")
 
-    def send_admin_notification(self, contact_message):
-        """Send email notification to admin about new contact message"""
+    def build_admin_notification(self, contact_message):
+        """Email notification to admin about new contact message"""
         subject = f"New Contact Message: {contact_message.subject}"
         
-        # Create the email content
-        context = {
-            'message': contact_message,
-            'admin_url': f"{settings.FRONTEND_URL}/admin/contact/",  # Adjust as needed
-        }
+        # contact/templates/emails/contact_admin_notification.{txt,html}
+        plain_message, html_message = render_email('contact_admin_notification', {'message': contact_message})
         
-        html_message = f"""
-        <h2>New Contact Message Received</h2>
-        <p><strong>From:</strong> {contact_message.name} ({contact_message.email})</p>
-        <p><strong>Category:</strong> {contact_message.get_category_display()}</p>
-        <p><strong>Subject:</strong> {contact_message.subject}</p>
-        {f'<p><strong>Order Number:</strong> {contact_message.order_number}</p>' if contact_message.order_number else ''}
-        <p><strong>Message:</strong></p>
-        <div style="border: 1px solid #ddd; padding: 10px; background-color: #f9f9f9;">
-            {contact_message.message.replace('\n', '<br>')}
-        </div>
-        <p><strong>Received:</strong> {contact_message.created_at.strftime('%Y-%m-%d %H:%M:%S')}</p>
-        """
-        
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[settings.EMAIL_HOST_USER],  # Send to admin email
-            html_message=html_message,
-            fail_silently=False,
+        return OutgoingEmail.build(
+            subject, plain_message,
+            [settings.EMAIL_HOST_USER],  # Send to admin email
+            html_body=html_message,
         )
 
-    def send_user_confirmation(self, contact_message):
-        """Send confirmation email to user"""
+    def build_user_confirmation(self, contact_message):
+        """Confirmation email to user"""
         subject = f"We received your message: {contact_message.subject}"
         
-        html_message = f"""
-        <h2>Thank you for contacting us!</h2>
-        <p>Dear {contact_message.name},</p>
-        <p>We have received your message regarding "<strong>{contact_message.subject}</strong>" and will get back to you as soon as possible.</p>
-        
-        <h3>Your Message Details:</h3>
-        <p><strong>Category:</strong> {contact_message.get_category_display()}</p>
-        <p><strong>Subject:</strong> {contact_message.subject}</p>
-        {f'<p><strong>Order Number:</strong> {contact_message.order_number}</p>' if contact_message.order_number else ''}
-        <p><strong>Message:</strong></p>
-        <div style="border: 1px solid #ddd; padding: 10px; background-color: #f9f9f9;">
-            {contact_message.message.replace('\n', '<br>')}
-        </div>
+        # contact/templates/emails/contact_user_confirmation.{txt,html}
+        plain_message, html_message = render_email('contact_user_confirmation', {'message': contact_message})
         
-        <p><strong>Reference ID:</strong> {contact_message.id}</p>
-        
-        <p>Our support team typically responds within 24-48 hours. If your inquiry is urgent, please don't hesitate to contact us again.</p>
-        
-        <p>Best regards,<br>Amazon Clone Support Team</p>
-        """
-        
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[contact_message.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        return OutgoingEmail.build(subject, plain_message, [contact_message.email], html_body=html_message)
 
 class ContactMessageListView(generics.ListAPIView):
     """
@@ -0,0 +1,81 @@
+import time
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.html import strip_tags
+from contact.models import ContactMessage
+from users.models import User
+
+# Email templates and sample contexts; no database access is needed
+USER = User(username='jane', email='jane@example.com', first_name='Jane')
+CONTACT_MESSAGE = ContactMessage(
+    id=1, name='Jane', email='jane@example.com', subject='Where is my order?',
+    category='delivery_problem', order_number='ORD-1001', created_at=timezone.now(),
+    message='My order has not arrived yet.\nCould you check the tracking number?\n' * 10,
+)
+EMAILS = {
+    'verify_email': {'user': USER, 'verification_url': 'https://example.com/verify-email/token'},
+    'password_reset': {'user': USER, 'reset_url': 'https://example.com/reset-password/token'},
+    'contact_admin_notification': {'message': CONTACT_MESSAGE},
+    'contact_user_confirmation': {'message': CONTACT_MESSAGE},
+}
+
+
+def render_cached(name, context):
+    """The current path (mailer.rendering.render_email): compiled templates, hand-written text part."""
+    return (
+        get_template(f'emails/{name}.txt').render(context),
+        get_template(f'emails/{name}.html').render(context),
+    )
+
+
+def render_strip_tags(name, context):
+    """Compiled HTML template, text part derived from it with strip_tags() as before."""
+    html = get_template(f'emails/{name}.html').render(context)
+    return strip_tags(html), html
+
+
+# Same template directories, without the cached loader: every render parses the templates
+UNCACHED_ENGINE = Engine(loaders=[
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+])
+
+
+def render_uncached(name, context):
+    """Templates compiled again for every message, text part from strip_tags()."""
+    html = UNCACHED_ENGINE.get_template(f'emails/{name}.html').render(Context(context))
+    return strip_tags(html), html
+
+
+MODES = {
+    'cached': render_cached,
+    'strip_tags': render_strip_tags,
+    'uncached': render_uncached,
+}
+
+
+class Command(BaseCommand):
+    help = "Measure the per-message cost of rendering the email templates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=2000,
+            help="Messages rendered per email and mode",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        self.stdout.write(f"{'email':<30}" + ''.join(f"{mode:>14}" for mode in MODES) + "   (µs per message)")
+        for name, context in EMAILS.items():
+            timings = []
+            for render in MODES.values():
+                render(name, context)  # warm up: load and cache the templates
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    render(name, context)
+                timings.append((time.perf_counter() - start) / iterations * 1e6)
+            self.stdout.write(f"{name:<30}" + ''.join(f"{timing:>14.1f}" for timing in timings))
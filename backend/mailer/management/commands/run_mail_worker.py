@@ -0,0 +1,37 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from mailer.outbox import send_due_emails
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox, in batches over one mail server connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'MAIL_OUTBOX_BATCH_SIZE', 50),
+            help="Emails sent per batch",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help="Seconds to wait when the outbox is empty",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Send everything that is due and exit instead of running as a worker",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_due_emails(options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class OutgoingEmail(models.Model):
+    """
+    An email waiting in the outbox. Requests only insert these rows; the mail worker
+    (`python manage.py run_mail_worker`, see mailer/outbox.py) sends them in batches.
+    """
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the worker may pick the email up: now for new emails, later after a failure
+    # (backoff) or while a worker is sending it (claim timeout)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    @classmethod
+    def build(cls, subject, body, to, html_body='', from_email=None):
+        """An unsaved email; pass it to mailer.outbox.queue_emails()."""
+        if isinstance(to, str):
+            to = [to]
+        return cls(
+            subject=subject, body=body, html_body=html_body, to=list(to),
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        )
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The worker's "due emails" scan
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
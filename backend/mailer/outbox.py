@@ -0,0 +1,114 @@
+"""
+Persistent email outbox.
+
+Request code queues emails with queue_email()/queue_emails(): one INSERT, no SMTP.
+Queued rows are only committed with the surrounding transaction, so an email is never
+sent for work that was rolled back.
+
+The mail worker (`python manage.py run_mail_worker`) calls send_due_emails() in a loop:
+- it claims a batch of due emails by moving them to "sending" and pushing their
+  next_attempt_at out by MAIL_OUTBOX_CLAIM_TIMEOUT (skipping rows locked by another
+  worker where the database supports it), so a worker that dies mid-batch only
+  delays those emails;
+- it sends the whole batch over one connection to the mail server;
+- sent emails are marked in one UPDATE; a failed one is retried after
+  MAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1) seconds, and marked failed after
+  MAIL_OUTBOX_MAX_ATTEMPTS attempts.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import OutgoingEmail
+
+logger = logging.getLogger(__name__)
+
+
+def queue_emails(emails):
+    """Queue unsaved OutgoingEmail objects (see OutgoingEmail.build) with one INSERT."""
+    return OutgoingEmail.objects.bulk_create(emails)
+
+
+def queue_email(subject, body, to, html_body='', from_email=None):
+    return queue_emails([OutgoingEmail.build(subject, body, to, html_body=html_body, from_email=from_email)])[0]
+
+
+def get_retry_delay(attempts):
+    base = getattr(settings, 'MAIL_OUTBOX_RETRY_DELAY', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 24 * 3600))
+
+
+def claim_batch(batch_size):
+    """Move up to batch_size due emails to "sending" and return them."""
+    now = timezone.now()
+    timeout = timedelta(seconds=getattr(settings, 'MAIL_OUTBOX_CLAIM_TIMEOUT', 300))
+    with transaction.atomic():
+        due = OutgoingEmail.objects.filter(
+            status__in=[OutgoingEmail.QUEUED, OutgoingEmail.SENDING], next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        emails = list(due[:batch_size])
+        OutgoingEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status=OutgoingEmail.SENDING, next_attempt_at=now + timeout,
+        )
+    return emails
+
+
+def to_message(email, mail_connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject, body=email.body, from_email=email.from_email, to=email.to,
+        connection=mail_connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)
+    max_attempts = getattr(settings, 'MAIL_OUTBOX_MAX_ATTEMPTS', 5)
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.FAILED
+        logger.error(f"Giving up on email {email.pk} after {email.attempts} attempts: {error}")
+    else:
+        email.status = OutgoingEmail.QUEUED
+        email.next_attempt_at = timezone.now() + get_retry_delay(email.attempts)
+        logger.warning(f"Email {email.pk} failed (attempt {email.attempts}), retrying at {email.next_attempt_at}: {error}")
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_due_emails(batch_size=None):
+    """Send one batch of due emails. Returns (sent, failed)."""
+    emails = claim_batch(batch_size or getattr(settings, 'MAIL_OUTBOX_BATCH_SIZE', 50))
+    if not emails:
+        return 0, 0
+
+    sent, failed = [], 0
+    mail_connection = get_connection()
+    try:
+        mail_connection.open()
+    except Exception as e:
+        # Mail server unreachable: the whole batch is retried later
+        for email in emails:
+            record_failure(email, e)
+        return 0, len(emails)
+    try:
+        for email in emails:
+            try:
+                to_message(email, mail_connection).send()
+            except Exception as e:
+                record_failure(email, e)
+                failed += 1
+            else:
+                sent.append(email.pk)
+    finally:
+        mail_connection.close()
+
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status=OutgoingEmail.SENT, sent_at=timezone.now(), last_error='',
+    )
+    return len(sent), failed
@@ -0,0 +1,20 @@
+"""
+Email bodies from templates.
+
+Every email is a pair of templates, emails/<name>.html and emails/<name>.txt, rendered
+with the same context: the plain-text part is written by hand rather than derived
+from the HTML with strip_tags() on every message. Templates are compiled once per
+process by the cached template loader (TEMPLATES in settings), so rendering an email
+only walks the compiled node tree.
+
+`python manage.py benchmark_email_rendering` measures the per-message cost.
+"""
+from django.template.loader import get_template
+
+
+def render_email(template_name, context):
+    """Render emails/<template_name>.txt and .html. Returns (body, html_body)."""
+    return (
+        get_template(f'emails/{template_name}.txt').render(context),
+        get_template(f'emails/{template_name}.html').render(context),
+    )
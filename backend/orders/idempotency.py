@@ -0,0 +1,145 @@
+"""
+Idempotency-Key support for POST endpoints that create orders or payments.
+
+A client that may retry a request (double clicks, timeouts, flaky networks) sends
+`Idempotency-Key: <unique string>` with it:
+- The first request inserts an IdempotencyKey row (unique per user, endpoint and key)
+  and commits it before the view runs. A successful (2xx) response is stored on the row.
+- A retry after that gets the stored response back, with an `Idempotent-Replayed: true`
+  header, without running the view.
+- A retry while the first request is still running gets 409 straight away; nothing
+  waits on a lock.
+- Reusing a key with a different request body gets 422.
+- If the first request fails (non-2xx or an exception) the row is removed, so the
+  same key can be retried.
+
+A row left unfinished for longer than settings.IDEMPOTENCY_LOCK_TIMEOUT (the worker
+died mid-request) can be taken over by the next retry. Old rows are deleted by
+`python manage.py purge_idempotency_keys`. Requests without the header are not affected.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def get_request_hash(request):
+    digest = hashlib.sha256()
+    digest.update(request.path.encode())
+    digest.update(b'\n')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def get_lock_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+
+def claim_key(user, scope, key, request_hash):
+    """
+    Try to become the request that runs for this key.
+    Returns (record, None) if the caller should run the view, or (None, response)
+    with the response to send instead.
+    """
+    keys = IdempotencyKey.objects.filter(user=user, scope=scope, key=key)
+    # Retries are the common case here, so look first: a replay is a single indexed read
+    existing = keys.first()
+    if existing is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, scope=scope, key=key, request_hash=request_hash,
+                ), None
+        except IntegrityError:
+            # Another request claimed the key between our read and insert
+            existing = keys.first()
+        if existing is None:
+            # ...and has already failed and released it
+            return None, Response(
+                {'detail': 'A request with this Idempotency-Key was just retried. Please try again.'},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+    if existing.request_hash != request_hash:
+        return None, Response(
+            {'detail': 'This Idempotency-Key was already used with a different request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+
+    if existing.is_completed:
+        response = Response(existing.response_body, status=existing.status_code)
+        response[REPLAYED_HEADER] = 'true'
+        return None, response
+
+    # Still running, unless the request that claimed it died: take stale keys over
+    now = timezone.now()
+    if existing.created_at < now - get_lock_timeout():
+        taken = IdempotencyKey.objects.filter(
+            pk=existing.pk, status_code__isnull=True, created_at=existing.created_at,
+        ).update(created_at=now)
+        if taken:
+            existing.created_at = now
+            return existing, None
+
+    return None, Response(
+        {'detail': 'A request with this Idempotency-Key is already being processed.'},
+        status=status.HTTP_409_CONFLICT,
+    )
+
+
+def store_response(record, response):
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        status_code=response.status_code,
+        response_body=response.data,
+        completed_at=timezone.now(),
+    )
+
+
+def release_key(record):
+    IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True).delete()
+
+
+def idempotent(scope):
+    """
+    Honour the Idempotency-Key header on a DRF view.
+    Apply it below @api_view/@permission_classes (or with method_decorator on an
+    APIView method) so it receives the authenticated DRF request.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            key = request.META.get(HEADER, '').strip()
+            if not key or not request.user.is_authenticated:
+                return view_func(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'detail': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            record, response = claim_key(request.user, scope, key, get_request_hash(request))
+            if response is not None:
+                return response
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                release_key(record)
+                raise
+            if status.is_success(response.status_code):
+                store_response(record, response)
+            else:
+                release_key(record)
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from orders import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales, product and customer rollups used by the admin dashboard"
+
+    def handle(self, *args, **options):
+        counts = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt sales rollups: {counts['sales']} sales rows, "
+            f"{counts['products']} product rows, {counts['customers']} customer rows"
+        ))
@@ -1,4 +1,5 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from users.models import User
 from products.models import Product
 from decimal import Decimal
@@ -66,6 +67,9 @@ class Order(models.Model):
         default='cash_on_delivery'
     )
     payment_date = models.DateTimeField(null=True, blank=True)
+    # True while the order's stock is only held by a StockReservation (checkout started,
+    # payment pending); cleared once the stock is taken (see payments/services.py)
+    stock_held = models.BooleanField(default=False, editable=False)
     
     # Order status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -98,6 +102,37 @@ class Order(models.Model):
         """String representation of the order for admin and debugging"""
         return f"Order {self.order_number} by {self.user.username}"
 
+    @property
+    def stock_reference(self):
+        """How StockReservation and StockMovement rows refer to this order."""
+        return f"order:{self.pk}"
+
+    def cancel(self, reason=None):
+        """
+        Cancel the order and give its stock back in one transaction: stock still only
+        held for it is released, stock already taken is restored with one UPDATE for all
+        of its products. The order row is locked first, so concurrent cancellations (or a
+        cancellation and a refund) give the stock back once. Returns False, changing
+        nothing, if the order was already cancelled.
+        """
+        from products.inventory import release_reservations, restore_stock
+        from products.models import StockMovement
+        with transaction.atomic():
+            locked = Order.objects.select_for_update().only('status', 'stock_held').get(pk=self.pk)
+            if locked.status == 'cancelled':
+                return False
+            if locked.stock_held:
+                release_reservations([self.stock_reference])
+            else:
+                quantities = {}
+                for product_id, quantity in self.items.values_list('product_id', 'quantity'):
+                    quantities[product_id] = quantities.get(product_id, 0) + quantity
+                restore_stock(quantities, reason or StockMovement.CANCELLATION, self.stock_reference)
+            self.status = 'cancelled'
+            self.stock_held = False
+            self.save()
+        return True
+
     def calculate_total(self):
         """
         Calculate the total amount of the order by summing all order items.
@@ -156,6 +191,7 @@ class Order(models.Model):
             models.Index(fields=['order_number']),
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['-created_at', '-id']),
         ]
 
 class OrderItem(models.Model):
@@ -210,4 +246,95 @@ class OrderItem(models.Model):
         return self.quantity * self.price
 
     class Meta:
-        ordering = ['id']
\ No newline at end of file
+        ordering = ['id']
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key for a POST endpoint, with the response it produced.
+    The unique constraint makes the first request with a key the only one that runs;
+    retries with the same key get the stored response back (see orders/idempotency.py).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Which endpoint the key was used for, so one key cannot replay another endpoint's response
+    scope = models.CharField(max_length=50)
+    # Hash of the request body: reusing a key with a different payload is rejected
+    request_hash = models.CharField(max_length=64)
+    
+    # Null until the first request finishes
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.key} ({self.user_id})"
+
+    @property
+    def is_completed(self):
+        return self.status_code is not None
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+
+
+# Daily sales rollups for the admin dashboard (maintained by orders/rollups.py).
+# Every order counts towards the day it was placed; when an order changes status,
+# payment state or total its contribution moves between rows, so the dashboard can
+# read these small tables instead of scanning Order and OrderItem.
+
+class DailySalesRollup(models.Model):
+    """Orders and sales per day, status and payment method."""
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    orders_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} {self.status}/{self.payment_method}: {self.orders_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'status', 'payment_method'], name='unique_daily_sales_rollup'),
+        ]
+
+
+class DailyProductSales(models.Model):
+    """Units, revenue and order lines per day and product."""
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} product {self.product_id}: {self.quantity}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_product_sales'),
+        ]
+
+
+class DailyCustomerSales(models.Model):
+    """Orders and spend per day and customer."""
+    date = models.DateField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_sales')
+    orders_count = models.IntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.date} user {self.user_id}: {self.orders_count}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'user'], name='unique_daily_customer_sales'),
+        ]
@@ -0,0 +1,197 @@
+"""
+Incremental maintenance of the daily sales rollups used by admin_dashboard_stats
+(DailySalesRollup, DailyProductSales and DailyCustomerSales).
+
+The Order and OrderItem signals in orders/signals.py call these helpers in the same
+transaction as the change. Each change is applied as a delta: the row's previous
+contribution is subtracted from its old bucket and the new one added with F()
+updates, so concurrent writers never overwrite each other's counts.
+
+Queryset update() and bulk_create() skip the signals; code that uses them must call
+record_items() (or rebuild) itself. `python manage.py rebuild_sales_rollups`
+recomputes every rollup from the order tables.
+"""
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import Order, OrderItem, DailySalesRollup, DailyProductSales, DailyCustomerSales
+
+ORDER_FIELDS = ('created_at', 'status', 'payment_method', 'is_paid', 'total_amount', 'user_id')
+ITEM_FIELDS = ('order_id', 'product_id', 'quantity', 'price')
+
+
+def rollup_date(created_at):
+    """The day an order counts towards (in the site's time zone)."""
+    return timezone.localtime(created_at).date()
+
+
+def load_order_state(pk):
+    row = Order.objects.filter(pk=pk).values_list(*ORDER_FIELDS).first()
+    return tuple(row) if row else None
+
+
+def load_item_state(pk):
+    row = OrderItem.objects.filter(pk=pk).values_list(*ITEM_FIELDS).first()
+    return tuple(row) if row else None
+
+
+def order_rows(state, include_customer=True):
+    """[(model, key, contribution)] for one order state."""
+    if state is None:
+        return []
+    created_at, status, payment_method, is_paid, total_amount, user_id = state
+    date = rollup_date(created_at)
+    total_amount = Decimal(total_amount or 0)
+    rows = [(
+        DailySalesRollup,
+        {'date': date, 'status': status, 'payment_method': payment_method},
+        {'orders_count': 1, 'paid_count': int(bool(is_paid)), 'total_sales': total_amount},
+    )]
+    if include_customer:
+        rows.append((
+            DailyCustomerSales,
+            {'date': date, 'user_id': user_id},
+            {'orders_count': 1, 'total_spent': total_amount},
+        ))
+    return rows
+
+
+def item_rows(state, order_dates):
+    """[(model, key, contribution)] for one order item state."""
+    if state is None:
+        return []
+    order_id, product_id, quantity, price = state
+    date = order_dates.get(order_id)
+    if date is None:
+        return []
+    return [(
+        DailyProductSales,
+        {'date': date, 'product_id': product_id},
+        {'quantity': quantity, 'revenue': Decimal(price or 0) * quantity, 'orders_count': 1},
+    )]
+
+
+def get_order_dates(order_ids, order=None):
+    """{order_id: rollup date}, using `order` when it is the only one needed."""
+    order_ids = set(order_ids)
+    if order is not None and order_ids == {order.pk} and order.created_at:
+        return {order.pk: rollup_date(order.created_at)}
+    return {
+        pk: rollup_date(created_at)
+        for pk, created_at in Order.objects.filter(pk__in=order_ids).values_list('pk', 'created_at')
+    }
+
+
+def apply_delta(model, key, delta):
+    """Add `delta` ({field: amount}) to the rollup row identified by `key`, creating it if needed."""
+    if not any(delta.values()):
+        return
+    increments = {field: F(field) + amount for field, amount in delta.items()}
+    if model.objects.filter(**key).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**key, **delta)
+    except IntegrityError:
+        # Created concurrently: it exists now
+        model.objects.filter(**key).update(**increments)
+
+
+def apply_change(old_rows, new_rows):
+    """Move contributions from old_rows to new_rows, skipping rows that did not change."""
+    unchanged = [row for row in old_rows if row in new_rows]
+    for model, key, contribution in old_rows:
+        if (model, key, contribution) not in unchanged:
+            apply_delta(model, key, {field: -amount for field, amount in contribution.items()})
+    for model, key, contribution in new_rows:
+        if (model, key, contribution) not in unchanged:
+            apply_delta(model, key, contribution)
+
+
+def record_order_change(old_state, new_state, include_customer=True):
+    apply_change(order_rows(old_state, include_customer), order_rows(new_state, include_customer))
+
+
+def record_item_change(old_state, new_state, order=None):
+    order_ids = {state[0] for state in (old_state, new_state) if state}
+    order_dates = get_order_dates(order_ids, order)
+    apply_change(item_rows(old_state, order_dates), item_rows(new_state, order_dates))
+
+
+def record_items(order, items):
+    """
+    Add newly created items of one order (e.g. from bulk_create) with a constant number
+    of queries: make sure every product row exists, then add all deltas in one CASE UPDATE.
+    """
+    date = rollup_date(order.created_at)
+    deltas = {}
+    for item in items:
+        delta = deltas.setdefault(item.product_id, {'quantity': 0, 'revenue': Decimal('0'), 'orders_count': 0})
+        delta['quantity'] += item.quantity
+        delta['revenue'] += item.price * item.quantity
+        delta['orders_count'] += 1
+    if not deltas:
+        return
+
+    DailyProductSales.objects.bulk_create(
+        [DailyProductSales(date=date, product_id=product_id) for product_id in deltas],
+        ignore_conflicts=True,
+    )
+    DailyProductSales.objects.filter(date=date, product_id__in=deltas).update(**{
+        field: Case(
+            *[When(product_id=product_id, then=F(field) + delta[field]) for product_id, delta in deltas.items()],
+            default=F(field),
+            output_field=DailyProductSales._meta.get_field(field),
+        )
+        for field in ('quantity', 'revenue', 'orders_count')
+    })
+
+
+def rebuild():
+    """Recompute all rollups from the order tables. Returns the number of rows written per table."""
+    orders = Order.objects.order_by().annotate(day=TruncDate('created_at'))
+    items = OrderItem.objects.order_by().annotate(day=TruncDate('order__created_at'))
+
+    with transaction.atomic():
+        DailySalesRollup.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+        DailyCustomerSales.objects.all().delete()
+
+        sales = DailySalesRollup.objects.bulk_create((
+            DailySalesRollup(
+                date=row['day'], status=row['status'], payment_method=row['payment_method'],
+                orders_count=row['orders'], paid_count=row['paid'], total_sales=row['sales'] or 0,
+            )
+            for row in orders.values('day', 'status', 'payment_method').annotate(
+                orders=Count('id'),
+                paid=Count('id', filter=Q(is_paid=True)),
+                sales=Sum('total_amount'),
+            ).iterator()
+        ), batch_size=1000)
+
+        products = DailyProductSales.objects.bulk_create((
+            DailyProductSales(
+                date=row['day'], product_id=row['product_id'], quantity=row['units'],
+                revenue=row['sales'] or 0, orders_count=row['lines'],
+            )
+            for row in items.values('day', 'product_id').annotate(
+                units=Sum('quantity'),
+                sales=Sum(F('quantity') * F('price')),
+                lines=Count('id'),
+            ).iterator()
+        ), batch_size=1000)
+
+        customers = DailyCustomerSales.objects.bulk_create((
+            DailyCustomerSales(
+                date=row['day'], user_id=row['user_id'], orders_count=row['orders'],
+                total_spent=row['spent'] or 0,
+            )
+            for row in orders.values('day', 'user_id').annotate(
+                orders=Count('id'),
+                spent=Sum('total_amount'),
+            ).iterator()
+        ), batch_size=1000)
+
+    return {'sales': len(sales), 'products': len(products), 'customers': len(customers)}
@@ -0,0 +1,63 @@
+from django.db import models
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from products.models import Product
+from users.models import User
+from .models import Order, OrderItem
+from . import rollups
+
+
+def deleted_via(origin, model):
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    return origin_model is model
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_delete, sender=Order)
+def load_stored_order_state(sender, instance, **kwargs):
+    """
+    Read what the stored order currently contributes to the sales rollups
+    (the instance itself may be stale or partially loaded).
+    """
+    instance._rollup_state = rollups.load_order_state(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Order)
+def update_rollups_on_order_save(sender, instance, **kwargs):
+    """
+    Move the order's contribution between daily sales rollup rows when its
+    status, payment method, payment state or total changes.
+    """
+    rollups.record_order_change(instance._rollup_state, rollups.load_order_state(instance.pk))
+
+
+@receiver(post_delete, sender=Order)
+def update_rollups_on_order_delete(sender, instance, origin=None, **kwargs):
+    """
+    Remove a deleted order from the rollups. When the whole customer is being
+    deleted their DailyCustomerSales rows go with them, so only the sales totals change.
+    """
+    rollups.record_order_change(instance._rollup_state, None, include_customer=not deleted_via(origin, User))
+
+
+@receiver(pre_save, sender=OrderItem)
+@receiver(pre_delete, sender=OrderItem)
+def load_stored_item_state(sender, instance, **kwargs):
+    instance._rollup_state = rollups.load_item_state(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=OrderItem)
+def update_rollups_on_item_save(sender, instance, **kwargs):
+    """Keep the per-product daily sales in sync with order items created or edited one by one."""
+    new_state = (instance.order_id, instance.product_id, instance.quantity, instance.price)
+    order = instance._state.fields_cache.get('order')
+    rollups.record_item_change(instance._rollup_state, new_state, order=order)
+
+
+@receiver(post_delete, sender=OrderItem)
+def update_rollups_on_item_delete(sender, instance, origin=None, **kwargs):
+    # A deleted product's DailyProductSales rows are removed along with it
+    if deleted_via(origin, Product):
+        return
+    order = instance._state.fields_cache.get('order')
+    rollups.record_item_change(instance._rollup_state, None, order=order)
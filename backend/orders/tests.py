@@ -1,3 +1,242 @@
+from decimal import Decimal
+from unittest import mock
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import User
+from products.models import Product, Category, StockMovement, StockReservation
+from products.inventory import reserve_stock
+from cart.models import Cart, CartItem
+from .models import Order, OrderItem, DailySalesRollup, DailyProductSales, DailyCustomerSales
+from . import rollups
 
-# Create your tests here.
+
+class OrderTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass12345')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Tools')
+        self.products = [
+            Product.objects.create(
+                title=f'Tool {i}', description='Hand tool', unit_price=10 + i, stock=5, category=self.category,
+            )
+            for i in range(6)
+        ]
+
+    def place_order(self, lines):
+        return self.client.post(reverse('place-order'), {
+            'cart': [{'product_id': str(product.id), 'quantity': str(quantity)} for product, quantity in lines],
+            'shipping_address': '1 Main St',
+        }, format='json')
+
+
+class PlaceOrderTests(OrderTestCase):
+    def test_order_takes_stock_and_clears_cart(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.products[0], quantity=2)
+
+        response = self.place_order([(self.products[0], 2), (self.products[1], 3)])
+        self.assertEqual(response.status_code, 201)
+
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(
+            list(order.items.values_list('product_id', 'quantity', 'price')),
+            [(self.products[0].id, 2, 10), (self.products[1].id, 3, 11)],
+        )
+        self.assertEqual(order.subtotal, 53)
+        self.assertEqual(order.total_amount, Decimal('68.30'))
+        self.assertEqual(
+            list(Product.objects.filter(id__in=[self.products[0].id, self.products[1].id]).order_by('id').values_list('stock', flat=True)),
+            [3, 2],
+        )
+        self.assertFalse(cart.items.exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        def count_queries(lines):
+            Order.objects.all().delete()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.place_order(lines).status_code, 201)
+            return len(queries)
+
+        # Warm up: the first order of the day creates the rollup rows
+        count_queries([(product, 1) for product in self.products])
+        small = count_queries([(self.products[0], 1)])
+        large = count_queries([(product, 1) for product in self.products])
+        self.assertEqual(small, large)
+
+    def test_insufficient_stock_changes_nothing(self):
+        response = self.place_order([(self.products[0], 1), (self.products[1], 6)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Insufficient stock for Tool 1', response.data['detail'])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 5)
+
+    def test_unknown_product_changes_nothing(self):
+        response = self.client.post(reverse('place-order'), {
+            'cart': [
+                {'product_id': str(self.products[0].id), 'quantity': '1'},
+                {'product_id': '999999', 'quantity': '1'},
+            ],
+            'shipping_address': '1 Main St',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Product with ID 999999 not found', response.data['detail'])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 5)
+
+
+class IdempotencyKeyTests(OrderTestCase):
+    def post_with_key(self, key, quantity=1):
+        return self.client.post(reverse('place-order'), {
+            'cart': [{'product_id': str(self.products[0].id), 'quantity': str(quantity)}],
+            'shipping_address': '1 Main St',
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.post_with_key('checkout-1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.post_with_key('checkout-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['order']['id'], first.data['order']['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(id=self.products[0].id).stock, 4)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.post_with_key('checkout-1')
+        response = self.post_with_key('checkout-1', quantity=2)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_releases_key(self):
+        self.assertEqual(self.post_with_key('checkout-1', quantity=50).status_code, 400)
+        Product.objects.filter(id=self.products[0].id).update(stock=100)
+        self.assertEqual(self.post_with_key('checkout-1', quantity=50).status_code, 201)
+
+    def test_orders_without_key_are_not_rejected_as_duplicates(self):
+        self.assertEqual(self.place_order([(self.products[0], 1)]).status_code, 201)
+        self.assertEqual(self.place_order([(self.products[0], 1)]).status_code, 201)
+        self.assertEqual(Order.objects.filter(user=self.user).count(), 2)
+
+
+class SalesRollupTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True,
+        )
+
+    def rollup_snapshot(self):
+        return {
+            'sales': sorted(DailySalesRollup.objects.filter(orders_count__gt=0).values_list(
+                'date', 'status', 'payment_method', 'orders_count', 'paid_count', 'total_sales')),
+            'products': sorted(DailyProductSales.objects.filter(quantity__gt=0).values_list(
+                'date', 'product_id', 'quantity', 'revenue', 'orders_count')),
+            'customers': sorted(DailyCustomerSales.objects.filter(orders_count__gt=0).values_list(
+                'date', 'user_id', 'orders_count', 'total_spent')),
+        }
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.place_order([(self.products[0], 2), (self.products[1], 1)])
+        self.place_order([(self.products[1], 3)])
+        first, second = Order.objects.order_by('id')
+
+        self.client.force_authenticate(self.admin)
+        self.client.patch(reverse('update-order-status', args=[first.id]), {'status': 'delivered', 'is_paid': True})
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('cancel-order', args=[second.id]))
+        OrderItem.objects.create(order=first, product=self.products[2], quantity=1, price=12)
+
+        incremental = self.rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_snapshot())
+        self.assertEqual(
+            [row[1:5] for row in incremental['sales']],
+            [('cancelled', 'cash_on_delivery', 1, 0), ('delivered', 'cash_on_delivery', 1, 1)],
+        )
+
+        first.delete()
+        incremental = self.rollup_snapshot()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_snapshot())
+
+    def test_dashboard_stats_read_rollups(self):
+        self.place_order([(self.products[0], 2)])
+        self.place_order([(self.products[1], 1), (self.products[2], 1)])
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse('admin-dashboard-stats'), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        overview = response.data['overview']
+        self.assertEqual((overview['total_orders'], overview['pending_orders'], overview['paid_orders']), (2, 2, 0))
+        self.assertEqual(response.data['top_products'][0]['product__id'], self.products[0].id)
+        self.assertEqual(response.data['top_products'][0]['total_quantity'], 2)
+        self.assertEqual(response.data['top_customers'][0]['total_orders'], 2)
+        self.assertEqual(response.data['daily_sales'][0]['orders_count'], 2)
+        self.assertEqual(set(response.data['meta']), {'queries', 'db_time_ms', 'total_time_ms'})
+
+
+class CancelOrderTests(OrderTestCase):
+    def cancel(self, order):
+        return self.client.post(reverse('cancel-order', args=[order.id]))
+
+    def stock(self):
+        return list(Product.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_cancel_restores_stock_once_and_journals_it(self):
+        order_id = self.place_order([(product, 1) for product in self.products[:4]]).data['order']['id']
+        order = Order.objects.get(pk=order_id)
+        self.assertEqual(self.stock(), [4, 4, 4, 4, 5, 5])
+
+        # Order lock, items, one UPDATE and one INSERT for all products, however many items
+        with CaptureQueriesContext(connection) as queries:
+            response = self.cancel(order)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), [5, 5, 5, 5, 5, 5])
+        self.assertEqual(sum(1 for query in queries if query['sql'].startswith('UPDATE "products_product"')), 1)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(reason='cancellation').values_list(
+                'product_id', 'quantity', 'reason', 'reference',
+            )),
+            [(product.id, 1, 'cancellation', f'order:{order.id}') for product in self.products[:4]],
+        )
+
+        # A second cancellation (or a later refund) gives nothing back again
+        self.assertFalse(Order.objects.get(pk=order.pk).cancel())
+        self.assertEqual(self.cancel(order).status_code, 400)
+        self.assertEqual(self.stock(), [5, 5, 5, 5, 5, 5])
+
+    def test_cancel_releases_stock_that_was_only_held(self):
+        order = Order.objects.create(user=self.user, total_amount=20, stock_held=True)
+        OrderItem.objects.create(order=order, product=self.products[0], quantity=2, price=10)
+        with transaction.atomic():
+            reserve_stock({self.products[0].id: 2}, order.stock_reference)
+
+        self.assertEqual(self.cancel(order).status_code, 200)
+        product = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual((product.stock, product.reserved), (5, 0))
+        self.assertFalse(StockReservation.objects.exists())
+        self.assertFalse(StockMovement.objects.filter(reason='cancellation').exists())
+
+    def test_refund_restores_stock(self):
+        from payments.models import Payment
+        from payments.services import StripeService
+
+        order = Order.objects.get(pk=self.place_order([(self.products[0], 3)]).data['order']['id'])
+        payment = Payment.objects.create(order=order, user=self.user, amount=order.total_amount, status='succeeded')
+        with mock.patch('stripe.RefundService.create') as create_refund:
+            StripeService.create_refund(payment, reason='requested_by_customer')
+        create_refund.assert_called_once()
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 5)
+        self.assertEqual(
+            list(StockMovement.objects.filter(product=self.products[0]).order_by('id').values_list('quantity', 'reason')),
+            [(5, 'adjustment'), (-3, 'order'), (3, 'refund')],
+        )
@@ -1,6 +1,8 @@
 from django.shortcuts import render
-from django.db.models import Sum, Count, Q, F
+from django.db.models import Sum, Count, Q, F, prefetch_related_objects
+from django.db import transaction
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
@@ -11,8 +13,12 @@ from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
-from .models import Order, OrderItem
-from products.models import Product
+from .models import Order, OrderItem, DailySalesRollup, DailyProductSales, DailyCustomerSales
+from .idempotency import idempotent
+from .rollups import record_items, rollup_date
+from backend.stats import StatsEngine, sum_where
+from products.models import Product, StockMovement
+from products.inventory import check_available, lock_products, take_stock, StockError
 from cart.models import Cart, CartItem
 from users.models import User
 from .serializers import (
@@ -32,13 +38,16 @@ class PlaceOrderView(APIView):
     - Requires user authentication
     - Accepts cart items and comprehensive shipping details
     - Validates product availability and stock
-    - Creates order and order items
-    - Updates product stock levels
+    - Locks all ordered products at once (id order) and updates their stock in one query
+    - Creates order and order items (bulk insert), all or nothing
     - Clears user's cart after successful order
+    - Optional Idempotency-Key header: a retry with the same key replays the first
+      response instead of placing a second order (see orders/idempotency.py)
     """
     
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(idempotent('place-order'))
     def post(self, request):
         """
         Handle order creation from cart data with enhanced features.
@@ -51,169 +60,123 @@ class PlaceOrderView(APIView):
         validated_data = serializer.validated_data
         cart_items = validated_data['cart']
         
-        # Enhanced duplicate prevention for cash on delivery orders
-        from django.db import transaction
+        logger.info(f"Processing order request for user {user.id} with {len(cart_items)} items")
+
+        # Get user's cart to apply any existing promo codes
+        user_cart = None
+        try:
+            user_cart = Cart.objects.get(user=user)
+        except Cart.DoesNotExist:
+            pass
+
+        # Create the main order object
+        order_data = {
+            'user': user,
+            'shipping_address': validated_data['shipping_address'],
+            'shipping_city': validated_data.get('shipping_city', ''),
+            'shipping_state': validated_data.get('shipping_state', ''),
+            'shipping_zip': validated_data.get('shipping_zip', ''),
+            'shipping_country': validated_data.get('shipping_country', 'USA'),
+            'shipping_phone': validated_data.get('shipping_phone', ''),
+            'payment_method': validated_data.get('payment_method', 'cash_on_delivery'),
+            'customer_notes': validated_data.get('customer_notes', ''),
+        }
         
-        # Use atomic transaction with database-level locking to prevent race conditions
-        with transaction.atomic():
-            # Lock the user record to prevent concurrent order creation
-            user_locked = User.objects.select_for_update().get(id=user.id)
-            
-            logger.info(f"Processing order request for user {user.id} with {len(cart_items)} items")
-            
-            # Check if user already has any pending order (now within the locked transaction)
-            existing_pending_order = Order.objects.filter(
-                user=user_locked, 
-                status='pending',
-                payment_method='cash_on_delivery'
-            ).first()
-            
-            if existing_pending_order:
-                # Check if the existing order has the same items as the cart
-                existing_items = existing_pending_order.items.all()
-                cart_product_ids = [item['product_id'] for item in cart_items]
-                existing_product_ids = [item.product.id for item in existing_items]
-                
-                logger.info(f"User {user.id} attempting to place order with products {cart_product_ids}, existing order has {existing_product_ids}")
-                
-                # If it's the same products, return the existing order instead of creating a new one
-                if set(cart_product_ids) == set(existing_product_ids):
-                    logger.info(f"Preventing duplicate order for user {user.id}, returning existing order {existing_pending_order.id}")
-                    return Response({
-                        'message': 'You already have a pending order with the same items.',
-                        'order': OrderSerializer(existing_pending_order).data,
-                        'is_duplicate': True
-                    }, status=status.HTTP_200_OK)
-                else:
-                    # Different items - warn but allow for now, but with stricter time check
-                    recent_order = Order.objects.filter(
-                        user=user_locked, 
-                        created_at__gte=timezone.now() - timedelta(minutes=5),
-                        status='pending'
-                    ).first()
-                    
-                    if recent_order:
-                        logger.info(f"Preventing recent duplicate order for user {user.id}, recent order {recent_order.id}")
-                        return Response({
-                            'error': 'You have a recent pending order. Please wait a few minutes before placing another order or complete your existing order first.',
-                            'existing_order_id': recent_order.id,
-                            'existing_order_number': recent_order.order_number,
-                            'is_duplicate': True
-                        }, status=status.HTTP_409_CONFLICT)  # Changed to 409 Conflict instead of 400
-            
-            # If we get here, no duplicate order exists, so proceed with creating a new order
-            # Get user's cart to apply any existing promo codes
-            user_cart = None
-            try:
-                user_cart = Cart.objects.get(user=user_locked)
-            except Cart.DoesNotExist:
-                pass
-
-            # Create the main order object
-            order_data = {
-                'user': user_locked,
-                'shipping_address': validated_data['shipping_address'],
-                'shipping_city': validated_data.get('shipping_city', ''),
-                'shipping_state': validated_data.get('shipping_state', ''),
-                'shipping_zip': validated_data.get('shipping_zip', ''),
-                'shipping_country': validated_data.get('shipping_country', 'USA'),
-                'shipping_phone': validated_data.get('shipping_phone', ''),
-                'payment_method': validated_data.get('payment_method', 'cash_on_delivery'),
-                'customer_notes': validated_data.get('customer_notes', ''),
-            }
-            
-            # Apply promo code if exists
-            if user_cart and user_cart.promo_code:
-                order_data['promo_code'] = user_cart.promo_code
-                order_data['discount_amount'] = user_cart.discount_amount
-
-            # Create the order (still within the atomic transaction)
-            try:
-                # Create the order
-                order = Order.objects.create(**order_data)
-                
-                # Calculate totals
-                subtotal = Decimal('0')
-                items_created = []
-                
-                # Process each item in the cart
+        # Apply promo code if exists
+        if user_cart and user_cart.promo_code:
+            order_data['promo_code'] = user_cart.promo_code
+            order_data['discount_amount'] = user_cart.discount_amount
+
+        try:
+            # Any failure below rolls back the order, its items and every stock change together
+            with transaction.atomic():
+                # Parse the cart first so no lock is taken for malformed data
+                lines = []
+                quantities = {}
                 for item in cart_items:
                     try:
-                        product = Product.objects.select_for_update().get(id=item['product_id'])
+                        product_id = int(item['product_id'])
                         quantity = int(item['quantity'])
-                        price = product.unit_price
-                        
-                        # Check if enough stock is available
-                        if product.stock < quantity:
-                            raise ValueError(f'Insufficient stock for {product.title}. Available: {product.stock}, requested: {quantity}')
-                        
-                        # Create order item with current product price
-                        order_item = OrderItem.objects.create(
-                            order=order,
-                            product=product,
-                            quantity=quantity,
-                            price=price,
-                            product_title=product.title,
-                            product_sku=getattr(product, 'sku', ''),
-                        )
-                        
-                        items_created.append(order_item)
-                        
-                        # Update product stock (reduce by ordered quantity)
-                        product.stock -= quantity
-                        product.save()
-                        
-                        # Add to subtotal
-                        subtotal += price * quantity
-                        
-                    except Product.DoesNotExist:
-                        raise ValueError(f'Product with ID {item["product_id"]} not found')
-                    except (ValueError, KeyError) as e:
+                    except (ValueError, KeyError, TypeError) as e:
                         raise ValueError(f'Invalid cart data: {str(e)}')
+                    if quantity < 1:
+                        raise ValueError('Invalid cart data: quantity must be at least 1')
+                    lines.append((product_id, quantity))
+                    quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+                # One id-ordered SELECT ... FOR UPDATE for the whole cart; the stock is
+                # taken with one UPDATE once the order exists to reference it
+                try:
+                    products = lock_products(quantities)
+                    check_available(products, quantities)
+                except StockError as e:
+                    raise ValueError(f'Invalid cart data: {str(e)}')
+
+                # Calculate totals with current product prices
+                subtotal = sum(
+                    (products[product_id].unit_price * quantity for product_id, quantity in lines),
+                    Decimal('0'),
+                )
+                order_data['subtotal'] = subtotal
 
-                # Calculate order totals
-                order.subtotal = subtotal
-                
                 # Calculate shipping cost (free shipping over $100)
                 if subtotal >= 100:
-                    order.shipping_cost = Decimal('0.00')
+                    order_data['shipping_cost'] = Decimal('0.00')
                 else:
-                    order.shipping_cost = Decimal('10.00')
-                
+                    order_data['shipping_cost'] = Decimal('10.00')
+
                 # Calculate tax (10%)
-                order.tax_amount = (subtotal * Decimal('0.10')).quantize(Decimal('0.01'))
-                
+                order_data['tax_amount'] = (subtotal * Decimal('0.10')).quantize(Decimal('0.01'))
+
                 # Apply discount if any
-                discount = order.discount_amount or Decimal('0')
-                
+                discount = order_data.get('discount_amount') or Decimal('0')
+
                 # Calculate final total
-                order.total_amount = subtotal + order.shipping_cost + order.tax_amount - discount
-                order.save()
+                order_data['total_amount'] = (
+                    subtotal + order_data['shipping_cost'] + order_data['tax_amount'] - discount
+                )
+                order = Order.objects.create(**order_data)
+                take_stock(products, quantities, StockMovement.ORDER, order.stock_reference)
+
+                # Create order items with current product prices in one INSERT
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product=products[product_id],
+                        quantity=quantity,
+                        price=products[product_id].unit_price,
+                        product_title=products[product_id].title,
+                        product_sku=getattr(products[product_id], 'sku', ''),
+                    )
+                    for product_id, quantity in lines
+                ])
+                # bulk_create skips the OrderItem signals, so update the product rollups here
+                record_items(order, order_items)
 
                 # Clear user's cart after successful order
                 if user_cart:
-                    user_cart.items.all().delete()
-                    user_cart.promo_code = None
-                    user_cart.discount_amount = 0
-                    user_cart.save()
+                    user_cart.clear()
+
+            logger.info(f"Successfully created order {order.id} for user {user.id}")
 
-                logger.info(f"Successfully created order {order.id} for user {user.id}")
+            # Load the items and their products for the response in a fixed number of queries
+            prefetch_related_objects([order], 'items__product__category')
+            
+            # Return the created order data
+            return Response({
+                'message': 'Order placed successfully!',
+                'order': OrderSerializer(order).data
+            }, status=status.HTTP_201_CREATED)
                 
-                # Return the created order data
-                return Response({
-                    'message': 'Order placed successfully!',
-                    'order': OrderSerializer(order).data
-                }, status=status.HTTP_201_CREATED)
-                    
-            except ValueError as e:
-                return Response({
-                    'detail': str(e)
-                }, status=status.HTTP_400_BAD_REQUEST)
-            except Exception as e:
-                logger.error(f"Error creating order for user {user.id}: {str(e)}")
-                return Response({
-                    'detail': f'Failed to create order: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except ValueError as e:
+            return Response({
+                'detail': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error creating order for user {user.id}: {str(e)}")
+            return Response({
+                'detail': f'Failed to create order: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
 class UserOrderHistoryView(generics.ListAPIView):
@@ -290,16 +253,11 @@ class CancelOrderView(APIView):
                 'detail': f'Order cannot be cancelled. Current status: {order.status_display}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Restore product stock
-        for item in order.items.all():
-            product = item.product
-            product.stock += item.quantity
-            product.save()
-        
-        # Update order status
-        order.status = 'cancelled'
-        order.save()
-        
+        # Gives the stock back with one UPDATE; False if a concurrent request cancelled it first
+        if not order.cancel():
+            return Response({'detail': 'Order is already cancelled'}, status=status.HTTP_400_BAD_REQUEST)
+
+        prefetch_related_objects([order], 'items__product__category')
         return Response({
             'message': 'Order cancelled successfully',
             'order': OrderSerializer(order).data
@@ -387,91 +345,121 @@ def admin_dashboard_stats(request):
     
     GET /api/admin/dashboard/stats/?days=30
     - Returns enhanced analytics and metrics
-    - Supports different time periods
+    - Supports different time periods (whole days)
+    - Reads the daily sales rollups; rebuild them with `manage.py rebuild_sales_rollups`
+    - "meta" reports the query count and timing of the request
     """
     
     # Get date range from query params (default to last 30 days)
     days = int(request.query_params.get('days', 30))
     date_from = timezone.now() - timedelta(days=days)
+    # The rollups are per day, so the window starts at the beginning of that day
+    first_day = rollup_date(date_from)
     
-    # Base queryset for the specified time period
-    orders_queryset = Order.objects.filter(created_at__gte=date_from)
-    
-    # Enhanced statistics
-    total_orders = orders_queryset.count()
-    total_sales = orders_queryset.aggregate(total=Sum('total_amount'))['total'] or Decimal('0')
-    paid_orders = orders_queryset.filter(is_paid=True).count()
-    pending_orders = orders_queryset.filter(status='pending').count()
-    cancelled_orders = orders_queryset.filter(status='cancelled').count()
-    delivered_orders = orders_queryset.filter(status='delivered').count()
-    
-    # Average order value
-    avg_order_value = orders_queryset.aggregate(avg=Sum('total_amount')/Count('id'))['avg'] or Decimal('0')
-    
-    # Orders by status with counts
-    orders_by_status = orders_queryset.values('status').annotate(
-        count=Count('id'),
-        total_sales=Sum('total_amount')
-    ).order_by('status')
-    
-    # Orders by payment method
-    orders_by_payment = orders_queryset.values('payment_method').annotate(
-        count=Count('id'),
-        total_sales=Sum('total_amount')
-    ).order_by('-count')
-    
-    # Recent orders
-    recent_orders = orders_queryset.order_by('-created_at')[:10]
-    recent_orders_data = AdminOrderSerializer(recent_orders, many=True).data
-    
-    # Daily sales trend
-    daily_sales = orders_queryset.extra(
-        select={'date': 'DATE(created_at)'}
-    ).values('date').annotate(
-        orders_count=Count('id'),
-        sales_amount=Sum('total_amount'),
-        avg_order_value=Sum('total_amount')/Count('id')
-    ).order_by('date')
-    
-    # Top selling products
-    top_products = OrderItem.objects.filter(
-        order__created_at__gte=date_from
-    ).values(
-        'product__id', 'product__title'
-    ).annotate(
-        total_quantity=Sum('quantity'),
-        total_revenue=Sum(F('quantity') * F('price')),
-        orders_count=Count('order', distinct=True)
-    ).order_by('-total_quantity')[:10]
-    
-    # Customer analytics
-    top_customers = Order.objects.filter(
-        created_at__gte=date_from
-    ).values(
-        'user__id', 'user__username', 'user__email'
-    ).annotate(
-        total_orders=Count('id'),
-        total_spent=Sum('total_amount')
-    ).order_by('-total_spent')[:10]
-    
-    return Response({
-        'period_days': days,
-        'overview': {
-            'total_orders': total_orders,
-            'total_sales': float(total_sales),
-            'avg_order_value': float(avg_order_value),
-            'paid_orders': paid_orders,
-            'pending_orders': pending_orders,
-            'cancelled_orders': cancelled_orders,
-            'delivered_orders': delivered_orders,
-        },
-        'orders_by_status': list(orders_by_status),
-        'orders_by_payment': list(orders_by_payment),
-        'recent_orders': recent_orders_data,
-        'daily_sales': list(daily_sales),
-        'top_products': list(top_products),
-        'top_customers': list(top_customers),
-    })
+    with StatsEngine() as engine:
+        # Everything except the recent orders list is read from the daily rollup tables
+        # (orders/rollups.py), so the cost does not grow with the order history
+        sales_rollups = DailySalesRollup.objects.filter(date__gte=first_day)
+
+        # Enhanced statistics: all overview counters in one aggregate query (see backend/stats.py)
+        overview = engine.aggregate(
+            sales_rollups,
+            total_orders=Sum('orders_count'),
+            total_sales=Sum('total_sales'),
+            paid_orders=Sum('paid_count'),
+            pending_orders=sum_where('orders_count', status='pending'),
+            cancelled_orders=sum_where('orders_count', status='cancelled'),
+            delivered_orders=sum_where('orders_count', status='delivered'),
+        )
+        total_orders = overview['total_orders']
+        total_sales = Decimal(overview['total_sales'])
+
+        # Average order value
+        avg_order_value = total_sales / total_orders if total_orders else Decimal('0')
+
+        # Orders by status with counts
+        orders_by_status = sales_rollups.values('status').annotate(
+            count=Sum('orders_count'),
+            total_sales=Sum('total_sales')
+        ).filter(count__gt=0).order_by('status')
+
+        # Orders by payment method
+        orders_by_payment = sales_rollups.values('payment_method').annotate(
+            count=Sum('orders_count'),
+            total_sales=Sum('total_sales')
+        ).filter(count__gt=0).order_by('-count')
+
+        # Recent orders (a LIMIT 10 read on the created_at index)
+        recent_orders = Order.objects.filter(
+            created_at__gte=date_from
+        ).select_related('user').prefetch_related('items__product__category').order_by('-created_at')[:10]
+        recent_orders_data = AdminOrderSerializer(recent_orders, many=True).data
+
+        # Daily sales trend
+        daily_sales = [
+            {
+                'date': row['date'],
+                'orders_count': row['day_orders'],
+                'sales_amount': row['day_sales'],
+                'avg_order_value': row['day_sales'] / row['day_orders'],
+            }
+            for row in sales_rollups.values('date').annotate(
+                day_orders=Sum('orders_count'),
+                day_sales=Sum('total_sales')
+            ).filter(day_orders__gt=0).order_by('date')
+        ]
+
+        # Top selling products
+        top_products = [
+            {
+                'product__id': row['product__id'],
+                'product__title': row['product__title'],
+                'total_quantity': row['total_quantity'],
+                'total_revenue': row['total_revenue'],
+                'orders_count': row['product_orders'],
+            }
+            for row in DailyProductSales.objects.filter(
+                date__gte=first_day
+            ).values(
+                'product__id', 'product__title'
+            ).annotate(
+                total_quantity=Sum('quantity'),
+                total_revenue=Sum('revenue'),
+                product_orders=Sum('orders_count')
+            ).filter(total_quantity__gt=0).order_by('-total_quantity')[:10]
+        ]
+
+        # Customer analytics
+        top_customers = DailyCustomerSales.objects.filter(
+            date__gte=first_day
+        ).values(
+            'user__id', 'user__username', 'user__email'
+        ).annotate(
+            total_orders=Sum('orders_count'),
+            total_spent=Sum('total_spent')
+        ).filter(total_orders__gt=0).order_by('-total_spent')[:10]
+
+        data = {
+            'period_days': days,
+            'overview': {
+                'total_orders': total_orders,
+                'total_sales': float(total_sales),
+                'avg_order_value': float(avg_order_value),
+                'paid_orders': overview['paid_orders'],
+                'pending_orders': overview['pending_orders'],
+                'cancelled_orders': overview['cancelled_orders'],
+                'delivered_orders': overview['delivered_orders'],
+            },
+            'orders_by_status': list(orders_by_status),
+            'orders_by_payment': list(orders_by_payment),
+            'recent_orders': recent_orders_data,
+            'daily_sales': daily_sales,
+            'top_products': top_products,
+            'top_customers': list(top_customers),
+        }
+        data['meta'] = engine.report()
+
+    return Response(data)
 
 
 @api_view(['PATCH'])
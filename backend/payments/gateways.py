@@ -0,0 +1,237 @@
+"""
+Payment gateways: what StripeService (payments/services.py) calls to create and read
+payment intents and to refund them.
+
+settings.PAYMENTS_GATEWAY picks the gateway:
+- "stripe": the Stripe API, through a StripeClient owned by the gateway (the stripe
+  module's global settings are left alone). All calls share its HTTP client, which
+  keeps a keep-alive session per thread, so calls reuse their connection instead of
+  opening a TLS connection each time. Calls time out after PAYMENTS_STRIPE_CONNECT_TIMEOUT /
+  PAYMENTS_STRIPE_READ_TIMEOUT seconds. Connection errors, rate limiting and
+  Stripe-side errors are retried (with the same idempotency key, so a retried create
+  never creates twice) up to PAYMENTS_STRIPE_MAX_RETRIES times, within a retry budget
+  shared by the process: during an outage, retries stop multiplying the load and the
+  time checkout requests spend waiting.
+- "fake": an in-process stand-in with no network, for offline development, tests and
+  benchmarks. It can add latency and fail or decline a share of the calls, so the
+  checkout can be measured against a provider of known speed and reliability.
+
+Gateways return PaymentIntent / Refund tuples and raise GatewayError.
+"""
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+from functools import lru_cache
+import stripe
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+PaymentIntent = namedtuple('PaymentIntent', ['id', 'status', 'client_secret'])
+Refund = namedtuple('Refund', ['id', 'status', 'amount'])
+
+# Intent statuses in which the customer can still pay
+OPEN_INTENT_STATUSES = ('requires_payment_method', 'requires_confirmation', 'requires_action')
+
+
+class GatewayError(Exception):
+    """The payment provider rejected a call or could not be reached."""
+
+
+class PaymentGateway:
+    """
+    Interface for payment gateways. Amounts are in the smallest currency unit (cents).
+    """
+    def create_payment_intent(self, amount, currency, metadata):
+        raise NotImplementedError
+
+    def retrieve_payment_intent(self, intent_id):
+        raise NotImplementedError
+
+    def create_refund(self, intent_id, amount, reason):
+        raise NotImplementedError
+
+
+class RetryBudget:
+    """
+    Token bucket limiting retries to a share of the calls: every call adds `ratio`
+    tokens, every retry takes one, and `per_second` tokens are added over time so a
+    quiet process can still retry. The bucket holds at most `burst` tokens.
+    """
+
+    def __init__(self, ratio=0.2, per_second=1.0, burst=10):
+        self.ratio = ratio
+        self.per_second = per_second
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _add(self, tokens):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def record_call(self):
+        with self.lock:
+            self._add(self.ratio)
+
+    def try_retry(self):
+        with self.lock:
+            self._add(0)
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class StripeGateway(PaymentGateway):
+    # Worth retrying: the call may not have reached Stripe, or Stripe failed on its side
+    retryable_errors = (stripe.error.APIConnectionError, stripe.error.RateLimitError, stripe.error.APIError)
+
+    def __init__(self, api_key, connect_timeout=3, read_timeout=10, max_retries=2, retry_delay=0.25, budget=None):
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.budget = budget or RetryBudget()
+        # A client of our own rather than the stripe module's global settings. Its HTTP
+        # client keeps a requests session (a connection pool) per thread; retries are
+        # ours, within the budget
+        self.client = stripe.StripeClient(
+            api_key,
+            http_client=stripe.RequestsClient(timeout=(connect_timeout, read_timeout)),
+            max_network_retries=0,
+        )
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call the StripeClient method, retrying failures that are worth it while the
+        budget allows. Creates pass an idempotency key in their options, which every
+        attempt reuses.
+        """
+        self.budget.record_call()
+        attempt = 0
+        while True:
+            try:
+                return method(*args, **kwargs)
+            except self.retryable_errors as e:
+                if attempt >= self.max_retries or not self.budget.try_retry():
+                    raise GatewayError(str(e)) from e
+                attempt += 1
+                # Exponential backoff with jitter
+                time.sleep(self.retry_delay * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            except stripe.error.StripeError as e:
+                raise GatewayError(str(e)) from e
+
+    def create_payment_intent(self, amount, currency, metadata):
+        intent = self.call(
+            self.client.payment_intents.create,
+            params={'amount': amount, 'currency': currency, 'metadata': metadata},
+            options={'idempotency_key': uuid.uuid4().hex},
+        )
+        return PaymentIntent(intent.id, intent.status, intent.client_secret)
+
+    def retrieve_payment_intent(self, intent_id):
+        intent = self.call(self.client.payment_intents.retrieve, intent_id)
+        return PaymentIntent(intent.id, intent.status, intent.client_secret)
+
+    def create_refund(self, intent_id, amount, reason):
+        refund = self.call(
+            self.client.refunds.create,
+            params={'payment_intent': intent_id, 'amount': amount, 'reason': reason},
+            options={'idempotency_key': uuid.uuid4().hex},
+        )
+        return Refund(refund.id, refund.status, amount)
+
+
+class FakeGateway(PaymentGateway):
+    """
+    In-memory payment provider. Every call takes `latency` seconds (plus up to
+    `jitter`), and fails with GatewayError with probability `failure_rate`.
+    The customer pays each intent straight away, except for a `decline_rate` share
+    whose payment is declined: those stay in requires_payment_method.
+    Intents live in this process only.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, decline_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # Intent id -> {'amount', 'declined', 'refunded'}
+        self.intents = {}
+
+    def simulate_call(self):
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            fails = self.random.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if fails:
+            raise GatewayError("Injected payment gateway failure")
+
+    def intent_status(self, intent):
+        return 'requires_payment_method' if intent['declined'] else 'succeeded'
+
+    def create_payment_intent(self, amount, currency, metadata):
+        self.simulate_call()
+        intent_id = f"pi_fake_{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            declined = self.random.random() < self.decline_rate
+            self.intents[intent_id] = {'amount': amount, 'declined': declined, 'refunded': 0}
+        # Status at creation: the customer has not paid yet
+        return PaymentIntent(intent_id, 'requires_payment_method', f"{intent_id}_secret_{uuid.uuid4().hex[:24]}")
+
+    def retrieve_payment_intent(self, intent_id):
+        self.simulate_call()
+        with self.lock:
+            intent = self.intents.get(intent_id)
+        if intent is None:
+            raise GatewayError(f"No such payment_intent: '{intent_id}'")
+        return PaymentIntent(intent_id, self.intent_status(intent), f"{intent_id}_secret")
+
+    def create_refund(self, intent_id, amount, reason):
+        self.simulate_call()
+        with self.lock:
+            intent = self.intents.get(intent_id)
+            if intent is None:
+                raise GatewayError(f"No such payment_intent: '{intent_id}'")
+            if self.intent_status(intent) != 'succeeded':
+                raise GatewayError(f"PaymentIntent {intent_id} has not been paid")
+            if intent['refunded'] + amount > intent['amount']:
+                raise GatewayError("Refund amount is greater than the unrefunded amount")
+            intent['refunded'] += amount
+        return Refund(f"re_fake_{uuid.uuid4().hex[:24]}", 'succeeded', amount)
+
+
+@lru_cache(maxsize=None)
+def get_payment_gateway():
+    """Return the gateway selected by settings.PAYMENTS_GATEWAY (one per process)."""
+    name = getattr(settings, 'PAYMENTS_GATEWAY', 'stripe')
+    if name == 'stripe':
+        return StripeGateway(
+            settings.STRIPE_SECRET_KEY,
+            connect_timeout=getattr(settings, 'PAYMENTS_STRIPE_CONNECT_TIMEOUT', 3),
+            read_timeout=getattr(settings, 'PAYMENTS_STRIPE_READ_TIMEOUT', 10),
+            max_retries=getattr(settings, 'PAYMENTS_STRIPE_MAX_RETRIES', 2),
+            budget=RetryBudget(ratio=getattr(settings, 'PAYMENTS_STRIPE_RETRY_RATIO', 0.2)),
+        )
+    if name == 'fake':
+        return FakeGateway(
+            latency=getattr(settings, 'PAYMENTS_FAKE_LATENCY_MS', 0) / 1000,
+            jitter=getattr(settings, 'PAYMENTS_FAKE_JITTER_MS', 0) / 1000,
+            failure_rate=getattr(settings, 'PAYMENTS_FAKE_FAILURE_RATE', 0.0),
+            decline_rate=getattr(settings, 'PAYMENTS_FAKE_DECLINE_RATE', 0.0),
+        )
+    raise ImproperlyConfigured(f"Unknown PAYMENTS_GATEWAY {name!r}: use 'stripe' or 'fake'")
+
+
+@receiver(setting_changed)
+def reset_payment_gateway(setting, **kwargs):
+    """Pick the gateway again when a test overrides its settings."""
+    if setting.startswith('PAYMENTS_') or setting == 'STRIPE_SECRET_KEY':
+        get_payment_gateway.cache_clear()
@@ -0,0 +1,91 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from payments.webhooks import WorkerStats, process_due_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply stored payment webhook events on a pool of threads. Threads (and other "
+        "worker processes) claim events with SELECT ... FOR UPDATE SKIP LOCKED, so any "
+        "number of workers can run at once"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'PAYMENTS_WEBHOOK_WORKERS', 4),
+            help="Threads processing events (use 1 on SQLite, which serializes writers)",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'PAYMENTS_WEBHOOK_BATCH_SIZE', 50),
+            help="Events claimed by a thread at a time",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1,
+            help="Seconds a thread waits when no event is due",
+        )
+        parser.add_argument(
+            '--report-every',
+            type=float,
+            default=60,
+            help="Seconds between throughput reports",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Process everything that is due and exit instead of running as a worker",
+        )
+
+    def handle(self, *args, **options):
+        stats = WorkerStats()
+        stop = threading.Event()
+        workers = options['workers']
+
+        def work():
+            try:
+                while not stop.is_set():
+                    if stats.report_due(options['report_every']):
+                        self.report(stats)
+                    processed, failed = process_due_events(options['batch_size'], stats)
+                    if processed or failed:
+                        continue
+                    if options['once']:
+                        return
+                    stop.wait(options['interval'])
+            finally:
+                if workers > 1:
+                    connection.close()
+
+        try:
+            if workers == 1:
+                work()
+            else:
+                with ThreadPoolExecutor(workers) as pool:
+                    futures = [pool.submit(work) for _ in range(workers)]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except KeyboardInterrupt:
+                        self.stdout.write("Stopping after the events in progress...")
+                        stop.set()
+        except KeyboardInterrupt:
+            pass
+        self.report(stats)
+
+    def report(self, stats):
+        summary = stats.summary()
+        self.stdout.write(
+            f"{summary['processed']} events processed in {summary['elapsed_s']}s "
+            f"({summary['events_per_s']}/s), {summary['duplicate']} duplicates, "
+            f"{summary['retry']} to retry, {summary['failed']} failed; "
+            f"handler p50 {summary['handler_ms']['p50']} ms, p95 {summary['handler_ms']['p95']} ms; "
+            f"receipt to processed p50 {summary['lag_ms']['p50']} ms, p95 {summary['lag_ms']['p95']} ms"
+        )
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from orders.models import Order
 from users.models import User
 import uuid
@@ -67,3 +68,45 @@ class Payment(models.Model):
     class Meta:
         ordering = ['-created_at']
 
+
+
+class WebhookEvent(models.Model):
+    """
+    A payment provider webhook, stored as received. The webhook view only inserts
+    these rows and acknowledges; the webhook worker (`python manage.py
+    run_webhook_worker`, see payments/webhooks.py) applies them to payments and orders.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    PROCESSED = 'processed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (PROCESSED, 'Processed'),
+        (FAILED, 'Failed'),
+    ]
+
+    # The provider's event id: redelivered events are stored (and processed) once
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When a worker may pick the event up: now for new events, later after a failure
+    # (backoff) or while a worker is processing it (claim timeout)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
+
+    class Meta:
+        ordering = ['-received_at']
+        indexes = [
+            # The worker's "due events" scan
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
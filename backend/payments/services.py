@@ -1,18 +1,42 @@
-import stripe
 import logging
-from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
+from .gateways import OPEN_INTENT_STATUSES, GatewayError, get_payment_gateway
 from .models import Payment
 from orders.models import Order
-
-# Configure Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+from products.inventory import StockError, commit_reservations, decrement_stock
+from products.models import StockMovement
 
 logger = logging.getLogger(__name__)
 
+
+def take_order_stock(order):
+    """
+    Take the stock held for a paid order (see products/inventory.py). Runs once per
+    order. If the hold has already expired the stock is taken directly; a paid order
+    that no longer fits in stock is logged for follow-up rather than failing the payment.
+    """
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order.pk, stock_held=True).update(stock_held=False):
+            return
+        order.stock_held = False
+        if commit_reservations(order.stock_reference):
+            return
+
+        quantities = {}
+        for product_id, quantity in order.items.values_list('product_id', 'quantity'):
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        try:
+            with transaction.atomic():
+                decrement_stock(quantities, StockMovement.ORDER, order.stock_reference)
+        except StockError as e:
+            logger.error(f"Order {order.id} was paid after its stock hold expired and is oversold: {e}")
+
+
 class StripeService:
     """
-    Service class to handle Stripe payment operations
+    Service class to handle Stripe payment operations. Calls to the payment provider
+    go through the gateway selected by settings.PAYMENTS_GATEWAY (payments/gateways.py).
     """
     
     @staticmethod
@@ -31,14 +55,14 @@ class StripeService:
             if existing_payment and existing_payment.stripe_payment_intent_id:
                 # Try to retrieve the existing payment intent from Stripe
                 try:
-                    intent = stripe.PaymentIntent.retrieve(existing_payment.stripe_payment_intent_id)
-                    if intent.status in ['requires_payment_method', 'requires_confirmation', 'requires_action']:
+                    intent = get_payment_gateway().retrieve_payment_intent(existing_payment.stripe_payment_intent_id)
+                    if intent.status in OPEN_INTENT_STATUSES:
                         logger.info(f"Returning existing payment intent for order: {order.id}")
                         return existing_payment, intent
                     else:
                         # Intent is no longer usable, delete the payment record
                         existing_payment.delete()
-                except stripe.error.StripeError:
+                except GatewayError:
                     # Intent doesn't exist in Stripe, delete the payment record
                     existing_payment.delete()
             
@@ -46,7 +70,7 @@ class StripeService:
             amount_cents = int(order.total_amount * 100)
             
             # Create payment intent
-            intent = stripe.PaymentIntent.create(
+            intent = get_payment_gateway().create_payment_intent(
                 amount=amount_cents,
                 currency='usd',
                 metadata={
@@ -70,7 +94,7 @@ class StripeService:
             
             return payment, intent
             
-        except stripe.error.StripeError as e:
+        except GatewayError as e:
             logger.error(f"Stripe error creating payment intent: {e}")
             raise Exception(f"Payment processing error: {str(e)}")
         except Exception as e:
@@ -84,7 +108,7 @@ class StripeService:
         """
         try:
             # Retrieve payment intent from Stripe
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = get_payment_gateway().retrieve_payment_intent(payment_intent_id)
             
             # Find payment record
             payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
@@ -100,15 +124,13 @@ class StripeService:
                 order.payment_date = timezone.now()
                 order.status = 'confirmed'
                 order.save()
+                take_order_stock(order)
                 
                 # Clear user's cart after successful payment
                 from cart.models import Cart
                 try:
                     user_cart = Cart.objects.get(user=payment.user)
-                    user_cart.items.all().delete()
-                    user_cart.promo_code = None
-                    user_cart.discount_amount = 0
-                    user_cart.save()
+                    user_cart.clear()
                     logger.info(f"Cart cleared for user {payment.user.id} after successful payment")
                 except Cart.DoesNotExist:
                     logger.info(f"No cart found for user {payment.user.id}")
@@ -123,7 +145,7 @@ class StripeService:
         except Payment.DoesNotExist:
             logger.error(f"Payment not found for intent: {payment_intent_id}")
             raise Exception("Payment record not found")
-        except stripe.error.StripeError as e:
+        except GatewayError as e:
             logger.error(f"Stripe error confirming payment: {e}")
             raise Exception(f"Payment confirmation error: {str(e)}")
         except Exception as e:
@@ -141,8 +163,8 @@ class StripeService:
             
             refund_amount = int((amount or payment.amount) * 100)
             
-            refund = stripe.Refund.create(
-                payment_intent=payment.stripe_payment_intent_id,
+            refund = get_payment_gateway().create_refund(
+                intent_id=payment.stripe_payment_intent_id,
                 amount=refund_amount,
                 reason=reason or 'requested_by_customer'
             )
@@ -151,14 +173,12 @@ class StripeService:
             payment.refund_reason = reason
             payment.save()
             
-            # Update order status
-            order = payment.order
-            order.status = 'cancelled'
-            order.save()
+            # Cancel the order and put its stock back (once, even if it was cancelled already)
+            payment.order.cancel(reason=StockMovement.REFUND)
             
             return refund
             
-        except stripe.error.StripeError as e:
+        except GatewayError as e:
             logger.error(f"Stripe error creating refund: {e}")
             raise Exception(f"Refund error: {str(e)}")
         except Exception as e:
@@ -195,15 +215,13 @@ class StripeService:
                             order.payment_date = timezone.now()
                             order.status = 'confirmed'
                             order.save()
+                            take_order_stock(order)
                             
                             # Clear user's cart after successful payment
                             from cart.models import Cart
                             try:
                                 user_cart = Cart.objects.get(user=payment.user)
-                                user_cart.items.all().delete()
-                                user_cart.promo_code = None
-                                user_cart.discount_amount = 0
-                                user_cart.save()
+                                user_cart.clear()
                                 logger.info(f"Cart cleared for user {payment.user.id} via webhook")
                             except Cart.DoesNotExist:
                                 logger.info(f"No cart found for user {payment.user.id}")
@@ -222,7 +240,7 @@ class StripeService:
                 try:
                     payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
                     payment.status = 'failed'
-                    payment.failure_reason = payment_intent.get('last_payment_error', {}).get('message', 'Payment failed')
+                    payment.failure_reason = (payment_intent.get('last_payment_error') or {}).get('message', 'Payment failed')
                     payment.save()
                     
                     logger.info(f"Payment {payment.payment_id} marked as failed via webhook")
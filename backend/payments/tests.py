@@ -1,3 +1,241 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import stripe
+from rest_framework.test import APIClient
+from cart.models import Cart, CartItem
+from users.models import User
+from products.models import Product, Category
+from products.inventory import reserve_stock, release_expired_reservations
+from orders.models import Order, OrderItem
+from .gateways import GatewayError, RetryBudget, StripeGateway, get_payment_gateway
+from .models import Payment, WebhookEvent
+from .services import StripeService, take_order_stock
+from .webhooks import DUPLICATE, WorkerStats, process_due_events, process_event
 
-# Create your tests here.
+
+class TakeOrderStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='pass12345')
+        category = Category.objects.create(name='Audio')
+        self.product = Product.objects.create(
+            title='Speaker', description='Loud', unit_price=50, stock=4, category=category,
+        )
+        self.order = Order.objects.create(user=self.user, total_amount=100, stock_held=True)
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=2, price=50)
+
+    def hold(self, **kwargs):
+        with transaction.atomic():
+            reserve_stock({self.product.id: 2}, self.order.stock_reference, **kwargs)
+
+    def assertLevels(self, stock, reserved):
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.reserved), (stock, reserved))
+
+    def test_paid_order_takes_its_held_stock_once(self):
+        self.hold()
+        take_order_stock(self.order)
+        take_order_stock(Order.objects.get(pk=self.order.pk))
+        self.assertLevels(2, 0)
+        self.assertFalse(Order.objects.get(pk=self.order.pk).stock_held)
+
+    def test_expired_hold_takes_the_stock_directly(self):
+        self.hold(ttl=timedelta(seconds=-1))
+        release_expired_reservations()
+        self.assertLevels(4, 0)
+        take_order_stock(self.order)
+        self.assertLevels(2, 0)
+
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def sign(payload, secret=WEBHOOK_SECRET):
+    """A Stripe-Signature header for the payload, as Stripe computes it."""
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='pass12345')
+        product = Product.objects.create(title='Speaker', description='Loud', unit_price=50, stock=4)
+        self.order = Order.objects.create(user=self.user, total_amount=50)
+        self.payment = Payment.objects.create(
+            order=self.order, user=self.user, amount=50, stripe_payment_intent_id='pi_1',
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+
+    def deliver(self, event_id='evt_1', event_type='payment_intent.succeeded', **intent):
+        payload = json.dumps({'id': event_id, 'type': event_type, 'data': {'object': {'id': 'pi_1', **intent}}})
+        return self.client.post(
+            reverse('stripe_webhook'), payload, content_type='application/json', HTTP_STRIPE_SIGNATURE=sign(payload),
+        )
+
+    def test_webhook_is_stored_and_acknowledged_without_applying_it(self):
+        self.assertEqual(self.deliver().status_code, 200)
+        # Redelivery of the same event
+        self.assertEqual(self.deliver().status_code, 200)
+        response = self.client.post(
+            reverse('stripe_webhook'), 'not json', content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=sign('not json'),
+        )
+        self.assertEqual(response.status_code, 400)
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual(
+            (event.event_id, event.event_type, event.status), ('evt_1', 'payment_intent.succeeded', 'pending'),
+        )
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'pending')
+
+    def test_forged_webhooks_are_rejected(self):
+        payload = json.dumps({'id': 'evt_1', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': 'pi_1'}}})
+        for signature in (None, sign(payload, secret='whsec_other'), sign(payload + ' ')):
+            headers = {'HTTP_STRIPE_SIGNATURE': signature} if signature else {}
+            response = self.client.post(reverse('stripe_webhook'), payload, content_type='application/json', **headers)
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_missing_secret_only_skips_verification_in_debug(self):
+        with override_settings(STRIPE_WEBHOOK_SECRET=''):
+            payload = json.dumps({'id': 'evt_1', 'type': 'payment_intent.succeeded'})
+            response = self.client.post(reverse('stripe_webhook'), payload, content_type='application/json')
+            self.assertEqual(response.status_code, 500)
+            self.assertFalse(WebhookEvent.objects.exists())
+
+            with override_settings(DEBUG=True):
+                response = self.client.post(reverse('stripe_webhook'), payload, content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(WebhookEvent.objects.filter(event_id='evt_1').exists())
+
+    def test_worker_applies_each_event_once(self):
+        self.deliver()
+        out = StringIO()
+        call_command('run_webhook_worker', '--once', '--workers', '1', stdout=out)
+        self.assertIn('1 events processed', out.getvalue())
+
+        self.payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual((self.payment.status, self.order.status, self.order.is_paid), ('succeeded', 'confirmed', True))
+        self.assertFalse(CartItem.objects.exists())
+        event = WebhookEvent.objects.get()
+        self.assertEqual(event.status, WebhookEvent.PROCESSED)
+        self.assertIsNotNone(event.processed_at)
+
+        # A worker whose claim timed out gets to the event too late
+        self.assertEqual(process_event(event), DUPLICATE)
+
+    def test_failed_event_is_rolled_back_and_retried_later(self):
+        self.deliver(event_type='payment_intent.payment_failed', last_payment_error=None)
+        stats = WorkerStats()
+        with mock.patch('payments.webhooks.StripeService.handle_webhook_event', side_effect=RuntimeError('db down')):
+            self.assertEqual(process_due_events(stats=stats), (0, 1))
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts, event.last_error), ('pending', 1, 'db down'))
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(process_due_events(stats=stats), (0, 0))
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(process_due_events(stats=stats), (1, 0))
+        self.payment.refresh_from_db()
+        self.assertEqual((self.payment.status, self.payment.failure_reason), ('failed', 'Payment failed'))
+        summary = stats.summary()
+        self.assertEqual((summary['processed'], summary['retry']), (1, 1))
+        self.assertEqual(summary['lag_ms']['count'], 1)
+
+
+@override_settings(PAYMENTS_GATEWAY='fake')
+class FakeGatewayCheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='payer', email='payer@example.com', password='pass12345')
+        product = Product.objects.create(title='Speaker', description='Loud', unit_price=50, stock=4)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self):
+        response = self.client.post(reverse('create_payment_intent'), {'order_id': 'cart-checkout'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        payment = Payment.objects.get(payment_id=response.data['payment_id'])
+        return self.client.post(reverse('confirm_payment'), {
+            'payment_id': payment.payment_id, 'payment_intent_id': payment.stripe_payment_intent_id,
+        }, format='json')
+
+    def test_cart_checkout_is_paid_and_refunded_offline(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 200)
+        payment = Payment.objects.get()
+        self.assertEqual((payment.status, payment.order.status, payment.amount), ('succeeded', 'confirmed', 100))
+        self.assertTrue(payment.stripe_payment_intent_id.startswith('pi_fake_'))
+        self.assertFalse(CartItem.objects.exists())
+
+        refund = StripeService.create_refund(payment, amount=40)
+        self.assertEqual((refund.status, refund.amount), ('succeeded', 4000))
+        # More than what is left to refund
+        with self.assertRaises(GatewayError):
+            get_payment_gateway().create_refund(payment.stripe_payment_intent_id, 6001, 'requested_by_customer')
+
+    @override_settings(PAYMENTS_FAKE_DECLINE_RATE=1)
+    def test_declined_payment_is_not_confirmed(self):
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        payment = Payment.objects.get()
+        self.assertEqual((payment.status, payment.order.status), ('failed', 'pending'))
+
+    @override_settings(PAYMENTS_FAKE_FAILURE_RATE=1)
+    def test_gateway_failure_fails_the_request(self):
+        response = self.client.post(reverse('create_payment_intent'), {'order_id': 'cart-checkout'}, format='json')
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('Injected payment gateway failure', response.data['error'])
+        self.assertFalse(Payment.objects.exists())
+
+
+class StripeGatewayTests(TestCase):
+    def setUp(self):
+        self.gateway = StripeGateway('sk_test', retry_delay=0, budget=RetryBudget(ratio=0, per_second=0, burst=2))
+
+    def test_stripe_module_settings_are_left_alone(self):
+        settings = (stripe.api_key, stripe.default_http_client, stripe.max_network_retries)
+        StripeGateway('sk_other', max_retries=5)
+        self.assertEqual((stripe.api_key, stripe.default_http_client, stripe.max_network_retries), settings)
+
+    def test_create_is_retried_with_the_same_idempotency_key(self):
+        intent = mock.Mock(id='pi_1', status='requires_payment_method', client_secret='pi_1_secret_x')
+        error = stripe.error.APIConnectionError('Connection reset')
+        with mock.patch('stripe.PaymentIntentService.create', side_effect=[error, error, intent]) as create:
+            self.assertEqual(self.gateway.create_payment_intent(1000, 'usd', {}).id, 'pi_1')
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual(len({call.kwargs['options']['idempotency_key'] for call in create.call_args_list}), 1)
+
+    def test_retries_stop_when_the_budget_is_spent(self):
+        error = stripe.error.APIConnectionError('Connection reset')
+        with mock.patch('stripe.PaymentIntentService.retrieve', side_effect=error) as retrieve:
+            with self.assertRaises(GatewayError):
+                self.gateway.retrieve_payment_intent('pi_1')
+            # The budget held two retries
+            self.assertEqual(retrieve.call_count, 3)
+            with self.assertRaises(GatewayError):
+                self.gateway.retrieve_payment_intent('pi_1')
+            self.assertEqual(retrieve.call_count, 4)
+
+    def test_invalid_requests_are_not_retried(self):
+        error = stripe.error.InvalidRequestError('No such charge', None)
+        with mock.patch('stripe.RefundService.create', side_effect=error) as create:
+            with self.assertRaises(GatewayError):
+                self.gateway.create_refund('pi_1', 1000, 'requested_by_customer')
+        self.assertEqual(create.call_count, 1)
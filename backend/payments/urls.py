@@ -7,4 +7,5 @@ urlpatterns = [
     path('payment-status/<str:payment_id>/', views.payment_status, name='payment_status'),
     path('user-payments/', views.user_payments, name='user_payments'),
     path('stripe-config/', views.stripe_config, name='stripe_config'),
+    path('stripe-webhook/', views.stripe_webhook, name='stripe_webhook'),
 ]
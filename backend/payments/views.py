@@ -17,15 +17,20 @@ from .serializers import (
     ConfirmPaymentSerializer
 )
 from .services import StripeService
+from .webhooks import store_event
 from orders.models import Order
+from orders.idempotency import idempotent
+from products.inventory import StockError, release_reservations, reserve_stock
 
 logger = logging.getLogger(__name__)
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('create-payment-intent')
 def create_payment_intent(request):
     """
-    Create a Stripe Payment Intent for an order
+    Create a Stripe Payment Intent for an order.
+    Supports the Idempotency-Key header (see orders/idempotency.py).
     """
     try:
         serializer = CreatePaymentIntentSerializer(
@@ -71,7 +76,7 @@ def create_payment_intent(request):
             # Get or create cart for user
             try:
                 cart = Cart.objects.get(user=request.user)
-                cart_items = CartItem.objects.filter(cart=cart)
+                cart_items = CartItem.objects.filter(cart=cart).select_related('product')
             except Cart.DoesNotExist:
                 return Response(
                     {'error': 'No cart found for user'},
@@ -95,7 +100,8 @@ def create_payment_intent(request):
                         user=request.user,
                         total_amount=total_amount,
                         status='pending',
-                        shipping_address=''  # Will be updated when order is confirmed
+                        shipping_address='',  # Will be updated when order is confirmed
+                        stock_held=True,
                     )
                     logger.info(f"Order created: {order.id} for user: {request.user.id}")
                     
@@ -109,7 +115,18 @@ def create_payment_intent(request):
                             price=cart_item.product.unit_price
                         )
                     logger.info(f"Created {cart_items.count()} order items for order: {order.id}")
+
+                    # Hold the stock until the payment succeeds or the hold expires
+                    quantities = {}
+                    for cart_item in cart_items:
+                        quantities[cart_item.product_id] = quantities.get(cart_item.product_id, 0) + cart_item.quantity
+                    reserve_stock(quantities, order.stock_reference)
                     
+            except StockError as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             except Exception as e:
                 logger.error(f"Error creating order and items: {e}")
                 return Response(
@@ -194,6 +211,8 @@ def confirm_payment(request):
                 
                 if other_pending_orders.exists():
                     logger.info(f"Cleaning up {other_pending_orders.count()} pending orders for user {request.user.id}")
+                    # Give back the stock their checkouts were holding
+                    release_reservations([order.stock_reference for order in other_pending_orders])
                     # Delete associated pending payments first
                     Payment.objects.filter(
                         order__in=other_pending_orders,
@@ -269,24 +288,36 @@ def user_payments(request):
 @require_http_methods(["POST"])
 def stripe_webhook(request):
     """
-    Handle Stripe webhook events
+    Receive Stripe webhook events.
+    The event is verified and stored in the webhook inbox, then acknowledged at once;
+    the webhook worker applies it (see payments/webhooks.py).
+    Without STRIPE_WEBHOOK_SECRET, events are accepted unverified only with DEBUG on.
     """
     payload = request.body
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     endpoint_secret = settings.STRIPE_WEBHOOK_SECRET
     
+    if not endpoint_secret and not settings.DEBUG:
+        # Not stored: Stripe delivers the event again once the secret is configured
+        logger.error("STRIPE_WEBHOOK_SECRET is not set; rejecting webhook")
+        return HttpResponse(status=500)
+    
     try:
         if endpoint_secret:
             # Verify webhook signature
-            event = stripe.Webhook.construct_event(
+            stripe.Webhook.construct_event(
                 payload, sig_header, endpoint_secret
             )
         else:
-            # For development - parse without verification
-            event = json.loads(payload)
+            logger.warning("STRIPE_WEBHOOK_SECRET is not set; accepting unverified webhook (DEBUG)")
+        # Store the payload itself: plain JSON, whatever the Stripe library's event class
+        event = json.loads(payload)
+        if not isinstance(event, dict):
+            raise ValueError("Webhook payload is not an object")
         
-        # Handle the event
-        StripeService.handle_webhook_event(event)
+        webhook_event, created = store_event(event, payload)
+        if not created:
+            logger.info(f"Webhook event {webhook_event.event_id} received again, already stored")
         
         return HttpResponse(status=200)
         
@@ -297,7 +328,8 @@ def stripe_webhook(request):
         logger.error("Invalid signature in webhook")
         return HttpResponse(status=400)
     except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
+        # Not stored: a non-2xx answer makes Stripe deliver the event again
+        logger.error(f"Error storing webhook: {e}")
         return HttpResponse(status=500)
 
 @api_view(['GET'])
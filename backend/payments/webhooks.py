@@ -0,0 +1,170 @@
+"""
+Webhook inbox.
+
+The webhook view (payments.views.stripe_webhook) verifies the signature, stores the
+event with store_event() and answers 200 straight away: one INSERT, so a slow order
+update can no longer make the provider time out and deliver the event again. A
+redelivered event has the same event id and is stored only once.
+
+The webhook worker (`python manage.py run_webhook_worker`) calls process_due_events()
+in a loop on each of its threads:
+- it claims a batch of due events by moving them to "processing" and pushing their
+  next_attempt_at out by PAYMENTS_WEBHOOK_CLAIM_TIMEOUT, skipping rows locked by
+  another thread or process where the database supports it (SELECT ... FOR UPDATE
+  SKIP LOCKED), so workers never wait for each other and one that dies mid-batch
+  only delays those events;
+- each event is applied (StripeService.handle_webhook_event) in one transaction with
+  the UPDATE that marks it processed. That UPDATE only matches an event not processed
+  yet, so an event whose claim timed out and was picked up again is applied once;
+- a failed event is rolled back and retried after
+  PAYMENTS_WEBHOOK_RETRY_DELAY * 2 ** (attempts - 1) seconds, and marked failed after
+  PAYMENTS_WEBHOOK_MAX_ATTEMPTS attempts.
+
+WorkerStats collects what the worker reports: events per second, outcomes, the time
+from receipt to processing and the time spent applying events.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from backend.instrumentation import Histogram
+from .models import WebhookEvent
+from .services import StripeService
+
+logger = logging.getLogger(__name__)
+
+# Outcomes of process_event()
+PROCESSED = 'processed'
+DUPLICATE = 'duplicate'
+RETRY = 'retry'
+FAILED = 'failed'
+
+
+def store_event(event, payload=b''):
+    """
+    Store a verified webhook event for the worker. Returns (WebhookEvent, created);
+    created is False for a redelivery of an event that is already stored.
+    Events without an id (hand-made test payloads) are identified by their payload.
+    """
+    event_id = event.get('id') or f"sha256:{hashlib.sha256(payload).hexdigest()}"
+    return WebhookEvent.objects.get_or_create(
+        event_id=event_id,
+        defaults={'event_type': event.get('type', ''), 'payload': event},
+    )
+
+
+def get_retry_delay(attempts):
+    base = getattr(settings, 'PAYMENTS_WEBHOOK_RETRY_DELAY', 30)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 24 * 3600))
+
+
+def claim_batch(batch_size):
+    """Move up to batch_size due events to "processing" and return them."""
+    now = timezone.now()
+    timeout = timedelta(seconds=getattr(settings, 'PAYMENTS_WEBHOOK_CLAIM_TIMEOUT', 300))
+    with transaction.atomic():
+        due = WebhookEvent.objects.filter(
+            status__in=[WebhookEvent.PENDING, WebhookEvent.PROCESSING], next_attempt_at__lte=now,
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        events = list(due[:batch_size])
+        WebhookEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            status=WebhookEvent.PROCESSING, next_attempt_at=now + timeout,
+        )
+    return events
+
+
+def record_failure(event, error):
+    event.attempts += 1
+    event.last_error = str(error)
+    max_attempts = getattr(settings, 'PAYMENTS_WEBHOOK_MAX_ATTEMPTS', 8)
+    if event.attempts >= max_attempts:
+        event.status = WebhookEvent.FAILED
+        logger.error(f"Giving up on webhook event {event.event_id} after {event.attempts} attempts: {error}")
+    else:
+        event.status = WebhookEvent.PENDING
+        event.next_attempt_at = timezone.now() + get_retry_delay(event.attempts)
+        logger.warning(
+            f"Webhook event {event.event_id} failed (attempt {event.attempts}), "
+            f"retrying at {event.next_attempt_at}: {error}"
+        )
+    # Unless another worker has processed it in the meantime
+    WebhookEvent.objects.filter(pk=event.pk).exclude(status=WebhookEvent.PROCESSED).update(
+        attempts=event.attempts, last_error=event.last_error, status=event.status,
+        next_attempt_at=event.next_attempt_at,
+    )
+    return FAILED if event.status == WebhookEvent.FAILED else RETRY
+
+
+def process_event(event, stats=None):
+    """Apply one claimed event. Returns PROCESSED, DUPLICATE, RETRY or FAILED."""
+    start = time.perf_counter()
+    try:
+        with transaction.atomic():
+            # Marks the event processed and locks it until the commit; matches nothing
+            # if another worker has processed it already
+            processed_at = timezone.now()
+            claimed = WebhookEvent.objects.filter(pk=event.pk).exclude(status=WebhookEvent.PROCESSED).update(
+                status=WebhookEvent.PROCESSED, processed_at=processed_at, last_error='',
+            )
+            if claimed:
+                StripeService.handle_webhook_event(event.payload)
+        outcome = PROCESSED if claimed else DUPLICATE
+    except Exception as e:
+        outcome = record_failure(event, e)
+    if stats is not None:
+        lag = (processed_at - event.received_at).total_seconds() if outcome == PROCESSED else None
+        stats.record(outcome, time.perf_counter() - start, lag)
+    return outcome
+
+
+def process_due_events(batch_size=None, stats=None):
+    """Claim and apply one batch of due events. Returns (processed, failed)."""
+    events = claim_batch(batch_size or getattr(settings, 'PAYMENTS_WEBHOOK_BATCH_SIZE', 50))
+    outcomes = Counter(process_event(event, stats) for event in events)
+    return outcomes[PROCESSED] + outcomes[DUPLICATE], outcomes[RETRY] + outcomes[FAILED]
+
+
+class WorkerStats:
+    """Outcome counts and timing histograms of a webhook worker, shared by its threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = self.last_report = time.perf_counter()
+        self.outcomes = Counter()
+        # Milliseconds applying each event, and from receipt to processed
+        self.handler_ms = Histogram()
+        self.lag_ms = Histogram()
+
+    def record(self, outcome, seconds, lag_seconds=None):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            self.handler_ms.add(seconds * 1000)
+            if lag_seconds is not None:
+                self.lag_ms.add(lag_seconds * 1000)
+
+    def report_due(self, every):
+        """True once every `every` seconds, for whichever thread asks first."""
+        with self.lock:
+            now = time.perf_counter()
+            if now - self.last_report < every:
+                return False
+            self.last_report = now
+            return True
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                'elapsed_s': round(elapsed, 1),
+                'events_per_s': round(self.outcomes[PROCESSED] / elapsed, 1) if elapsed else 0,
+                **{outcome: self.outcomes[outcome] for outcome in (PROCESSED, DUPLICATE, RETRY, FAILED)},
+                'handler_ms': self.handler_ms.summary(),
+                'lag_ms': self.lag_ms.summary(),
+            }
@@ -0,0 +1,140 @@
+"""
+Async versions of the public catalog views, used when the app runs under ASGI
+(settings.ASYNC_CATALOG_VIEWS, which backend/asgi.py switches on).
+
+DRF views are sync only, so under ASGI each catalog request would hold a thread
+for its whole duration. These views handle GET requests on the event loop instead:
+queries go through the async ORM (aget, acount, aaggregate, async iteration) and
+the querysets join everything the serializers read, so building serializer.data
+issues no queries and is safe to run on the event loop. The JSON is rendered with
+DRF's JSONRenderer, so the bytes are the same as the sync views'.
+
+Writes (POST/PUT/PATCH/DELETE) and HEAD/OPTIONS go to the DRF views of
+products/api/views.py through sync_to_async, so validation, permissions and
+authentication stay in one place. The GET endpoints are public (AllowAny), so the
+async path does not authenticate the request.
+
+Status codes, error payloads, pagination and the catalog cache (same keys, so
+ASGI and WSGI workers share entries) match the sync views.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.db.models import Max, Min
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from backend.pagination import KeysetPagination
+from ..cache import get_cached_response, store_cached_response
+from ..models import Category, Product, Review
+from ..search import get_search_backend
+from . import views
+from .serializers import CategorySerializer, ProductSerializer, ReviewSerializer
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """An HttpResponse with the data rendered like a DRF Response; keeps .data for the cache."""
+    response = HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+    response.data = data
+    return response
+
+
+def catalog_view(sync_view, cached=False):
+    """
+    Turn an async GET handler into a view for the URL of `sync_view`: GETs run the
+    handler with a DRF request (query_params, absolute URIs), other methods run
+    the sync DRF view in a thread. With cached=True, GETs go through the catalog
+    cache like @cache_catalog_response; the handler is named like the sync view,
+    so both use the same cache keys.
+    """
+    delegate = sync_to_async(sync_view)
+    lookup = sync_to_async(get_cached_response)
+    store = sync_to_async(store_cached_response)
+
+    def decorator(handler):
+        @csrf_exempt
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await delegate(request, *args, **kwargs)
+
+            request = Request(request)
+            if cached:
+                key, data = await lookup(request, handler.__name__)
+                if data is not None:
+                    response = json_response(data)
+                    response['X-Cache'] = 'HIT'
+                    return response
+
+            try:
+                response = await handler(request, *args, **kwargs)
+            except APIException as exc:
+                # What DRF's exception handler returns, e.g. for an invalid page or cursor
+                detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                response = json_response(detail, status=exc.status_code)
+
+            if cached:
+                if response.status_code == status.HTTP_200_OK:
+                    await store(key, response.data)
+                response['X-Cache'] = 'MISS'
+            return response
+        return view
+    return decorator
+
+
+@catalog_view(views.view_add_product, cached=True)
+async def view_add_product(request):
+    search_backend = None
+    if request.query_params.get('q'):
+        # Picking the backend may query the database (once per process)
+        search_backend = await sync_to_async(get_search_backend)()
+    products, error = views.build_product_listing(request.query_params, search_backend)
+    if error:
+        return json_response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+    paginator = KeysetPagination()
+    paginated_products = await paginator.apaginate_queryset(products, request)
+    serialized_products = ProductSerializer(instance=paginated_products, many=True, context={'request': request})
+    return json_response(paginator.get_paginated_response(serialized_products.data).data)
+
+
+@catalog_view(views.product_by_id, cached=True)
+async def product_by_id(request, id):
+    try:
+        product = await Product.objects.for_listing().aget(pk=id)
+    except Product.DoesNotExist as e:
+        return json_response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+    return json_response(ProductSerializer(instance=product, context={'request': request}).data)
+
+
+@catalog_view(views.category_list, cached=True)
+async def category_list(request):
+    categories = [category async for category in Category.objects.all().aiterator()]
+    return json_response(CategorySerializer(categories, many=True).data)
+
+
+@catalog_view(views.price_range, cached=True)
+async def price_range(request):
+    price_stats = await Product.objects.aaggregate(
+        min_price=Min('unit_price'),
+        max_price=Max('unit_price'),
+    )
+    # Handle case where there are no products
+    if price_stats['min_price'] is None:
+        price_stats['min_price'] = 0
+    if price_stats['max_price'] is None:
+        price_stats['max_price'] = 0
+    return json_response(price_stats)
+
+
+@catalog_view(views.product_reviews_list)
+async def product_reviews_list(request, product_id):
+    if not await Product.objects.filter(pk=product_id).aexists():
+        return json_response({"error": "Product not found."}, status=status.HTTP_404_NOT_FOUND)
+    reviews = [
+        review async for review in
+        Review.objects.filter(product_id=product_id).select_related('user').aiterator()
+    ]
+    return json_response(ReviewSerializer(reviews, many=True).data)
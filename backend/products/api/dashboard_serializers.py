@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from ..models import Product, Category, Review
+from .serializers import ImageURLMixin
 from users.models import User
 
 
@@ -14,28 +15,26 @@ class DashboardCategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'description', 'product_count']
 
 
-class DashboardProductSerializer(serializers.ModelSerializer):
+class DashboardProductSerializer(ImageURLMixin, serializers.ModelSerializer):
     """
     Enhanced product serializer for dashboard with additional fields
     """
     category_name = serializers.CharField(source='category.name', read_only=True)
     average_rating = serializers.FloatField(read_only=True)
-    review_count = serializers.SerializerMethodField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
     is_low_stock = serializers.SerializerMethodField()
     is_out_of_stock = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Product
         fields = [
-            'id', 'title', 'description', 'unit_price', 'image', 'stock',
-            'date_added', 'category', 'category_name', 'average_rating',
+            'id', 'title', 'description', 'unit_price', 'image', 'image_srcset', 'stock',
+            'reserved', 'date_added', 'category', 'category_name', 'average_rating',
             'review_count', 'is_low_stock', 'is_out_of_stock'
         ]
-        read_only_fields = ['date_added', 'category_name', 'average_rating', 
-                           'review_count', 'is_low_stock', 'is_out_of_stock']
-    
-    def get_review_count(self, obj):
-        return obj.reviews.count()
+        read_only_fields = ['date_added', 'reserved', 'category_name', 'average_rating', 
+                           'review_count', 'is_low_stock', 'is_out_of_stock', 'image_srcset']
     
     def get_is_low_stock(self, obj):
         return obj.stock > 0 and obj.stock <= 10
@@ -50,10 +49,8 @@ class DashboardProductSerializer(serializers.ModelSerializer):
         representation = super().to_representation(instance)
         
         # Handle image URL - return full URL if image exists
-        if instance.image:
-            request = self.context.get('request')
-            if request:
-                representation['image'] = request.build_absolute_uri(instance.image.url)
+        if instance.image and self.context.get('request'):
+            representation['image'] = self.get_image_url(instance.image)
         
         return representation
 
@@ -4,12 +4,14 @@ from . import dashboard_views
 urlpatterns = [
     # Dashboard statistics
     path('stats/', dashboard_views.dashboard_stats, name='dashboard-stats'),
+    path('cache-stats/', dashboard_views.catalog_cache_stats, name='catalog-cache-stats'),
     
     # Product management
     path('products/', dashboard_views.dashboard_products, name='dashboard-products'),
     path('products/create/', dashboard_views.create_product, name='create-product'),
     path('products/<int:product_id>/', dashboard_views.manage_product, name='manage-product'),
     path('products/bulk-update/', dashboard_views.bulk_update_products, name='bulk-update-products'),
+    path('products/<int:product_id>/stock/', dashboard_views.product_stock_at, name='product-stock-at'),
     
     # Category management
     path('categories/', dashboard_views.manage_categories, name='manage-categories'),
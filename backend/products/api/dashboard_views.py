@@ -2,20 +2,27 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from backend.pagination import KeysetPagination
 from django.db.models import Q, Count, Avg
-from django.db import models
-from ..models import Product, Category, Review
+from django.db import models, transaction
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from ..models import Product, Category, Review, StockMovement
+from ..inventory import record_movements
+from ..stock_history import stock_at
 from .serializers import ProductSerializer, CategorySerializer, ReviewSerializer
 from .dashboard_serializers import (
     DashboardProductSerializer, DashboardCategorySerializer, 
     DashboardReviewSerializer, ProductCreateUpdateSerializer,
     BulkUpdateSerializer
 )
+from ..search import get_search_backend
+from ..cache import bump_catalog_version_on_commit, get_cache_stats
 from users.models import User
+from backend.stats import StatsEngine, count_where
 
 
-class DashboardPagination(PageNumberPagination):
+class DashboardPagination(KeysetPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -25,7 +32,8 @@ class DashboardPagination(PageNumberPagination):
 @permission_classes([IsAuthenticated])
 def dashboard_stats(request):
     """
-    Get dashboard statistics for admin users
+    Get dashboard statistics for admin users.
+    Counters take one aggregate query per table; "meta" reports the query count and timing.
     """
     # Check if user is admin (you can customize this logic)
     if not request.user.is_staff:
@@ -34,17 +42,33 @@ def dashboard_stats(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    stats = {
-        'total_products': Product.objects.count(),
-        'total_categories': Category.objects.count(),
-        'total_reviews': Review.objects.count(),
-        'products_with_stock': Product.objects.filter(stock__gt=0).count(),
-        'products_out_of_stock': Product.objects.filter(stock=0).count(),
-        'average_rating': Review.objects.aggregate(avg_rating=Avg('rating'))['avg_rating'] or 0,
-        'recent_products': Product.objects.filter(
-            date_added__gte=models.DateTimeField().now().replace(day=1)
-        ).count()
-    }
+    month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    # One aggregate query per table (see backend/stats.py)
+    with StatsEngine() as engine:
+        product_stats = engine.aggregate(
+            Product.objects.all(),
+            total_products=Count('pk'),
+            products_with_stock=count_where(stock__gt=0),
+            products_out_of_stock=count_where(stock=0),
+            recent_products=count_where(date_added__gte=month_start),
+        )
+        category_stats = engine.aggregate(Category.objects.all(), total_categories=Count('pk'))
+        review_stats = engine.aggregate(
+            Review.objects.all(),
+            total_reviews=Count('pk'),
+            average_rating=Avg('rating'),
+        )
+        stats = {
+            'total_products': product_stats['total_products'],
+            'total_categories': category_stats['total_categories'],
+            'total_reviews': review_stats['total_reviews'],
+            'products_with_stock': product_stats['products_with_stock'],
+            'products_out_of_stock': product_stats['products_out_of_stock'],
+            'average_rating': review_stats['average_rating'],
+            'recent_products': product_stats['recent_products'],
+        }
+        stats['meta'] = engine.report()
     
     return Response(stats, status=status.HTTP_200_OK)
 
@@ -61,16 +85,12 @@ def dashboard_products(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    products = Product.objects.select_related('category').prefetch_related('reviews')
+    products = Product.objects.select_related('category')
     
     # Search functionality
     search_query = request.query_params.get('search')
     if search_query:
-        products = products.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query) |
-            Q(category__name__icontains=search_query)
-        )
+        products = get_search_backend().search(products, search_query)
     
     # Filter by category
     category_id = request.query_params.get('category')
@@ -115,7 +135,9 @@ def dashboard_products(request):
     # Sorting
     sort_by = request.query_params.get('sort', '-date_added')
     valid_sorts = ['title', '-title', 'unit_price', '-unit_price', 'stock', '-stock', 'date_added', '-date_added']
-    if sort_by in valid_sorts:
+    if sort_by == 'relevance' and search_query:
+        products = products.order_by('-search_rank', '-date_added')
+    elif sort_by in valid_sorts:
         products = products.order_by(sort_by)
     else:
         products = products.order_by('-date_added')
@@ -357,8 +379,28 @@ def bulk_update_products(request):
         product_ids = serializer.validated_data['product_ids']
         updates = serializer.validated_data['updates']
         
-        # Update products
-        updated_count = Product.objects.filter(id__in=product_ids).update(**updates)
+        with transaction.atomic():
+            if 'stock' in updates:
+                # Lock and read the old levels so the change can be journaled per product
+                previous = dict(
+                    Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')
+                    .values_list('id', 'stock')
+                )
+            updated_count = Product.objects.filter(id__in=product_ids).update(**updates)
+            if 'stock' in updates:
+                record_movements(
+                    {product_id: updates['stock'] - stock for product_id, stock in previous.items()},
+                    StockMovement.ADJUSTMENT, f"user:{request.user.pk}",
+                )
+        
+        # update() bypasses the post_save signal, so reindex moved products explicitly
+        if 'category' in updates:
+            get_search_backend().index_products(product_ids)
+        # ...and re-price the denormalized subtotal of carts holding them
+        if 'unit_price' in updates:
+            from cart.models import Cart
+            Cart.objects.with_products(product_ids).refresh_totals()
+        bump_catalog_version_on_commit()
         
         return Response({
             "message": f"Successfully updated {updated_count} products",
@@ -366,3 +408,63 @@ def bulk_update_products(request):
         }, status=status.HTTP_200_OK)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def catalog_cache_stats(request):
+    """
+    Hit/miss counters and current version of the public catalog response cache (admin only)
+    """
+    if not request.user.is_staff:
+        return Response(
+            {"error": "Admin access required"}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    return Response(get_cache_stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def product_stock_at(request, product_id):
+    """
+    Stock of a product at a point in time, ?at=<ISO 8601 datetime> (default: now), computed
+    from the nearest stock snapshot and the movements since (admin only)
+    """
+    if not request.user.is_staff:
+        return Response(
+            {"error": "Admin access required"}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    try:
+        product = Product.objects.get(pk=product_id)
+    except Product.DoesNotExist:
+        return Response(
+            {"error": "Product not found"}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    at = timezone.now()
+    if request.query_params.get('at'):
+        try:
+            at = parse_datetime(request.query_params['at'])
+        except ValueError:
+            at = None
+        if at is None:
+            return Response(
+                {"error": "'at' must be an ISO 8601 datetime"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(at):
+            at = timezone.make_aware(at)
+
+    level = stock_at(product, at)
+    return Response({
+        "product_id": product.id,
+        "at": at,
+        "stock": level.stock,
+        "snapshot_taken_at": level.snapshot.taken_at if level.snapshot else None,
+        "movements_replayed": level.movements_replayed,
+    }, status=status.HTTP_200_OK)
@@ -1,6 +1,48 @@
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from ..models import Product,Category,Review
 
+class ImageURLMixin:
+    """
+    Builds image URLs from MEDIA_URL without a storage call per row.
+    The (absolute) media prefix is computed once per serializer, and a ListSerializer
+    reuses the same child serializer for every row, so a page of products costs
+    one build_absolute_uri() call instead of one per product.
+    """
+    def get_image_url(self, image):
+        if not image:
+            return None
+        return self.get_media_url(image.name)
+
+    def get_media_url(self, name):
+        prefix = getattr(self, '_media_url_prefix', None)
+        if prefix is None:
+            request = self.context.get('request')
+            if request:
+                # Use the request's host to build the absolute URI
+                # This ensures the URL works with ngrok and other tunnel services
+                prefix = request.build_absolute_uri(settings.MEDIA_URL)
+            else:
+                # Fallback to relative URL if no request context
+                prefix = settings.MEDIA_URL
+            self._media_url_prefix = prefix
+        return prefix + filepath_to_uri(name)
+
+    def get_image_srcset(self, obj):
+        """
+        srcset strings for the generated image variants, per format:
+        {"webp": "<url> 320w, <url> 640w", "jpeg": "..."}, or None until they are generated.
+        """
+        variants = obj.image_variants or {}
+        srcset = {
+            key: ', '.join(f"{self.get_media_url(entry['name'])} {entry['width']}w" for entry in entries)
+            for key, entries in variants.items()
+            # Skips "source" and the "missing"/"invalid" flags (products/images.py)
+            if isinstance(entries, list) and entries
+        }
+        return srcset or None
+
 class CategorySerializer(serializers.ModelSerializer):
     """
     Simple Category serializer that returns only id and name.
@@ -10,13 +52,18 @@ class CategorySerializer(serializers.ModelSerializer):
         model = Category
         fields = ['id', 'name']
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(ImageURLMixin, serializers.ModelSerializer):
     """
     Product serializer with smart category handling:
     - On GET requests: Returns category name (user-friendly)
     - On POST/PUT/PATCH requests: Accepts category ID (DRF handles this automatically)
+
+    For lists, pass a queryset with select_related('category') so the query count stays
+    fixed regardless of page size (see Product.objects.for_listing()).
     """
     average_rating = serializers.FloatField(read_only=True)
+    available_stock = serializers.IntegerField(read_only=True)
+    image_srcset = serializers.SerializerMethodField()
     class Meta:
         model = Product
         fields = [
@@ -25,7 +72,9 @@ class ProductSerializer(serializers.ModelSerializer):
             'description',
             'unit_price',
             'image',
+            'image_srcset',
             'stock',
+            'available_stock',
             'date_added',
             'category',
             'average_rating'
@@ -45,14 +94,7 @@ class ProductSerializer(serializers.ModelSerializer):
         
         # Handle image URL - return full URL if image exists
         if instance.image:
-            request = self.context.get('request')
-            if request:
-                # Use the request's host to build the absolute URI
-                # This ensures the URL works with ngrok and other tunnel services
-                representation['image'] = request.build_absolute_uri(instance.image.url)
-            else:
-                # Fallback to relative URL if no request context
-                representation['image'] = instance.image.url
+            representation['image'] = self.get_image_url(instance.image)
         
         return representation
 
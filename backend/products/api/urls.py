@@ -1,13 +1,21 @@
+from django.conf import settings
 from django.urls import path, include
-from .views import view_add_product,product_by_id,category_list,product_reviews_list,price_range
-
-urlpatterns = [
-    path('', view_add_product,name='product-list-create'),
-    path('<int:id>/',product_by_id,name='product-detail'),
-    path('categories/',category_list,name='category-list'),
-    path('price-range/',price_range,name='price-range'),
-    path('<int:product_id>/reviews/',product_reviews_list,name='product-reviews-list'),
-    
+from . import async_views, views
+
+
+def catalog_patterns(catalog):
+    """The catalog URLs, served by the views of the given module (views or async_views)."""
+    return [
+        path('', catalog.view_add_product,name='product-list-create'),
+        path('<int:id>/',catalog.product_by_id,name='product-detail'),
+        path('categories/',catalog.category_list,name='category-list'),
+        path('price-range/',catalog.price_range,name='price-range'),
+        path('<int:product_id>/reviews/',catalog.product_reviews_list,name='product-reviews-list'),
+    ]
+
+
+# Under ASGI (backend/asgi.py) the catalog is served by async views
+urlpatterns = catalog_patterns(async_views if settings.ASYNC_CATALOG_VIEWS else views) + [
     # Dashboard API endpoints
     path('dashboard/', include('products.api.dashboard_urls')),
-]
\ No newline at end of file
+]
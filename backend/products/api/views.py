@@ -1,110 +1,105 @@
 from rest_framework.response import Response
 from rest_framework.decorators import api_view,permission_classes
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
+from backend.pagination import KeysetPagination
 from ..models import Product,Category,Review
 from .serializers import ProductSerializer,CategorySerializer,ReviewSerializer
+from ..search import get_search_backend
+from ..cache import cache_catalog_response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db import models
 from django.db.models import Min, Max
 
+
+def build_product_listing(query_params, search_backend=None):
+    """
+    The filtered and sorted product listing for the given query params.
+    Returns (queryset, None), or (None, error message) for an invalid param.
+    Builds the queryset without running it, so the async views share it too;
+    they pass the search backend in, as picking it may query the database.
+    """
+    products = Product.objects.for_listing()
+    #Search Query:
+    search_query = query_params.get('q')
+    #Filter by search query (full-text index, annotates search_rank):
+    if search_query:
+        products = (search_backend or get_search_backend()).search(products, search_query)
+    #Filter by category, from queryparam:
+    category_id = query_params.get('category')
+    if category_id is not None:
+        try:
+            # Convert the string parameter to an integer
+            category_id_int = int(category_id)
+            # Filter using the category foreign key
+            products = products.filter(category=category_id_int)
+        except ValueError:
+            return None, "Invalid category ID. Must be an integer."
+
+    # Filter by price range
+    min_price = query_params.get('min_price')
+    max_price = query_params.get('max_price')
+
+    if min_price is not None:
+        try:
+            min_price_decimal = float(min_price)
+            products = products.filter(unit_price__gte=min_price_decimal)
+        except (ValueError, TypeError):
+            return None, "Invalid min_price. Must be a number."
+
+    if max_price is not None:
+        try:
+            max_price_decimal = float(max_price)
+            products = products.filter(unit_price__lte=max_price_decimal)
+        except (ValueError, TypeError):
+            return None, "Invalid max_price. Must be a number."
+
+    # Filter by minimum rating
+    min_rating = query_params.get('min_rating')
+    if min_rating is not None:
+        try:
+            min_rating_int = int(min_rating)
+            if min_rating_int < 1 or min_rating_int > 5:
+                return None, "Invalid min_rating. Must be between 1 and 5."
+
+            # Filter on the denormalized average_rating column; unrated products are kept
+            products = products.filter(
+                models.Q(average_rating__gte=min_rating_int) | models.Q(rating_count=0)
+            )
+        except (ValueError, TypeError):
+            return None, "Invalid min_rating. Must be an integer between 1 and 5."
+
+    # Add sorting functionality
+    sort_by = query_params.get('sort_by', 'relevance')
+
+    # Apply sorting
+    if sort_by == 'price_asc':
+        products = products.order_by('unit_price')
+    elif sort_by == 'price_desc':
+        products = products.order_by('-unit_price')
+    elif sort_by == 'rating':
+        # Sort by rating (highest first); unrated products have average_rating = 0
+        products = products.order_by('-average_rating', '-date_added')
+    elif sort_by == 'newest':
+        products = products.order_by('-date_added')
+    else:  # relevance or default
+        # For search queries, order by relevance. For category browsing, show newest first
+        if search_query:
+            products = products.order_by('-search_rank', '-date_added')
+        else:
+            products = products.order_by('-date_added')
+    return products, None
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([AllowAny])
+@cache_catalog_response
 def view_add_product(request):
     if request.method == 'GET':
-        products = Product.objects.all()
-        #Search Query:
-        search_query = request.query_params.get('q')
-        #Filter by search query:
-        if search_query:
-            products = products.filter(models.Q(title__icontains=search_query) | 
-                                       models.Q(description__icontains=search_query))
-        #Filter by category, from queryparam:
-        category_id = request.query_params.get('category')
-        if category_id is not None:
-            try:
-                # Convert the string parameter to an integer
-                category_id_int = int(category_id)
-                # Filter using the category foreign key
-                products = products.filter(category=category_id_int)
-            except ValueError:
-                return Response({"error": "Invalid category ID. Must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Filter by price range
-        min_price = request.query_params.get('min_price')
-        max_price = request.query_params.get('max_price')
-        
-        if min_price is not None:
-            try:
-                min_price_decimal = float(min_price)
-                products = products.filter(unit_price__gte=min_price_decimal)
-            except (ValueError, TypeError):
-                return Response({"error": "Invalid min_price. Must be a number."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if max_price is not None:
-            try:
-                max_price_decimal = float(max_price)
-                products = products.filter(unit_price__lte=max_price_decimal)
-            except (ValueError, TypeError):
-                return Response({"error": "Invalid max_price. Must be a number."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Filter by minimum rating
-        min_rating = request.query_params.get('min_rating')
-        if min_rating is not None:
-            try:
-                min_rating_int = int(min_rating)
-                if min_rating_int < 1 or min_rating_int > 5:
-                    return Response({"error": "Invalid min_rating. Must be between 1 and 5."}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Filter products that have an average rating >= min_rating
-                # Use distinct() to avoid duplicates from joins
-                from django.db.models import Avg, Q
-                products = products.annotate(
-                    avg_rating=Avg('reviews__rating')
-                ).filter(
-                    Q(avg_rating__gte=min_rating_int) | Q(avg_rating__isnull=True, reviews__isnull=True)
-                ).distinct()
-            except (ValueError, TypeError):
-                return Response({"error": "Invalid min_rating. Must be an integer between 1 and 5."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Add sorting functionality
-        sort_by = request.query_params.get('sort_by', 'relevance')
-        
-        # If min_rating filter is applied, we already have avg_rating annotation
-        # Otherwise, add it for rating-based sorting
-        if min_rating is None and sort_by == 'rating':
-            from django.db.models import Avg
-            products = products.annotate(avg_rating=Avg('reviews__rating'))
-        
-        # Apply sorting
-        if sort_by == 'price_asc':
-            products = products.order_by('unit_price')
-        elif sort_by == 'price_desc':
-            products = products.order_by('-unit_price')
-        elif sort_by == 'rating':
-            # Sort by rating (highest first), handle null ratings
-            from django.db.models import Case, When, Value, IntegerField
-            products = products.annotate(
-                rating_for_sort=Case(
-                    When(avg_rating__isnull=True, then=Value(0)),
-                    default='avg_rating',
-                    output_field=IntegerField()
-                )
-            ).order_by('-rating_for_sort', '-date_added')
-        elif sort_by == 'newest':
-            products = products.order_by('-date_added')
-        else:  # relevance or default
-            # For search queries, maintain relevance. For category browsing, show newest first
-            if search_query:
-                # Keep default relevance ordering for search
-                pass
-            else:
-                products = products.order_by('-date_added')
-        
-        # Ensure no duplicates in the final queryset
-        products = products.distinct()
-            
-        paginator = PageNumberPagination()
+        products, error = build_product_listing(request.query_params)
+        if error:
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = KeysetPagination()
         paginated_products = paginator.paginate_queryset(products, request)
         serialized_products = ProductSerializer(instance=paginated_products, many=True, context={'request': request})
         return paginator.get_paginated_response(serialized_products.data)
@@ -118,9 +113,10 @@ def view_add_product(request):
 
 @api_view(['GET', 'PUT', 'PATCH', 'DELETE'])
 @permission_classes([AllowAny])
+@cache_catalog_response
 def product_by_id(request, id):
     try:
-        product = Product.objects.get(pk=id)
+        product = Product.objects.for_listing().get(pk=id)
     except Product.DoesNotExist as e:
         return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
     
@@ -142,6 +138,7 @@ def product_by_id(request, id):
     
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_catalog_response
 def category_list(request):
     """
     Simple endpoint to retrieve all categories.
@@ -152,6 +149,7 @@ def category_list(request):
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@cache_catalog_response
 def price_range(request):
     """
     Endpoint to get the minimum and maximum prices of all products.
@@ -186,7 +184,8 @@ def product_reviews_list(request, product_id):
 
     if request.method == 'GET':
         # Get all reviews for this product, ordered by newest first
-        reviews = product.reviews.all() # Uses the related_name='reviews'
+        # (the user is joined: ReviewSerializer shows the reviewer's name)
+        reviews = product.reviews.select_related('user') # Uses the related_name='reviews'
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
 
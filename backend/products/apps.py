@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Register signal handlers that keep denormalized product data in sync
+        from django.db.models.signals import post_migrate
+        from . import signals
+        post_migrate.connect(signals.install_search_index, sender=self)
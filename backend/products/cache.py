@@ -0,0 +1,131 @@
+"""
+Response cache for the public catalog endpoints.
+
+Cached responses are keyed by the view, the request host, the path and the
+normalized (sorted) query params, plus a catalog version counter. Any write to
+products, categories or reviews bumps the counter (see products/signals.py and
+bulk_update_products), so stale entries are never read again and simply expire.
+
+The cache alias is settings.CATALOG_CACHE_ALIAS. Both the local-memory and the
+file-based Django backends work; note that local-memory caches (and therefore
+the version counter) are per process, so multi-worker deployments should use
+a shared backend such as the file-based one.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog:version'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _incr(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key missing or evicted: start counting again
+        cache.set(key, 1, None)
+        return 1
+
+
+def get_catalog_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response."""
+    return _incr(get_cache(), VERSION_KEY)
+
+
+def bump_catalog_version_on_commit():
+    """
+    Bump the version once the current transaction commits, so a concurrent
+    reader cannot cache pre-commit data under the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def get_cache_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / lookups, 4) if lookups else 0,
+    }
+
+
+def reset_cache_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def build_cache_key(request, view_name):
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    # The host is part of the key because serializers build absolute image URLs from it
+    raw = f"{request.scheme}://{request.get_host()}{request.path}?{urlencode(params)}"
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f"catalog:v{get_catalog_version()}:{view_name}:{digest}"
+
+
+def get_cached_response(request, view_name):
+    """
+    Look the GET request up in the catalog cache and count the hit or miss.
+    Returns (key, cached response data or None).
+    """
+    cache = get_cache()
+    key = build_cache_key(request, view_name)
+    cached = cache.get(key)
+    _incr(cache, HITS_KEY if cached is not None else MISSES_KEY)
+    return key, cached
+
+
+def store_cached_response(key, data):
+    get_cache().set(key, data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+
+
+def cache_catalog_response(view_func):
+    """
+    Cache successful GET responses of a DRF function view.
+    Apply it below @api_view/@permission_classes so it receives the DRF request.
+    Other methods pass straight through.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_func(request, *args, **kwargs)
+
+        key, cached = get_cached_response(request, view_func.__name__)
+        if cached is not None:
+            response = Response(cached, status=status.HTTP_200_OK)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            store_cached_response(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
@@ -0,0 +1,168 @@
+"""
+Responsive image variants for product images.
+
+When a product's image changes, resized copies are generated at each width in
+settings.PRODUCT_IMAGE_WIDTHS, in WebP and JPEG, with EXIF metadata stripped and
+content-hashed file names (so they can be cached forever). The work runs on a
+small background thread pool after the transaction commits; the results are
+stored in Product.image_variants and exposed by the product serializers as
+`image_srcset`. An image that is missing from storage or is not an image is
+recorded as such, so it is not retried on every save (only when it is replaced,
+or with --force). Existing images are converted with
+`python manage.py generate_image_variants`.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+from .models import Product
+from .cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'products/variants'
+
+# (key used in image_variants / srcset, Pillow format, file extension, save options)
+VARIANT_FORMATS = [
+    ('webp', 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+]
+
+_executor = None
+
+
+def get_variant_widths():
+    return sorted(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (320, 640, 1024)))
+
+
+def needs_variants(product):
+    """True when the stored variants were not generated from the current image."""
+    source = (product.image_variants or {}).get('source')
+    return (product.image.name or None) != source
+
+
+def build_variants(image_bytes):
+    """
+    Resize image_bytes to every configured width that does not upscale it
+    (or to its own width if it is smaller than all of them).
+    Returns {format_key: [(width, file_name, bytes), ...]}.
+    """
+    digest = hashlib.sha256(image_bytes).hexdigest()[:16]
+    with Image.open(BytesIO(image_bytes)) as original:
+        # Apply the EXIF orientation before the metadata is dropped
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        widths = [width for width in get_variant_widths() if width < image.width] or [image.width]
+        variants = {key: [] for key, _, _, _ in VARIANT_FORMATS}
+        for width in widths:
+            resized = image
+            if width < image.width:
+                height = max(1, round(image.height * width / image.width))
+                resized = image.resize((width, height), Image.LANCZOS)
+            for key, pil_format, extension, options in VARIANT_FORMATS:
+                buffer = BytesIO()
+                # No exif=/icc_profile= arguments, so metadata is not written
+                resized.save(buffer, pil_format, **options)
+                variants[key].append((width, f'{VARIANT_DIR}/{digest}-{width}.{extension}', buffer.getvalue()))
+    return variants
+
+
+def record_unusable_image(product_id, name, reason):
+    """
+    Mark the image as done without variants (reason: "missing" or "invalid"), so
+    needs_variants() is false until the image is replaced.
+    """
+    Product.objects.filter(pk=product_id, image=name).update(image_variants={'source': name, reason: True})
+
+
+def generate_image_variants(product_id, force=False):
+    """
+    Generate and store the variants for one product. Returns True if variants were written.
+    """
+    try:
+        product = Product.objects.get(pk=product_id)
+    except Product.DoesNotExist:
+        return False
+    if not force and not needs_variants(product):
+        return False
+
+    if not product.image:
+        Product.objects.filter(pk=product_id).update(image_variants={})
+        return True
+
+    try:
+        with product.image.open('rb') as f:
+            image_bytes = f.read()
+    except FileNotFoundError:
+        logger.warning(f"Image {product.image.name} for product {product_id} is missing from storage")
+        record_unusable_image(product_id, product.image.name, 'missing')
+        return False
+
+    try:
+        variants = build_variants(image_bytes)
+    except UnidentifiedImageError:
+        logger.warning(f"Image {product.image.name} for product {product_id} is not a readable image")
+        record_unusable_image(product_id, product.image.name, 'invalid')
+        return False
+
+    stored = {}
+    for key, entries in variants.items():
+        stored[key] = []
+        for width, name, data in entries:
+            # Names are content hashed, so an existing file already has the right bytes
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            stored[key].append({'width': width, 'name': name})
+
+    # Only record the variants if the image was not replaced while we were working
+    updated = Product.objects.filter(pk=product_id, image=product.image.name).update(
+        image_variants={'source': product.image.name, **stored}
+    )
+    if updated:
+        # update() bypasses the catalog signals, so invalidate cached responses here
+        bump_catalog_version()
+    return bool(updated)
+
+
+def _generate_logged(product_id):
+    # Variant generation must never fail the request that saved the product
+    try:
+        generate_image_variants(product_id)
+    except Exception:
+        logger.exception(f"Failed to generate image variants for product {product_id}")
+
+
+def _run_in_background(product_id):
+    close_old_connections()
+    try:
+        _generate_logged(product_id)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+            thread_name_prefix='image-variants',
+        )
+    return _executor
+
+
+def schedule_image_variants(product_id):
+    """
+    Queue variant generation for after the current transaction commits.
+    Runs inline instead when settings.PRODUCT_IMAGE_VARIANTS_ASYNC is False.
+    """
+    if getattr(settings, 'PRODUCT_IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: get_executor().submit(_run_in_background, product_id))
+    else:
+        transaction.on_commit(lambda: _generate_logged(product_id))
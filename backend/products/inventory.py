@@ -0,0 +1,215 @@
+"""
+Set-based stock changes for the catalog.
+
+Checkout locks every product in a cart with one SELECT ... FOR UPDATE (in id order,
+so two checkouts touching the same products always lock them in the same order and
+cannot deadlock) and then decrements all of them with a single CASE UPDATE. Every
+stock change is journaled as StockMovement rows written with one bulk INSERT. These
+helpers must be called inside transaction.atomic() (release_expired_reservations()
+runs its own transactions).
+
+Checkouts that are paid later (Stripe) hold their stock with StockReservation rows
+instead: reserve_stock() adds the quantities to Product.reserved, and the hold is
+either committed (taken from stock) when the payment succeeds or released, by the
+owner or once it expires. Every check here is against stock - reserved, so held units
+cannot be sold twice.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Product, StockMovement, StockReservation
+from .cache import bump_catalog_version_on_commit
+
+
+class StockError(ValueError):
+    """A requested stock change cannot be applied."""
+
+
+class InsufficientStockError(StockError):
+    def __init__(self, product, requested):
+        self.product = product
+        self.requested = requested
+        super().__init__(
+            f'Insufficient stock for {product.title}. Available: {product.available_stock}, requested: {requested}'
+        )
+
+
+def get_reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_RESERVATION_TTL', 900))
+
+
+def lock_products(product_ids):
+    """
+    Lock the given products FOR UPDATE in id order and return them as {id: product}.
+    Raises StockError if any of them does not exist.
+    """
+    product_ids = sorted(set(product_ids))
+    products = {
+        product.id: product
+        for product in Product.objects.select_for_update().filter(id__in=product_ids).order_by('id')
+    }
+    for product_id in product_ids:
+        if product_id not in products:
+            raise StockError(f'Product with ID {product_id} not found')
+    return products
+
+
+def check_available(products, quantities):
+    for product_id, quantity in quantities.items():
+        if products[product_id].available_stock < quantity:
+            raise InsufficientStockError(products[product_id], quantity)
+
+
+def adjust_products(deltas):
+    """
+    Add {field: {product_id: amount}} to the products in one CASE UPDATE. Results are
+    clamped at 0, since an admin may have lowered the stock below what is held.
+    """
+    product_ids = {product_id for amounts in deltas.values() for product_id in amounts}
+    if not product_ids:
+        return
+    Product.objects.filter(id__in=product_ids).update(**{
+        field: Case(
+            *[
+                When(id=product_id, then=Greatest(F(field) + amount, Value(0)))
+                for product_id, amount in amounts.items()
+            ],
+            default=F(field),
+            output_field=Product._meta.get_field(field),
+        )
+        for field, amounts in deltas.items() if amounts
+    })
+    # update() skips the model signals, so invalidate cached catalog responses here
+    bump_catalog_version_on_commit()
+
+
+def take_stock(products, quantities, reason, reference=''):
+    """
+    Take {product_id: quantity} from products already locked and checked with
+    lock_products() and check_available(), and journal it.
+    """
+    deltas = {product_id: -quantity for product_id, quantity in quantities.items() if quantity}
+    adjust_products({'stock': deltas})
+    record_movements(deltas, reason, reference)
+    for product_id, quantity in quantities.items():
+        products[product_id].stock -= quantity
+
+
+def decrement_stock(quantities, reason=StockMovement.ORDER, reference=''):
+    """
+    Take stock for {product_id: quantity} (all or nothing) and return the locked products.
+
+    Raises StockError for unknown products and InsufficientStockError when a product
+    does not have enough stock; nothing is changed in either case.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    products = lock_products(quantities)
+    check_available(products, quantities)
+    take_stock(products, quantities, reason, reference)
+    return products
+
+
+def record_movements(deltas, reason, reference=''):
+    """Journal {product_id: signed quantity} as StockMovement rows in one INSERT."""
+    StockMovement.objects.bulk_create([
+        StockMovement(product_id=product_id, quantity=quantity, reason=reason, reference=reference)
+        for product_id, quantity in deltas.items() if quantity
+    ])
+
+
+def restore_stock(quantities, reason, reference=''):
+    """
+    Put {product_id: quantity} back into stock (cancellations, refunds) with one
+    UPDATE after locking the products, and journal the change. Products that no
+    longer exist are skipped. Returns the number of products updated.
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    existing = list(
+        Product.objects.select_for_update().filter(id__in=quantities).order_by('id').values_list('id', flat=True)
+    )
+    quantities = {product_id: quantities[product_id] for product_id in existing}
+    adjust_products({'stock': quantities})
+    record_movements(quantities, reason, reference)
+    return len(quantities)
+
+
+def reserve_stock(quantities, owner, ttl=None):
+    """
+    Hold {product_id: quantity} for `owner` until the reservation expires (all or
+    nothing) and return the locked products. Raises like decrement_stock().
+    """
+    quantities = {product_id: quantity for product_id, quantity in quantities.items() if quantity}
+    products = lock_products(quantities)
+    check_available(products, quantities)
+
+    expires_at = timezone.now() + (ttl or get_reservation_ttl())
+    StockReservation.objects.bulk_create([
+        StockReservation(product_id=product_id, quantity=quantity, owner=owner, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    adjust_products({'reserved': quantities})
+    for product_id, quantity in quantities.items():
+        products[product_id].reserved += quantity
+    return products
+
+
+def end_reservations(reservations, commit_reference=None):
+    """
+    Remove the given reservations and return their units to the available stock,
+    or, with `commit_reference`, take them from stock and journal that as an order
+    with that reference. Returns {product_id: quantity}.
+
+    The products are locked first, so a reservation is ended exactly once even when
+    the owner and the expiry sweeper get to it at the same time.
+    """
+    product_ids = sorted(set(reservations.values_list('product_id', flat=True)))
+    # Lock only; the rows themselves are not needed
+    list(Product.objects.select_for_update().filter(id__in=product_ids).order_by('id').values_list('id'))
+
+    held = list(reservations.values_list('pk', 'product_id', 'quantity'))
+    if not held:
+        return {}
+    totals = defaultdict(int)
+    for _, product_id, quantity in held:
+        totals[product_id] += quantity
+
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in held]).delete()
+    deltas = {'reserved': {product_id: -quantity for product_id, quantity in totals.items()}}
+    if commit_reference is not None:
+        deltas['stock'] = deltas['reserved']
+    adjust_products(deltas)
+    if commit_reference is not None:
+        record_movements(deltas['stock'], StockMovement.ORDER, commit_reference)
+    return dict(totals)
+
+
+def release_reservations(owners):
+    """Give back everything held by the given owners."""
+    return end_reservations(StockReservation.objects.filter(owner__in=owners))
+
+
+def commit_reservations(owner):
+    """Take the stock held by `owner`. Returns {product_id: quantity}, empty if nothing was held."""
+    return end_reservations(StockReservation.objects.filter(owner=owner), commit_reference=owner)
+
+
+def release_expired_reservations(now=None, batch_size=500):
+    """
+    Release every reservation that expired by `now`, `batch_size` at a time, each
+    batch in its own transaction. Returns the number of units given back.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now).order_by('expires_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        if not batch:
+            return released
+        with transaction.atomic():
+            released += sum(end_reservations(StockReservation.objects.filter(pk__in=batch)).values())
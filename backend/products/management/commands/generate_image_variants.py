@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from products.models import Product
+from products.images import generate_image_variants
+
+
+class Command(BaseCommand):
+    help = "Generate responsive WebP/JPEG variants for existing product images"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Regenerate even if variants are up to date")
+        parser.add_argument('--workers', type=int, default=4, help="Number of parallel workers")
+
+    def handle(self, *args, **options):
+        product_ids = list(
+            Product.objects.exclude(image='').exclude(image__isnull=True).values_list('id', flat=True)
+        )
+        force = options['force']
+
+        def process(product_id):
+            try:
+                return generate_image_variants(product_id, force=force)
+            except Exception as e:
+                self.stderr.write(f"Product {product_id}: {e}")
+                return False
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            generated = sum(executor.map(process, product_ids))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {generated} of {len(product_ids)} products with images"
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized rating_sum, rating_count and average_rating columns on Product"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--product',
+            type=int,
+            action='append',
+            dest='product_ids',
+            help="Only rebuild the given product ID (can be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.all()
+        if options['product_ids']:
+            products = products.filter(id__in=options['product_ids'])
+
+        updated = products.refresh_rating_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating aggregates for {updated} products"))
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from products.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Give expired checkout stock reservations back to the available stock"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help="Reservations released per transaction",
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="Keep running as a sweeper, checking every this many seconds (default: run once)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Released {released} reserved units"))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
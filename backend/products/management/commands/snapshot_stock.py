@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.stock_history import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot every product's stock so past stock levels can be computed without replaying the whole journal"
+
+    def handle(self, *args, **options):
+        written = take_snapshots()
+        self.stdout.write(self.style.SUCCESS(f"Took stock snapshots for {written} products"))
@@ -1,7 +1,10 @@
 from django.db import models
 from users.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db.models import Avg
+from django.db.models import Avg, Count, F, Sum, OuterRef, Subquery, FloatField, IntegerField
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 
 # Create your models here.
 class Category(models.Model):
@@ -14,6 +17,40 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
 
+class ProductQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Queryset for serializing product lists: joins the category so that
+        ProductSerializer does not issue one extra query per row.
+        """
+        return self.select_related('category')
+
+    def available(self, quantity=1):
+        """
+        Products with at least `quantity` units not held by checkouts. Filters on
+        stock - reserved, which is indexed (see Meta.indexes).
+        """
+        return self.alias(available_units=F('stock') - F('reserved')).filter(available_units__gte=quantity)
+
+    def refresh_rating_aggregates(self):
+        """
+        Recompute rating_sum, rating_count and average_rating from the reviews table
+        for every product in this queryset, in a single UPDATE statement.
+        Returns the number of products updated.
+        """
+        reviews = Review.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        return self.update(
+            rating_sum=Coalesce(
+                Subquery(reviews.annotate(total=Sum('rating')).values('total'), output_field=IntegerField()), 0
+            ),
+            rating_count=Coalesce(
+                Subquery(reviews.annotate(total=Count('id')).values('total'), output_field=IntegerField()), 0
+            ),
+            average_rating=Coalesce(
+                Subquery(reviews.annotate(avg=Avg('rating')).values('avg'), output_field=FloatField()), 0.0
+            ),
+        )
+
 class Product(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(max_length=1000)
@@ -23,21 +60,65 @@ class Product(models.Model):
     date_added = models.DateTimeField(auto_now_add=True)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products',null=True)
 
-    def average_rating(self):
+    # Units held by StockReservation rows of checkouts not paid yet, maintained by
+    # products/inventory.py. Available stock is stock - reserved.
+    reserved = models.PositiveIntegerField(default=0, editable=False)
+
+    # Denormalized rating aggregates, kept in sync by the Review signals in products/signals.py
+    # and rebuilt with `python manage.py rebuild_product_ratings`.
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    average_rating = models.FloatField(default=0, editable=False, db_index=True)
+
+    # Resized WebP/JPEG copies of `image`, filled in by products/images.py:
+    # {"source": <image name>, "webp": [{"width": 320, "name": ...}, ...], "jpeg": [...]}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Full-text search document, only populated on PostgreSQL (see products/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
+
+    def refresh_rating_aggregates(self):
         """
-        Calculates and returns the average rating for this product from all its reviews.
-        Returns 0 if there are no reviews.
+        Recompute this product's rating aggregates from its reviews and reload them.
         """
-        # The 'reviews' related_name allows us to do: self.reviews.all()
-        result = self.reviews.aggregate(average=Avg('rating'))
-        # The aggregate function returns a dictionary like {'average': 4.75} or {'average': None}
-        return result['average'] if result['average'] is not None else 0
+        Product.objects.filter(pk=self.pk).refresh_rating_aggregates()
+        self.refresh_from_db(fields=['rating_sum', 'rating_count', 'average_rating'])
+
+    @property
+    def available_stock(self):
+        return max(self.stock - self.reserved, 0)
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['-date_added']
+        # Composite (sort key, id) indexes back keyset pagination on the listing sorts
+        indexes = [
+            models.Index(fields=['-date_added', '-id']),
+            models.Index(fields=['unit_price', 'id']),
+            # Available stock reads (ProductQuerySet.available) never touch the reservations
+            models.Index(F('stock') - F('reserved'), name='product_available_stock_idx'),
+        ]
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for a checkout that has started but is not paid yet. It expires at
+    expires_at unless committed first; `python manage.py release_expired_reservations`
+    returns expired holds to the available stock.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    # Who holds the stock, e.g. "order:42" (see Order.stock_reference)
+    owner = models.CharField(max_length=100, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held by {self.owner}"
 
 class Review(models.Model):
     product = models.ForeignKey(Product,on_delete=models.CASCADE,related_name='reviews')
@@ -59,9 +140,69 @@ class Review(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['user', 'product'],
                 name='unique_user_product_review'
             )
         ]
+
+
+class StockMovement(models.Model):
+    """
+    Append-only journal of stock changes: one row per product per change, written in
+    bulk by products/inventory.py alongside the stock UPDATE (and by the Product signals
+    for stock set through save()). See products/stock_history.py.
+    """
+    ORDER = 'order'
+    CANCELLATION = 'cancellation'
+    REFUND = 'refund'
+    ADJUSTMENT = 'adjustment'
+    REASON_CHOICES = [
+        (ORDER, 'Order'),
+        (CANCELLATION, 'Cancellation'),
+        (REFUND, 'Refund'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
+    # Signed change to Product.stock
+    quantity = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    # What caused it, e.g. "order:42" (see Order.stock_reference)
+    reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.quantity:+d} x {self.product_id} ({self.reason})"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', 'created_at']),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's stock as of a StockMovement id, taken periodically by
+    `python manage.py snapshot_stock` so past stock levels can be computed from the
+    nearest snapshot instead of replaying the whole journal.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    stock = models.IntegerField()
+    # Last StockMovement of the product included in `stock` (0 if none)
+    movement_id = models.BigIntegerField(default=0)
+    taken_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.stock} at {self.taken_at:%Y-%m-%d %H:%M}"
+
+    class Meta:
+        ordering = ['-taken_at']
+        indexes = [
+            models.Index(fields=['product', 'taken_at']),
+        ]
@@ -0,0 +1,197 @@
+"""
+Full-text search for the product catalog.
+
+All callers go through get_search_backend(), which picks an implementation for the
+current database:
+- PostgreSQL: a weighted tsvector column on Product (GIN indexed), ranked with ts_rank.
+- SQLite: an FTS5 virtual table keyed by product id, ranked with bm25.
+- Anything else: the old title/description/category icontains filter (no ranking).
+
+The index is kept up to date by the Product/Category signals in products/signals.py
+and can be rebuilt with `python manage.py rebuild_search_index`.
+"""
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from .models import Product, Category
+
+
+def search_terms(query):
+    """Split a user query into plain word tokens (no operators, quotes or punctuation)."""
+    return re.findall(r'\w+', query or '')
+
+
+class SearchBackend:
+    """
+    Interface for product search backends.
+    search() returns the queryset filtered to matching products and annotated with
+    a `search_rank` value (higher is more relevant).
+    """
+    def install(self):
+        """Create any database objects the backend needs (idempotent)."""
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_products(self, product_ids):
+        """(Re)index the given products."""
+
+    def remove_products(self, product_ids):
+        """Drop the given products from the index."""
+
+    def rebuild(self):
+        """Reindex the whole catalog. Returns the number of indexed products."""
+        self.install()
+        return self.index_products(None)
+
+
+class BasicSearchBackend(SearchBackend):
+    """Fallback for databases without full-text support: substring match, no ranking."""
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(
+                models.Q(title__icontains=term) |
+                models.Q(description__icontains=term) |
+                models.Q(category__name__icontains=term)
+            )
+        return queryset.annotate(search_rank=models.Value(0.0, output_field=models.FloatField()))
+
+    def rebuild(self):
+        return 0
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector column + GIN index, ranked with ts_rank."""
+
+    index_name = 'products_product_search_vector_gin'
+
+    def __init__(self, config='english'):
+        self.config = config
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.index_name} '
+                f'ON {Product._meta.db_table} USING GIN (search_vector)'
+            )
+
+    def build_query(self, query):
+        from django.contrib.postgres.search import SearchQuery
+        terms = search_terms(query)
+        if not terms:
+            return None
+        # Prefix-match every term so partial words still find products, as icontains did
+        raw = ' & '.join(f'{term}:*' for term in terms)
+        return SearchQuery(raw, search_type='raw', config=self.config)
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchRank
+        search_query = self.build_query(query)
+        if search_query is None:
+            return queryset.none()
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(models.F('search_vector'), search_query)
+        )
+
+    def index_products(self, product_ids):
+        from django.contrib.postgres.search import SearchVector
+        category_name = Category.objects.filter(pk=models.OuterRef('category_id')).values('name')[:1]
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        # UPDATE cannot join, so the category name comes from a correlated subquery
+        return products.update(search_vector=(
+            SearchVector('title', weight='A', config=self.config) +
+            SearchVector(
+                Coalesce(models.Subquery(category_name), models.Value('')),
+                weight='B', config=self.config,
+            ) +
+            SearchVector('description', weight='C', config=self.config)
+        ))
+
+
+class SQLiteFTSSearchBackend(SearchBackend):
+    """FTS5 virtual table whose rowid is the product id, ranked with bm25."""
+
+    table = 'products_product_fts'
+
+    def install(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} '
+                f'USING fts5(title, description, category, tokenize="unicode61")'
+            )
+
+    def build_query(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return None
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        match = self.build_query(query)
+        if match is None:
+            return queryset.none()
+        product_table = Product._meta.db_table
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [match])
+        ).annotate(search_rank=RawSQL(
+            # bm25() is lower for better matches, so negate it to keep "higher is better"
+            f'SELECT -bm25({self.table}, 10.0, 1.0, 5.0) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {product_table}.id',
+            [match],
+            output_field=models.FloatField(),
+        ))
+
+    def index_products(self, product_ids):
+        products = Product.objects.all()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        rows = [
+            (product_id, title, description, category or '')
+            for product_id, title, description, category
+            in products.values_list('id', 'title', 'description', 'category__name').iterator()
+        ]
+        with connection.cursor() as cursor:
+            if product_ids is None:
+                cursor.execute(f'DELETE FROM {self.table}')
+            else:
+                self._delete(cursor, product_ids)
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, title, description, category) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+        return len(rows)
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+
+    def _delete(self, cursor, product_ids):
+        product_ids = list(product_ids)
+        if product_ids:
+            placeholders = ', '.join(['%s'] * len(product_ids))
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', product_ids)
+
+
+def sqlite_has_fts5():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Return the search backend for the default database."""
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend(config=getattr(settings, 'PRODUCT_SEARCH_CONFIG', 'english'))
+    if connection.vendor == 'sqlite' and sqlite_has_fts5():
+        return SQLiteFTSSearchBackend()
+    return BasicSearchBackend()
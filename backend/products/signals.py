@@ -0,0 +1,103 @@
+from django.db import models
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, Category, Review, StockMovement
+from .search import get_search_backend
+from .cache import bump_catalog_version_on_commit
+from .images import needs_variants, schedule_image_variants
+from .inventory import record_movements
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_review_save(sender, instance, **kwargs):
+    """
+    Keep the denormalized rating columns on Product in sync when a review is created or edited.
+    """
+    Product.objects.filter(pk=instance.product_id).refresh_rating_aggregates()
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_review_delete(sender, instance, origin=None, **kwargs):
+    """
+    Keep the denormalized rating columns on Product in sync when a review is deleted.
+    Skipped when the review is only being removed because its product is being deleted.
+    """
+    origin_model = origin.model if isinstance(origin, models.QuerySet) else type(origin)
+    if origin_model is Product:
+        return
+    Product.objects.filter(pk=instance.product_id).refresh_rating_aggregates()
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, update_fields=None, **kwargs):
+    """
+    Keep the full-text search index in sync with the product's searchable fields.
+    """
+    if update_fields is not None and not {'title', 'description', 'category'} & set(update_fields):
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def generate_variants_on_image_change(sender, instance, **kwargs):
+    """
+    Queue responsive image variants whenever the product image is added or replaced.
+    """
+    if needs_variants(instance):
+        schedule_image_variants(instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+def load_stored_stock(sender, instance, update_fields=None, **kwargs):
+    """Read the stored stock, so a change made through save() can be journaled."""
+    instance._stored_stock = None
+    if instance.pk is not None and (update_fields is None or 'stock' in update_fields):
+        instance._stored_stock = Product.objects.filter(pk=instance.pk).values_list('stock', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+def journal_stock_change(sender, instance, created, **kwargs):
+    """
+    Journal stock set directly on the model (new products, dashboard edits, the admin
+    site). Orders, cancellations and bulk edits use update() and journal themselves.
+    """
+    previous = 0 if created else instance._stored_stock
+    if previous is not None:
+        record_movements({instance.pk: instance.stock - previous}, StockMovement.ADJUSTMENT)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_index(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    """
+    Category names are part of the search document, so a rename reindexes its products.
+    """
+    if created:
+        return
+    product_ids = list(instance.products.values_list('id', flat=True))
+    if product_ids:
+        get_search_backend().index_products(product_ids)
+
+
+def install_search_index(sender, **kwargs):
+    """
+    post_migrate hook: create the search index objects (GIN index / FTS5 table).
+    """
+    get_search_backend().install()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Any catalog write invalidates the cached public catalog responses.
+    """
+    bump_catalog_version_on_commit()
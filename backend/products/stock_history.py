@@ -0,0 +1,58 @@
+"""
+Point-in-time stock levels from the StockMovement journal.
+
+Every stock change writes StockMovement rows (products/inventory.py, and the Product
+signals for stock set through save()). `python manage.py snapshot_stock` periodically
+stores each product's stock in a StockSnapshot, together with the id of the last
+movement that stock includes. Stock changes of one product are serialized by its row
+lock, so its movement ids grow in commit order.
+
+stock_at() finds the nearest snapshot with one lookup on the (product, taken_at)
+index and replays only the movements between that snapshot and the requested time:
+- from the last snapshot taken at or before it, adding the movements made up to it;
+- otherwise from the first snapshot after it (or the current stock, if there is
+  none), subtracting the movements made after it.
+"""
+from collections import namedtuple
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Product, StockMovement, StockSnapshot
+
+StockLevel = namedtuple('StockLevel', ['stock', 'snapshot', 'movements_replayed'])
+
+
+def take_snapshots():
+    """Snapshot the current stock of every product. Returns the number of snapshots written."""
+    last_movement = StockMovement.objects.filter(product=OuterRef('pk')).order_by('-id').values('id')[:1]
+    # Stock and last movement are read by the same statement, so they agree
+    rows = Product.objects.order_by().annotate(
+        last_movement=Coalesce(Subquery(last_movement), 0),
+    ).values_list('id', 'stock', 'last_movement')
+    taken_at = timezone.now()
+    snapshots = StockSnapshot.objects.bulk_create((
+        StockSnapshot(product_id=product_id, stock=stock, movement_id=movement_id, taken_at=taken_at)
+        for product_id, stock, movement_id in rows.iterator()
+    ), batch_size=1000)
+    return len(snapshots)
+
+
+def stock_at(product, when):
+    """The product's stock at `when`, as StockLevel(stock, snapshot used or None, movements replayed)."""
+    movements = StockMovement.objects.filter(product=product)
+    snapshot = StockSnapshot.objects.filter(product=product, taken_at__lte=when).order_by('-taken_at').first()
+    if snapshot is not None:
+        base, sign = snapshot.stock, 1
+        replay = movements.filter(id__gt=snapshot.movement_id, created_at__lte=when)
+    else:
+        snapshot = StockSnapshot.objects.filter(product=product, taken_at__gt=when).order_by('taken_at').first()
+        if snapshot is not None:
+            base = snapshot.stock
+            replay = movements.filter(id__lte=snapshot.movement_id, created_at__gt=when)
+        else:
+            base = product.stock
+            replay = movements.filter(created_at__gt=when)
+        sign = -1
+
+    replayed = replay.aggregate(total=Sum('quantity'), count=Count('id'))
+    return StockLevel(base + sign * (replayed['total'] or 0), snapshot, replayed['count'])
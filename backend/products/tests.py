@@ -1,3 +1,580 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import timedelta
+from asgiref.sync import async_to_sync
+from django.db import connection, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from PIL import Image
+from backend.instrumentation import registry
+from backend.urls import urlpatterns as project_urlpatterns
+from users.models import User
+from .api import async_views
+from .api.urls import catalog_patterns
+from .models import Product, Category, Review, StockMovement, StockReservation, StockSnapshot
+from .inventory import (
+    InsufficientStockError, commit_reservations, decrement_stock, release_expired_reservations,
+    release_reservations, reserve_stock, restore_stock,
+)
+from .stock_history import stock_at, take_snapshots
 
-# Create your tests here.
+# The project's URLs with the catalog served by the async views, as under ASGI
+urlpatterns = [path('api/products/', include(catalog_patterns(async_views))), *project_urlpatterns]
+
+
+@override_settings(PRODUCT_IMAGE_VARIANTS_ASYNC=False)
+class CatalogTestCase(TestCase):
+    """
+    Catalog responses are cached and invalidated on commit, so every test starts with
+    an empty cache and runs catalog writes through captureOnCommitCallbacks(execute=True).
+    Image variants are generated inline so no background thread touches the test database.
+    """
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+
+class ProductListQueryCountTests(CatalogTestCase):
+    """
+    Regression tests: listing products must not issue extra queries per row.
+    """
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Electronics')
+        self.reviewer = User.objects.create_user(username='reviewer', email='reviewer@example.com', password='pass12345')
+
+    def create_products(self, count):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_products(count)
+
+    def _create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(
+                title=f'Product {i}',
+                description='Description',
+                unit_price=10 + i,
+                stock=5,
+                category=self.category,
+                image=f'products/product_{i}.jpg',
+            )
+            Review.objects.create(product=product, user=self.reviewer, title='Nice', content='Nice', rating=4)
+
+    def count_list_queries(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('product-list-create'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.create_products(2)
+        small_page_queries, response = self.count_list_queries()
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.create_products(8)
+        full_page_queries, response = self.count_list_queries()
+        self.assertEqual(len(response.data['results']), 10)
+
+        self.assertEqual(small_page_queries, full_page_queries)
+
+    def test_rating_filter_and_sort_do_not_add_per_row_queries(self):
+        self.create_products(2)
+        small_page_queries, _ = self.count_list_queries(min_rating=3, sort_by='rating')
+        self.create_products(8)
+        full_page_queries, response = self.count_list_queries(min_rating=3, sort_by='rating')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(small_page_queries, full_page_queries)
+
+    def test_listing_returns_category_name_rating_and_absolute_image_url(self):
+        self.create_products(1)
+        _, response = self.count_list_queries()
+        product = response.data['results'][0]
+        self.assertEqual(product['category'], 'Electronics')
+        self.assertEqual(product['average_rating'], 4.0)
+        self.assertEqual(product['image'], 'http://testserver/media/products/product_0.jpg')
+
+
+class ProductSearchTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        audio = Category.objects.create(name='Audio')
+        self.headphones = Product.objects.create(
+            title='Wireless Headphones', description='Noise cancelling', unit_price=100, category=audio,
+        )
+        self.laptop = Product.objects.create(
+            title='Laptop', description='Ships with a pair of headphones', unit_price=900,
+        )
+        Product.objects.create(title='Desk Lamp', description='LED lamp', unit_price=20)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('product-list-create'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product['title'] for product in response.data['results']]
+
+    def test_search_orders_by_relevance(self):
+        self.assertEqual(self.search('headphones'), ['Wireless Headphones', 'Laptop'])
+
+    def test_search_matches_word_prefixes_and_category(self):
+        self.assertEqual(self.search('headph', sort_by='price_desc'), ['Laptop', 'Wireless Headphones'])
+        self.assertEqual(self.search('audio'), ['Wireless Headphones'])
+
+    def test_index_follows_product_updates_and_deletes(self):
+        self.laptop.title = 'Gaming Notebook'
+        self.laptop.description = 'Fast'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptop.save()
+        self.assertEqual(self.search('notebook'), ['Gaming Notebook'])
+        self.assertEqual(self.search('headphones'), ['Wireless Headphones'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.headphones.delete()
+        self.assertEqual(self.search('headphones'), [])
+
+
+class ProductCursorPaginationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        # Repeated prices exercise the id tiebreaker
+        for i in range(25):
+            Product.objects.create(title=f'Product {i}', description='Description', unit_price=10 + i % 4)
+
+    def walk(self, url, params=None):
+        titles, pages = [], 0
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            titles += [product['title'] for product in response.data['results']]
+            pages += 1
+            if not response.data['next']:
+                return titles, pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_cursor_pages_cover_listing_in_sort_order(self):
+        url = reverse('product-list-create')
+        titles, pages, last_page = self.walk(url, {'cursor': '', 'sort_by': 'price_asc'})
+        expected = list(
+            Product.objects.order_by('unit_price', 'id').values_list('title', flat=True)
+        )
+        self.assertEqual(titles, expected)
+        self.assertEqual(pages, 3)
+
+        previous = self.client.get(last_page.data['previous'])
+        self.assertEqual([p['title'] for p in previous.data['results']], expected[10:20])
+
+    def test_cursor_pages_keep_rows_added_within_the_same_millisecond(self):
+        # Default listing order, -date_added: every product within one millisecond
+        added = timezone.now().replace(microsecond=0)
+        for offset, product in enumerate(Product.objects.order_by('id')):
+            Product.objects.filter(pk=product.pk).update(date_added=added + timedelta(microseconds=offset * 7))
+        url = reverse('product-list-create')
+        titles, pages, last_page = self.walk(url, {'cursor': ''})
+        expected = list(Product.objects.order_by('-date_added', '-id').values_list('title', flat=True))
+        self.assertEqual(titles, expected)
+        self.assertEqual(pages, 3)
+
+        previous = self.client.get(last_page.data['previous'])
+        self.assertEqual([p['title'] for p in previous.data['results']], expected[10:20])
+
+    def test_cursor_mode_count_is_opt_in(self):
+        response = self.client.get(reverse('product-list-create'), {'cursor': '', 'count': 'true'})
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse('product-list-create'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class CatalogCacheTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Books')
+        self.product = Product.objects.create(
+            title='Novel', description='Fiction', unit_price=15, category=self.category,
+        )
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True,
+        )
+
+    def test_repeated_reads_are_served_from_cache(self):
+        url = reverse('product-list-create')
+        self.assertEqual(self.client.get(url, {'sort_by': 'newest', 'q': 'novel'})['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            # Same params in a different order hit the same entry
+            response = self.client.get(url, {'q': 'novel', 'sort_by': 'newest'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['results'][0]['title'], 'Novel')
+
+    def test_catalog_writes_invalidate_cached_responses(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(product=self.product, user=self.admin, title='Good', content='Good', rating=5)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['average_rating'], 5.0)
+
+    def test_bulk_update_invalidates_cached_responses(self):
+        url = reverse('price-range')
+        self.client.get(url)
+        self.client.force_authenticate(self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('bulk-update-products'),
+                {'product_ids': [self.product.id], 'updates': {'unit_price': 42}},
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['max_price'], 42)
+
+        stats = self.client.get(reverse('catalog-cache-stats')).data
+        self.assertEqual((stats['hits'], stats['misses']), (0, 2))
+
+
+class ProductImageVariantTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            PRODUCT_IMAGE_WIDTHS=(320, 640, 1024),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.category = Category.objects.create(name='Prints')
+
+    def make_upload(self, width, height):
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera Maker'
+        Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def test_variants_are_generated_on_upload(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                title='Poster', description='Wall art', unit_price=20,
+                category=self.category, image=self.make_upload(800, 400),
+            )
+        product.refresh_from_db()
+        variants = product.image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        # 1024 would upscale the 800px original, so it is skipped
+        self.assertEqual([entry['width'] for entry in variants['webp']], [320, 640])
+        self.assertEqual([entry['width'] for entry in variants['jpeg']], [320, 640])
+
+        with Image.open(f"{self.media_root}/{variants['jpeg'][0]['name']}") as resized:
+            self.assertEqual(resized.size, (320, 160))
+            self.assertEqual(len(resized.getexif()), 0)
+
+        response = self.client.get(reverse('product-detail', args=[product.id]))
+        srcset = response.data['image_srcset']
+        self.assertIn('320w', srcset['webp'])
+        self.assertTrue(srcset['jpeg'].endswith('640w'))
+
+    def test_unusable_images_are_recorded_and_not_retried(self):
+        bogus = SimpleUploadedFile('photo.jpg', b'not an image', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            broken = Product.objects.create(
+                title='Broken', description='Wall art', unit_price=20, category=self.category, image=bogus,
+            )
+            lost = Product.objects.create(
+                title='Lost', description='Wall art', unit_price=20, category=self.category, image='products/gone.jpg',
+            )
+        broken.refresh_from_db()
+        lost.refresh_from_db()
+        self.assertEqual(broken.image_variants, {'source': broken.image.name, 'invalid': True})
+        self.assertEqual(lost.image_variants, {'source': 'products/gone.jpg', 'missing': True})
+
+        # Saving again does not queue the image again
+        with mock.patch('products.signals.schedule_image_variants') as schedule:
+            lost.title = 'Still lost'
+            lost.save()
+        schedule.assert_not_called()
+        response = self.client.get(reverse('product-detail', args=[lost.id]))
+        self.assertIsNone(response.data['image_srcset'])
+
+    def test_product_without_image_has_no_srcset(self):
+        product = Product.objects.create(title='Plain', description='No image', unit_price=5, category=self.category)
+        response = self.client.get(reverse('product-detail', args=[product.id]))
+        self.assertIsNone(response.data['image_srcset'])
+
+
+class DashboardStatsTests(CatalogTestCase):
+    def test_counters_take_one_query_per_table(self):
+        category = Category.objects.create(name='Garden')
+        admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True,
+        )
+        Product.objects.create(title='Rake', description='Tool', unit_price=9, stock=0, category=category)
+        product = Product.objects.create(title='Hose', description='Tool', unit_price=19, stock=3, category=category)
+        Review.objects.create(product=product, user=admin, title='Fine', content='Fine', rating=4)
+        self.client.force_authenticate(admin)
+
+        response = self.client.get(reverse('dashboard-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['meta']['queries'], 3)
+        self.assertEqual(
+            {key: response.data[key] for key in (
+                'total_products', 'total_categories', 'total_reviews',
+                'products_with_stock', 'products_out_of_stock', 'recent_products',
+            )},
+            {
+                'total_products': 2, 'total_categories': 1, 'total_reviews': 1,
+                'products_with_stock': 1, 'products_out_of_stock': 1, 'recent_products': 2,
+            },
+        )
+        self.assertEqual(response.data['average_rating'], 4)
+
+
+class StockReservationTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Garden')
+        self.rake = Product.objects.create(title='Rake', description='Tool', unit_price=9, stock=5, category=category)
+        self.hose = Product.objects.create(title='Hose', description='Tool', unit_price=19, stock=3, category=category)
+
+    def reserve(self, quantities, owner, **kwargs):
+        with transaction.atomic():
+            return reserve_stock(quantities, owner, **kwargs)
+
+    def assertLevels(self, product, stock, reserved):
+        product.refresh_from_db()
+        self.assertEqual((product.stock, product.reserved), (stock, reserved))
+
+    def test_reserved_units_cannot_be_sold_again(self):
+        self.reserve({self.rake.id: 4, self.hose.id: 3}, 'order:1')
+        self.assertLevels(self.rake, 5, 4)
+        self.assertEqual(list(Product.objects.available().order_by('id')), [self.rake])
+
+        with self.assertRaises(InsufficientStockError):
+            self.reserve({self.rake.id: 2}, 'order:2')
+        with self.assertRaises(InsufficientStockError):
+            with transaction.atomic():
+                decrement_stock({self.hose.id: 1})
+        # Nothing was held for the rejected checkout
+        self.assertFalse(StockReservation.objects.filter(owner='order:2').exists())
+        self.assertLevels(self.rake, 5, 4)
+
+    def test_commit_takes_the_held_stock_once(self):
+        self.reserve({self.rake.id: 2, self.hose.id: 1}, 'order:1')
+        with transaction.atomic():
+            self.assertEqual(commit_reservations('order:1'), {self.rake.id: 2, self.hose.id: 1})
+            self.assertEqual(commit_reservations('order:1'), {})
+        self.assertLevels(self.rake, 3, 0)
+        self.assertLevels(self.hose, 2, 0)
+
+    def test_release_gives_the_stock_back(self):
+        self.reserve({self.rake.id: 2}, 'order:1')
+        self.reserve({self.rake.id: 1}, 'order:2')
+        with transaction.atomic():
+            release_reservations(['order:1'])
+        self.assertLevels(self.rake, 5, 1)
+
+    def test_expired_reservations_are_swept_in_batches(self):
+        for owner in range(5):
+            self.reserve({self.rake.id: 1}, f'order:{owner}', ttl=timedelta(seconds=-1))
+        self.reserve({self.hose.id: 2}, 'order:live')
+
+        self.assertEqual(release_expired_reservations(batch_size=2), 5)
+        self.assertLevels(self.rake, 5, 0)
+        self.assertLevels(self.hose, 3, 2)
+        self.assertEqual(list(StockReservation.objects.values_list('owner', flat=True)), ['order:live'])
+
+        later = timezone.now() + timedelta(days=1)
+        self.assertEqual(release_expired_reservations(now=later), 2)
+        self.assertLevels(self.hose, 3, 0)
+
+    def test_available_stock_is_served_to_shoppers(self):
+        self.reserve({self.hose.id: 2}, 'order:1')
+        response = self.client.get(reverse('product-detail', args=[self.hose.id]))
+        self.assertEqual(response.data['stock'], 3)
+        self.assertEqual(response.data['available_stock'], 1)
+
+
+class StockJournalTests(CatalogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Garden')
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@example.com', password='pass12345', is_staff=True,
+        )
+
+    def create_product(self, stock):
+        return Product.objects.create(title='Rake', description='Tool', unit_price=9, stock=stock, category=self.category)
+
+    def journal(self, product):
+        return list(product.stock_movements.order_by('id').values_list('quantity', 'reason', 'reference'))
+
+    def test_every_stock_change_is_journaled(self):
+        product = self.create_product(10)
+        with transaction.atomic():
+            decrement_stock({product.id: 3}, reference='order:1')
+            reserve_stock({product.id: 2}, 'order:2')
+            commit_reservations('order:2')
+            restore_stock({product.id: 1}, StockMovement.CANCELLATION, 'order:1')
+        product.refresh_from_db()
+        product.stock = 20
+        product.save()
+        # Saves that do not touch the stock journal nothing
+        product.title = 'Big rake'
+        product.save()
+
+        self.client.force_authenticate(self.admin)
+        self.client.post(
+            reverse('bulk-update-products'),
+            {'product_ids': [product.id], 'updates': {'stock': 15}},
+            format='json',
+        )
+
+        self.assertEqual(self.journal(product), [
+            (10, 'adjustment', ''),
+            (-3, 'order', 'order:1'),
+            (-2, 'order', 'order:2'),
+            (1, 'cancellation', 'order:1'),
+            (14, 'adjustment', ''),
+            (-5, 'adjustment', f'user:{self.admin.pk}'),
+        ])
+        product.refresh_from_db()
+        self.assertEqual(sum(quantity for quantity, _, _ in self.journal(product)), product.stock)
+
+    def test_stock_at_uses_the_nearest_snapshot(self):
+        before = timezone.now()
+        product = self.create_product(10)
+        created = timezone.now()
+        take_snapshots()
+        snapshotted = timezone.now()
+        with transaction.atomic():
+            decrement_stock({product.id: 3})
+        first_sale = timezone.now()
+        with transaction.atomic():
+            decrement_stock({product.id: 2})
+        take_snapshots()
+        with transaction.atomic():
+            restore_stock({product.id: 4}, StockMovement.CANCELLATION)
+        product.refresh_from_db()
+
+        self.assertEqual(stock_at(product, before).stock, 0)
+        self.assertEqual(stock_at(product, created).stock, 10)
+        level = stock_at(product, snapshotted)
+        self.assertEqual((level.stock, level.movements_replayed), (10, 0))
+        level = stock_at(product, first_sale)
+        self.assertEqual((level.stock, level.movements_replayed), (7, 1))
+        # Only the movement after the second snapshot is replayed
+        level = stock_at(product, timezone.now())
+        self.assertEqual((level.stock, level.movements_replayed), (9, 1))
+        self.assertEqual(StockSnapshot.objects.filter(product=product).count(), 2)
+
+    def test_stock_at_without_snapshots_replays_back_from_the_current_stock(self):
+        product = self.create_product(6)
+        created = timezone.now()
+        with transaction.atomic():
+            decrement_stock({product.id: 4})
+        product.refresh_from_db()
+        self.assertEqual(stock_at(product, created).stock, 6)
+
+    def test_stock_at_endpoint(self):
+        product = self.create_product(5)
+        url = reverse('product-stock-at', args=[product.id])
+        self.assertIn(self.client.get(url).status_code, (401, 403))
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(url, {'at': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 0)
+        self.assertEqual(self.client.get(url).data['stock'], 5)
+        self.assertEqual(self.client.get(url, {'at': 'yesterday'}).status_code, 400)
+
+
+@override_settings(ROOT_URLCONF='products.tests')
+class AsyncCatalogViewTests(CatalogTestCase):
+    """The async catalog views (ROOT_URLCONF above) must answer exactly like the sync ones."""
+    def setUp(self):
+        super().setUp()
+        self.async_client = AsyncClient()
+        self.reviewer = User.objects.create_user(
+            username='reviewer', email='reviewer@example.com', password='pass12345', first_name='Ann',
+        )
+        categories = [Category.objects.create(name=name) for name in ('Audio', 'Books')]
+        for i in range(13):
+            product = Product.objects.create(
+                title=f'Speaker {i}', description='Loud', unit_price=10 + i % 4, stock=5,
+                category=categories[i % 2], image=f'products/speaker_{i}.jpg',
+            )
+            if i < 3:
+                Review.objects.create(product=product, user=self.reviewer, title='Nice', content='Nice', rating=4)
+        self.product = product
+
+    def compare(self, url, params=None):
+        """Request the URL from the sync and the async view; returns the async response."""
+        with override_settings(ROOT_URLCONF='backend.urls'):
+            cache.clear()
+            expected = self.client.get(url, params)
+        cache.clear()
+        response = async_to_sync(self.async_client.get)(url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    def test_async_views_answer_like_the_sync_views(self):
+        listing = reverse('product-list-create')
+        self.compare(listing)
+        self.compare(listing, {'page': 2, 'sort_by': 'price_asc', 'category': self.product.category_id})
+        self.compare(listing, {'q': 'speaker', 'min_rating': 3})
+        self.compare(listing, {'category': 'audio'})
+        self.assertEqual(self.compare(listing, {'page': 9}).status_code, 404)
+
+        first = self.compare(listing, {'cursor': '', 'sort_by': 'price_desc', 'count': 'true'})
+        self.compare(first.json()['next'])
+        self.assertEqual(self.compare(listing, {'cursor': 'not-a-cursor'}).status_code, 404)
+
+        self.compare(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(self.compare(reverse('product-detail', args=[9999])).status_code, 404)
+        self.compare(reverse('category-list'))
+        self.compare(reverse('price-range'))
+        self.compare(reverse('product-reviews-list', args=[Review.objects.first().product_id]))
+        self.assertEqual(self.compare(reverse('product-reviews-list', args=[9999])).status_code, 404)
+
+    def test_async_views_use_the_catalog_cache(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.assertEqual(async_to_sync(self.async_client.get)(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        # Shared with the sync views
+        with override_settings(ROOT_URLCONF='backend.urls'):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_writes_go_to_the_drf_views(self):
+        url = reverse('product-detail', args=[self.product.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = async_to_sync(self.async_client.patch)(
+                url, {'unit_price': '99.00'}, content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['unit_price'], '99.00')
+        self.assertEqual(async_to_sync(self.async_client.get)(url).json()['unit_price'], '99.00')
+
+        response = async_to_sync(self.async_client.post)(
+            reverse('product-reviews-list', args=[self.product.id]),
+            {'title': 'Meh', 'content': 'Meh', 'rating': 2}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(async_to_sync(self.async_client.delete)(reverse('category-list')).status_code, 405)
+
+    def test_queries_of_async_views_are_measured(self):
+        registry.reset()
+        response = async_to_sync(self.async_client.get)(reverse('product-list-create'))
+        # The count and the page, run in sync_to_async threads
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertEqual(registry.snapshot()['endpoints']['product-list-create']['db_queries']['max'], 2)